@@ -1,67 +1,107 @@
+"""
+GPT scene cleaning
+
+Cleans the generated scenes in GPT5_scenes.csv (line numbers removed, one blank line
+between lines), writes each one to GPT_scenes/ under the file name of the human scene
+it was generated from, and saves an overview CSV and a plot of the line counts.
+
+Each scene is cleaned as a whole: its lines are split, stripped and joined with
+string builtins, and the line numbers removed with one multiline regular expression
+over the joined text. Each generated scene is matched to its human scene by key: the
+scene_file column that gpt_generation.py writes or, for older CSVs without it, the
+summary and number of lines of the row in the summaries CSV it was generated from.
+"""
+
 import os
 import re
+import argparse
+import numpy as np
 import pandas as pd
 import matplotlib.pyplot as plt
 
 # Paths
-base = "JohanneSejrskildRejsenhus#9686/nlp_exam/data_output"
+BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+base = os.path.join(BASE_DIR, "data_output")
 gpt_file = os.path.join(base, "GPT5_scenes.csv")
+summaries_file = os.path.join(base, "summaries_MEETING", "scene_summaries_MEETING.csv")
 non_gpt_folder = os.path.join(base, "data_selected")
 output_folder = os.path.join(base, "GPT_scenes")
 overview_file = os.path.join(output_folder, "GPT_scene_overview.csv")
 
-os.makedirs(output_folder, exist_ok=True)
+# Line numbers at the start of a line ("1.", "2:", "3)", "4 -"); [^\S\n] is \s without
+# the newline, so a match never runs into the next line
+LINE_NUMBER = re.compile(r"^[^\S\n]*\d+[^\S\n]*[\.\:\)\-][^\S\n]*", re.M)
 
 
 def clean_and_extract(scene_text):
     """Clean GPT scene text: remove line numbers and keep scene instructions."""
-    lines = scene_text.split("\n")
-    output = []
-
-    for line in lines:
-        stripped = line.rstrip()
-        if not stripped:
-            continue
-        # remove line numbers at the start
-        stripped = re.sub(r"^\s*\d+\s*[\.\:\)\-]\s*", "", stripped)
-        output.append(stripped)
+    return clean_scenes(pd.Series([scene_text]))["text"].iloc[0].split("\n\n")[:-1]
 
-    return output
 
+def join_lines(text):
+    """The non-empty lines of `text` without trailing whitespace, each followed by a blank line."""
+    lines = "\n\n".join(filter(None, map(str.rstrip, text.split("\n"))))
+    return lines + "\n\n" if lines else ""
 
-def process_scenes(gpt_file, non_gpt_folder, output_folder, overview_file):
-    """Process GPT scenes into individual txt files and create an overview CSV."""
-    df = pd.read_csv(gpt_file)
-    original_files = sorted([f for f in os.listdir(non_gpt_folder) if f.endswith(".txt")])
-
-    if len(original_files) != len(df):
-        print("Warning: number of GPT scenes and original files do not match!")
 
-    overview_rows = []
+def clean_scenes(scenes):
+    """
+    Clean a Series of GPT scene texts: empty lines, trailing whitespace and line numbers
+    removed. Returns a dataframe with the cleaned text of each scene (each line followed
+    by a blank line) and its number of lines.
+    """
+    text = scenes.fillna("").astype(str).map(join_lines)
+    return pd.DataFrame({
+        "text": text.str.replace(LINE_NUMBER, "", regex=True),
+        "num_lines": text.str.count("\n\n").astype(np.int64),
+    }, index=scenes.index)
 
-    for idx, row in df.iterrows():
-        scene_text = row["scene"]
-        summary = row["summary"]
 
-        cleaned_lines = clean_and_extract(scene_text)
+def scene_files(df, summaries_file=summaries_file):
+    """The human scene file each generated scene belongs to (missing if it can't be found)."""
+    keys = df["scene_file"] if "scene_file" in df.columns else pd.Series(pd.NA, index=df.index, dtype=object)
+    missing = keys.isna() | (keys.astype(str) == "")
+    if missing.any() and os.path.exists(summaries_file):
+        summaries = pd.read_csv(summaries_file, usecols=["scene_file", "summary", "num_lines"])
+        summaries = summaries.drop_duplicates(["summary", "num_lines"], keep=False)
+        matched = df[["summary", "num_lines"]].merge(summaries, on=["summary", "num_lines"], how="left")
+        keys = keys.where(~missing, matched["scene_file"].to_numpy())
+    return keys.where(keys.astype(str) != "")
 
-        filename = original_files[idx]
-        output_path = os.path.join(output_folder, filename)
 
-        with open(output_path, "w", encoding="utf-8") as f:
-            for line in cleaned_lines:
-                f.write(line + "\n")
-                f.write("\n")  # blank line between each line
-
-        overview_rows.append({
-            "scene_number": idx + 1,
-            "filename": filename,
-            "summary": summary,
-            "num_lines_after_cleaning": len(cleaned_lines),
-            "num_lines_original": row["num_lines"],
-        })
-
-    pd.DataFrame(overview_rows).to_csv(overview_file, index=False)
+def process_scenes(gpt_file, non_gpt_folder, output_folder, overview_file, summaries_file=summaries_file):
+    """Process GPT scenes into individual txt files and create an overview CSV."""
+    os.makedirs(output_folder, exist_ok=True)
+    df = pd.read_csv(gpt_file)
+    original_files = {f for f in os.listdir(non_gpt_folder) if f.endswith(".txt")}
+
+    df["filename"] = scene_files(df, summaries_file)
+    unmatched = df["filename"].isna() | ~df["filename"].isin(original_files)
+    if unmatched.any():
+        print(f"Warning: {unmatched.sum()} GPT scenes have no original file and are skipped "
+              f"(rows {df.index[unmatched].tolist()})")
+    missing = original_files - set(df["filename"].dropna())
+    if missing:
+        print(f"Warning: {len(missing)} original files have no GPT scene: {sorted(missing)}")
+
+    df = df[~unmatched]
+    duplicated = df["filename"].duplicated(keep="last")
+    if duplicated.any():
+        print(f"Warning: {duplicated.sum()} GPT scenes repeat an earlier scene file; the last one is kept")
+        df = df[~duplicated]
+    cleaned = clean_scenes(df["scene"])
+    for filename, text in zip(df["filename"], cleaned["text"]):
+        with open(os.path.join(output_folder, filename), "w", encoding="utf-8") as f:
+            f.write(text)
+
+    overview = pd.DataFrame({
+        "scene_number": df.index + 1,
+        "filename": df["filename"],
+        "summary": df["summary"],
+        "num_lines_after_cleaning": cleaned["num_lines"],
+        "num_lines_original": df["num_lines"],
+    })
+    overview.to_csv(overview_file, index=False)
     print(f"Processed {len(df)} scenes and saved overview to {overview_file}")
 
 
@@ -91,5 +131,12 @@ def plot_line_counts(overview_file, output_folder):
 
 
 # ------------------ Run ------------------
-process_scenes(gpt_file, non_gpt_folder, output_folder, overview_file)
-plot_line_counts(overview_file, output_folder)
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Clean the GPT scenes and compare their length to the originals")
+    parser.parse_args(argv)
+    process_scenes(gpt_file, non_gpt_folder, output_folder, overview_file)
+    plot_line_counts(overview_file, output_folder)
+
+
+if __name__ == "__main__":
+    main()
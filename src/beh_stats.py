@@ -0,0 +1,232 @@
+"""
+Behavioural statistics
+
+Resampling statistics for the lab.js study (the trials of labjs_data.py), alongside
+the Bayesian models in beh_analysis.Rmd. On each trial a participant saw a human and an
+LLM version of a scene side by side (the LLM one on the left unless `switch`) and chose
+one. As in beh_analysis.Rmd, preferred_text is 1 when the human scene was chosen and 0
+when the LLM scene was.
+
+Measures:
+- human_preference: share of trials where the human scene was preferred
+- detectability: mean over participants of |2 * their human preference - 1|. It is 0
+  when a participant's choices are unrelated to which text is human and 1 when they
+  always pick the same source, whichever it is
+- right_bias: share of trials where the right-hand text was chosen
+- scene: human preference per scene
+
+Confidence intervals come from a participant-level bootstrap. p-values come from
+sign-flip permutation tests: if the source of the texts made no difference, each trial's
+choice would be as likely to have gone the other way. For the scenes, p_adjusted is
+corrected for the number of scenes (max-T). Both are vectorized: a chunk of resamples is
+a NumPy matrix (resamples x participants bootstrap weights, or resamples x trials flips),
+every statistic of the chunk is computed from its sums per (participant, scene) cell with
+np.add.reduceat, and chunks are spread over a process pool. Each chunk gets its own seed
+derived from --seed, so the results don't depend on the number of processes.
+
+    python beh_stats.py                          # incremental export, 100k resamples
+    python beh_stats.py --source both --n-resamples 10000
+"""
+
+import os
+import argparse
+import numpy as np
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
+
+from labjs_data import FULL_DATA_PATH, INCREMENTAL_DATA_PATH, read_export, trial_table
+
+BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+OUTPUT_PATH = os.path.join(BASE_DIR, "data_output", "beh_stats.csv")
+
+# Test sessions, excluded as in beh_analysis.Rmd
+EXCLUDED_IDS = ["openLabId", "WoGYtIMAa_"]
+MEASURES = ["human_preference", "detectability", "right_bias"]
+
+
+# -------------------- Trials --------------------
+def preferred_text(trials):
+    """1 if the human scene was chosen, 0 if the LLM scene was, missing otherwise."""
+    switch = trials["switch"].astype("boolean")
+    response = trials["response"].astype(object)
+    human = (~switch & (response == "right")) | (switch & (response == "left"))
+    llm = (~switch & (response == "left")) | (switch & (response == "right"))
+    return pd.Series(np.where(human, 1, np.where(llm, 0, np.nan)), index=trials.index).astype("Int8")
+
+def scene_label(text):
+    """A scene's stage direction, e.g. "[In the taxi rank.]"."""
+    return text.split("]")[0] + "]" if "]" in text else text[:40]
+
+def load_trials(source="incremental"):
+    """Trials with preferred_text and scene, from the "incremental" or "full" export, or "both"
+    (full-data sessions, plus incremental sessions not in it)."""
+    if source == "both":
+        full, incremental = load_trials("full"), load_trials("incremental")
+        incremental = incremental[~incremental["openLabId"].isin(set(full["openLabId"]))]
+        return pd.concat([full, incremental], ignore_index=True)
+    rows, _ = read_export(FULL_DATA_PATH if source == "full" else INCREMENTAL_DATA_PATH)
+    trials = trial_table(rows)
+    trials = trials.assign(openLabId=trials["openLabId"].astype(str),
+                           scene=trials["textHuman"].astype(str).map(scene_label),
+                           preferred_text=preferred_text(trials))
+    trials = trials[~trials["openLabId"].isin(EXCLUDED_IDS) & trials["preferred_text"].notna()]
+    return trials.reset_index(drop=True)
+
+
+# -------------------- Resampling --------------------
+def run_starts(codes):
+    """Where each run of equal values in the sorted `codes` starts."""
+    return np.flatnonzero(np.r_[True, codes[1:] != codes[:-1]])
+
+def design(trials):
+    """
+    The arrays every statistic is computed from. Trials are grouped into cells, one per
+    (participant, scene) pair that has trials, ordered by participant: the trials of a cell,
+    and the cells of a participant, are then runs that np.add.reduceat sums.
+    """
+    participant, participants = pd.factorize(trials["openLabId"])
+    scene, scenes = pd.factorize(trials["scene"], sort=True)
+    order = np.lexsort((scene, participant))
+    trial_cell = participant[order] * len(scenes) + scene[order]
+    cell_start = run_starts(trial_cell)
+    cells = trial_cell[cell_start]
+    cell_participant, cell_scene = cells // len(scenes), cells % len(scenes)
+    scene_order = np.argsort(cell_scene, kind="stable")
+    return {
+        "y": trials["preferred_text"].to_numpy(dtype=np.float64),
+        "right": (trials["response"].astype(object) == "right").to_numpy(dtype=np.float64),
+        "order": order,
+        "cell_start": cell_start,
+        "cell_n": np.diff(np.r_[cell_start, len(order)]).astype(np.float64),
+        "cell_participant": cell_participant,
+        "cell_scene": cell_scene,
+        "participant_start": run_starts(cell_participant),
+        "scene_order": scene_order,
+        "scene_start": run_starts(cell_scene[scene_order]),
+        "n_participants": len(participants),
+        "scene_names": list(scenes),
+    }
+
+def run_sums(values, starts, order=None):
+    """Sums of the runs of columns of `values` (rows x columns) beginning at `starts`, after
+    putting the columns in `order`."""
+    values = np.atleast_2d(values)
+    return np.add.reduceat(values if order is None else values[:, order], starts, axis=1)
+
+def statistics(weights, y, right, d):
+    """
+    Every statistic for a batch of resamples, as a resamples x (3 + scenes) matrix.
+    weights: resamples x participants (how often each participant is drawn);
+    y, right: resamples x trials (or one row shared by all resamples).
+    """
+    cell_weights = weights[:, d["cell_participant"]]
+    cell_n = cell_weights * d["cell_n"]
+    cell_y = cell_weights * run_sums(y, d["cell_start"], d["order"])
+    cell_right = cell_weights * run_sums(right, d["cell_start"], d["order"])
+    n = cell_n.sum(axis=1)
+
+    participant_n = run_sums(cell_n, d["participant_start"])
+    # participants left out of a bootstrap resample have weight 0 and don't count
+    per_participant = np.divide(run_sums(cell_y, d["participant_start"]), participant_n,
+                                out=np.zeros_like(participant_n), where=participant_n > 0)
+    detectability = (weights * np.abs(2 * per_participant - 1)).sum(axis=1) / weights.sum(axis=1)
+    per_scene = (run_sums(cell_y, d["scene_start"], d["scene_order"])
+                 / run_sums(cell_n, d["scene_start"], d["scene_order"]))
+    return np.column_stack([cell_y.sum(axis=1) / n, detectability, cell_right.sum(axis=1) / n, per_scene])
+
+def bootstrap_chunk(d, size, seed):
+    """Statistics of `size` bootstrap resamples of the participants."""
+    rng = np.random.default_rng(seed)
+    n = d["n_participants"]
+    weights = rng.multinomial(n, np.full(n, 1 / n), size=size).astype(np.float64)
+    return statistics(weights, d["y"], d["right"], d)
+
+def permutation_chunk(d, size, seed, observed):
+    """
+    Counts of `size` sign-flip permutations at least as extreme as `observed`, per statistic,
+    and for the scenes' maximum (max-T).
+    A flip swaps the chosen text: the human/LLM preference for the preference statistics and
+    left/right for right_bias, each tested under its own null of "makes no difference".
+    """
+    rng = np.random.default_rng(seed)
+    flips = rng.random((size, len(d["y"]))) < 0.5
+    y, right = np.abs(d["y"] - flips), np.abs(d["right"] - flips)
+    stats = statistics(np.ones((size, d["n_participants"])), y, right, d)
+    extreme = np.abs(stats - 0.5) >= np.abs(observed - 0.5) - 1e-12
+    extreme[:, 1] = stats[:, 1] >= observed[1] - 1e-12  # detectability is one-sided
+    max_scene = np.abs(stats[:, 3:] - 0.5).max(axis=1)
+    max_extreme = max_scene[:, None] >= np.abs(observed[3:] - 0.5) - 1e-12
+    return extreme.sum(axis=0), max_extreme.sum(axis=0)
+
+def _run_chunk(args):
+    kind, *rest = args
+    return bootstrap_chunk(*rest) if kind == "bootstrap" else permutation_chunk(*rest)
+
+def run_chunks(kind, d, n, chunk_size, seed, workers, *extra):
+    """Results of n resamples in chunks of at most chunk_size, one seed per chunk."""
+    sizes = [min(chunk_size, n - start) for start in range(0, n, chunk_size)]
+    seeds = np.random.SeedSequence([seed, kind == "permutation"]).spawn(len(sizes))
+    jobs = [(kind, d, size, s, *extra) for size, s in zip(sizes, seeds)]
+    if workers == 1 or len(jobs) == 1:
+        return [_run_chunk(job) for job in jobs]
+    with ProcessPoolExecutor(max_workers=min(workers or os.cpu_count(), len(jobs))) as pool:
+        return list(pool.map(_run_chunk, jobs))
+
+def analyze(trials, n_resamples=100_000, chunk_size=10_000, seed=123, workers=None, level=0.95):
+    """
+    One row per measure and per scene: estimate, bootstrap confidence interval, permutation p-value
+    (p_adjusted: corrected over the scenes), and the number of trials and participants.
+    """
+    d = design(trials)
+    n_participants = d["n_participants"]
+    observed = statistics(np.ones((1, n_participants)), d["y"], d["right"], d)[0]
+
+    boot = np.vstack(run_chunks("bootstrap", d, n_resamples, chunk_size, seed, workers))
+    alpha = (1 - level) / 2
+    low, high = np.nanquantile(boot, [alpha, 1 - alpha], axis=0)
+
+    counts = run_chunks("permutation", d, n_resamples, chunk_size, seed, workers, observed)
+    extreme = sum(c[0] for c in counts)
+    max_extreme = sum(c[1] for c in counts)
+    p_value = (extreme + 1) / (n_resamples + 1)
+    p_adjusted = np.concatenate([[np.nan] * len(MEASURES), (max_extreme + 1) / (n_resamples + 1)])
+
+    n_scenes = len(d["scene_names"])
+    scene_trials = np.bincount(d["cell_scene"], weights=d["cell_n"], minlength=n_scenes)
+    scene_participants = np.bincount(d["cell_scene"], minlength=n_scenes)
+    return pd.DataFrame({
+        "measure": MEASURES + ["scene"] * len(d["scene_names"]),
+        "scene": [None] * len(MEASURES) + d["scene_names"],
+        "estimate": observed,
+        "ci_low": low,
+        "ci_high": high,
+        "p_value": p_value,
+        "p_adjusted": p_adjusted,
+        "n_trials": [len(d["y"])] * len(MEASURES) + scene_trials.astype(int).tolist(),
+        "n_participants": [n_participants] * len(MEASURES) + scene_participants.tolist(),
+    })
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Bootstrap and permutation statistics of the lab.js study")
+    parser.add_argument("--source", choices=["incremental", "full", "both"], default="incremental")
+    parser.add_argument("--n-resamples", type=int, default=100_000)
+    parser.add_argument("--chunk-size", type=int, default=10_000, help="Resamples per chunk (bounds memory)")
+    parser.add_argument("--workers", type=int, default=None, help="Processes (default: CPU count)")
+    parser.add_argument("--seed", type=int, default=123)
+    parser.add_argument("--output", default=OUTPUT_PATH)
+    args = parser.parse_args(argv)
+
+    trials = load_trials(args.source)
+    print(f"{len(trials)} trials from {trials['openLabId'].nunique()} participants")
+    results = analyze(trials, args.n_resamples, args.chunk_size, args.seed, args.workers)
+    with pd.option_context("display.width", 200, "display.max_colwidth", 40):
+        print(results.round(4).to_string(index=False))
+
+    os.makedirs(os.path.dirname(args.output), exist_ok=True)
+    results.to_csv(args.output, index=False)
+    print(f"Saved: {args.output}")
+
+
+if __name__ == "__main__":
+    main()
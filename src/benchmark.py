@@ -0,0 +1,315 @@
+"""
+Benchmarks
+
+Repeatable timings of the pipeline's hot paths on synthetic scripts, so an optimization
+can be measured and a regression spotted between commits.
+
+The synthetic script has the structure of DERRY-GIRLS-SCRIPT.txt: SEASON and EPISODE
+markers, scenes opening with a [stage direction], and "Speaker: line" dialogue with some
+(directions), using the show's characters and Zipf-distributed words. At scale 1 it is
+about the size of the real script (2 seasons, 11 episodes, ~200 scenes); scale n has n
+times as many seasons. Each corpus is written once to data_output/benchmarks/corpus/.
+
+Timed, per scale:
+- datacleaning: index_script and split_scenes
+- scene_index: scene_stats of every scene (the index the next two read)
+- data_overview: count_lines_and_speakers
+- baseline_info: character_statistics
+- lexical_analysis: the spaCy parse, metrics_from_features (every metric of the parsed
+  features), the lexical_kernels TTR, CTTR and MTLD on their own, and
+  batch_lexical_metrics end to end (at most --lexical-scenes scenes). Without
+  en_core_web_sm a blank English pipeline with a sentencizer is used.
+- summary_generation: summarize_batch with a tiny, randomly initialised BART and a word
+  level tokenizer built from the corpus, so nothing is downloaded (needs torch and
+  transformers; skipped otherwise)
+
+Every stage is run --repeats times; the minimum is reported. Results are saved to
+data_output/benchmarks/<commit>.json and compared with the previous results file.
+
+    python benchmark.py                          # scales 1 and 10
+    python benchmark.py --scales 1 100 1000 --repeats 5
+    python benchmark.py --stages datacleaning lexical_analysis --compare ../data_output/benchmarks/1a2b3c4.json
+"""
+
+import io
+import os
+import sys
+import glob
+import json
+import time
+import platform
+import argparse
+import statistics
+import subprocess
+import contextlib
+from datetime import datetime, timezone
+import numpy as np
+import pandas as pd
+
+from datacleaning import MARKERS, clean, index_script, read_lines, split_scenes
+from scene_index import PRIMARY_CHARACTERS, scene_stats
+from data_overview import count_lines_and_speakers
+from baseline_info import character_statistics
+from lexical_kernels import cttr, mtld, ttr
+
+BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+BENCH_DIR = os.path.join(BASE_DIR, "data_output", "benchmarks")
+CORPUS_DIR = os.path.join(BENCH_DIR, "corpus")
+
+STAGES = ["datacleaning", "scene_index", "data_overview", "baseline_info", "lexical_analysis", "summary_generation"]
+
+# Shape of DERRY-GIRLS-SCRIPT.txt
+EPISODES_PER_SEASON = [6, 5]
+SCENES_PER_EPISODE = 19
+LINES_PER_SCENE = 27
+WORDS_PER_LINE = 10
+DIRECTION_SHARE = 0.1
+NAME_SHARE = 0.02
+SPEAKERS = PRIMARY_CHARACTERS + ["Granda Joe", "Aunt Sarah", "Jenny Joyce", "Father Peter", "Dennis", "Ma"]
+PLACES = ["In the Quinn kitchen", "In the school corridor", "In Erin's bedroom", "On the street", "In the chip shop",
+          "In Sister Michael's office", "In the car", "At the bus stop", "In the classroom", "In the living room"]
+ACTIONS = ["are arguing", "sit in silence", "walk in", "are eating", "look worried", "are whispering"]
+
+
+# -------------------- Synthetic corpus --------------------
+def make_vocab(rng, size=5000):
+    """Pseudo-words built from syllables, most frequent first."""
+    syllables = np.array(["ba", "ke", "lo", "mi", "nu", "ra", "se", "ti", "vo", "wa", "cha", "der", "ry", "gi", "rl"])
+    lengths = rng.integers(1, 4, size=size)
+    words = ["".join(rng.choice(syllables, n)) for n in lengths]
+    return np.array(list(dict.fromkeys(words)), dtype=object)
+
+def synthetic_episode(rng, vocab):
+    """One episode: scenes of stage direction + dialogue, like the real script."""
+    n_scenes = max(1, rng.poisson(SCENES_PER_EPISODE))
+    lines_per_scene = np.maximum(1, rng.poisson(LINES_PER_SCENE, n_scenes))
+    n_lines = int(lines_per_scene.sum())
+    words_per_line = 1 + rng.poisson(WORDS_PER_LINE - 1, n_lines)
+
+    ranks = np.minimum(rng.zipf(1.3, int(words_per_line.sum())), len(vocab)) - 1
+    words = vocab[ranks]
+    names = rng.random(len(words)) < NAME_SHARE
+    words[names] = rng.choice(np.array(PRIMARY_CHARACTERS, dtype=object), int(names.sum()))
+    line_words = np.split(words, np.cumsum(words_per_line)[:-1])
+
+    speakers = rng.choice(SPEAKERS, n_lines)
+    directions = rng.random(n_lines) < DIRECTION_SHARE
+    lines = [f"({' '.join(w)})" if d else f"{s}: {' '.join(w).capitalize()}."
+             for s, w, d in zip(speakers, line_words, directions)]
+
+    scenes, start = [], 0
+    for n in lines_per_scene:
+        a, b = rng.choice(PRIMARY_CHARACTERS, 2, replace=False)
+        header = f"[{rng.choice(PLACES)}. {a} and {b} {rng.choice(ACTIONS)}.]"
+        scenes.append("\n\n".join([header] + lines[start:start + n]))
+        start += n
+    return "\n\n".join(scenes)
+
+def synthetic_script(scale, seed=0, corpus_dir=CORPUS_DIR):
+    """Path of the synthetic script at `scale` (written the first time it is asked for)."""
+    path = os.path.join(corpus_dir, f"synthetic-x{scale}-seed{seed}.txt")
+    if os.path.exists(path):
+        return path
+    os.makedirs(corpus_dir, exist_ok=True)
+    rng = np.random.default_rng([seed, scale])
+    vocab = make_vocab(rng)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        for season in range(1, len(EPISODES_PER_SEASON) * scale + 1):
+            f.write(f"SEASON {season}\n")
+            for episode in range(1, EPISODES_PER_SEASON[(season - 1) % len(EPISODES_PER_SEASON)] + 1):
+                f.write(f"EPISODE {episode}\n\n{synthetic_episode(rng, vocab)}\n\n")
+    os.replace(tmp_path, path)
+    return path
+
+def episode_texts(path):
+    """Stripped text of every episode, as datacleaning splits them."""
+    _, episodes = index_script(path, MARKERS)
+    return [clean("".join(line for _, line in read_lines(path, ep["start"], ep["end"]))).strip() for ep in episodes]
+
+
+# -------------------- Timing --------------------
+def timed(func, repeats):
+    """(seconds per run, result of the last run)."""
+    seconds = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        result = func()
+        seconds.append(time.perf_counter() - start)
+    return seconds, result
+
+def record(results, name, seconds, items, unit):
+    best = min(seconds)
+    results[name] = {"seconds": seconds, "min": best, "median": statistics.median(seconds),
+                     "items": items, "unit": unit, "per_second": items / best if best else None}
+    print(f"  {name:<40} {best:>9.4f} s  {items:>9} {unit:<7} {results[name]['per_second'] or 0:>12.0f}/s")
+
+
+# -------------------- Stages --------------------
+def lexical_nlp():
+    """(pipeline, its name): en_core_web_sm as in lexical_analysis, or a blank English pipeline."""
+    import spacy
+    from lexical_analysis import load_nlp
+    try:
+        return load_nlp(), "en_core_web_sm"
+    except OSError:
+        nlp = spacy.blank("en")
+        nlp.add_pipe("sentencizer")
+        return nlp, "blank en + sentencizer"
+
+def metric_kernels():
+    """The functions lexical_analysis computes its metrics with, as f(ids, sentence lengths):
+    metrics_from_features for all of them, and the lexical_kernels ones it calls."""
+    from lexical_analysis import MTLD_MIN_SEGMENT, MTLD_THRESHOLD, metrics_from_features
+    return {
+        "metrics_from_features": metrics_from_features,
+        "TTR": lambda ids, sents: ttr(ids),
+        "CTTR": lambda ids, sents: cttr(ids),
+        "MTLD": lambda ids, sents: mtld(ids, MTLD_THRESHOLD, MTLD_MIN_SEGMENT),
+    }
+
+def tiny_summarizer(texts, vocab_size=2000):
+    """A tokenizer and a small random BART built locally from `texts`."""
+    import torch
+    from tokenizers import Tokenizer, models, pre_tokenizers, trainers
+    from transformers import BartConfig, BartForConditionalGeneration, PreTrainedTokenizerFast
+
+    special = ["<pad>", "<s>", "</s>", "<unk>"]
+    tok = Tokenizer(models.WordLevel(unk_token="<unk>"))
+    tok.pre_tokenizer = pre_tokenizers.Whitespace()
+    tok.train_from_iterator(texts, trainers.WordLevelTrainer(vocab_size=vocab_size, special_tokens=special))
+    tokenizer = PreTrainedTokenizerFast(tokenizer_object=tok, pad_token="<pad>", bos_token="<s>",
+                                        eos_token="</s>", unk_token="<unk>")
+    config = BartConfig(vocab_size=len(tokenizer), d_model=64, encoder_layers=2, decoder_layers=2,
+                        encoder_attention_heads=2, decoder_attention_heads=2, encoder_ffn_dim=128,
+                        decoder_ffn_dim=128, max_position_embeddings=1024, pad_token_id=0, bos_token_id=1,
+                        eos_token_id=2, decoder_start_token_id=2, forced_eos_token_id=2)
+    torch.manual_seed(0)
+    return tokenizer, BartForConditionalGeneration(config).eval()
+
+def run_scale(scale, stages, repeats, seed, lexical_scenes, summary_scenes, info):
+    """Time the selected stages on the synthetic script at `scale`."""
+    path = synthetic_script(scale, seed)
+    episodes = episode_texts(path)
+    print(f"\nscale {scale}: {os.path.getsize(path) / 1e6:.1f} MB, {len(episodes)} episodes")
+    results = {}
+
+    # Later stages need the scenes and the index, so these run (once) even when not timed
+    if "datacleaning" in stages:
+        seconds, _ = timed(lambda: index_script(path, MARKERS), repeats)
+        record(results, "datacleaning.index_script", seconds, len(episodes), "episodes")
+    seconds, scenes = timed(lambda: [s for text in episodes for s in split_scenes(text)],
+                            repeats if "datacleaning" in stages else 1)
+    if "datacleaning" in stages:
+        record(results, "datacleaning.split_scenes", seconds, len(episodes), "episodes")
+
+    seconds, stats = timed(lambda: [scene_stats(s) for s in scenes], repeats if "scene_index" in stages else 1)
+    index = pd.DataFrame(stats).assign(scene_file=[f"scene_{i}.txt" for i in range(len(scenes))])
+    if "scene_index" in stages:
+        record(results, "scene_index.scene_stats", seconds, len(scenes), "scenes")
+    if "data_overview" in stages:
+        seconds, _ = timed(lambda: count_lines_and_speakers(index), repeats)
+        record(results, "data_overview.count_lines_and_speakers", seconds, len(scenes), "scenes")
+    if "baseline_info" in stages:
+        with contextlib.redirect_stdout(io.StringIO()):
+            seconds, _ = timed(lambda: character_statistics(index), repeats)
+        record(results, "baseline_info.character_statistics", seconds, len(scenes), "scenes")
+
+    if "lexical_analysis" in stages:
+        import lexical_analysis
+        nlp, info["nlp"] = lexical_nlp()
+        lexical_analysis.use_nlp(nlp)
+        texts = scenes[:lexical_scenes]
+        seconds, features = timed(lambda: [lexical_analysis.doc_features(doc) for doc in nlp.pipe(texts)], repeats)
+        record(results, "lexical_analysis.parse", seconds, len(texts), "scenes")
+        for name, kernel in metric_kernels().items():
+            seconds, _ = timed(lambda: [kernel(*f) for f in features], repeats)
+            record(results, f"lexical_analysis.{name}", seconds, len(texts), "scenes")
+        with contextlib.redirect_stderr(io.StringIO()):  # progress bar
+            seconds, _ = timed(lambda: lexical_analysis.batch_lexical_metrics(texts), repeats)
+        record(results, "lexical_analysis.batch_lexical_metrics", seconds, len(texts), "scenes")
+
+    if "summary_generation" in stages:
+        try:
+            from summary_generation import summarize_batch
+            tokenizer, model = tiny_summarizer(scenes)
+        except ImportError as e:
+            print(f"  summary_generation skipped: {e}")
+        else:
+            texts = scenes[:summary_scenes]
+            seconds, _ = timed(lambda: summarize_batch(
+                texts, tokenizer, model, batch_size=8, tokenizer_kwargs={"truncation": True, "max_length": 512},
+                generate_kwargs={"max_length": 40, "min_length": 10, "num_beams": 1, "do_sample": False}), repeats)
+            record(results, "summary_generation.summarize_batch", seconds, len(texts), "scenes")
+    return results
+
+
+# -------------------- Results --------------------
+def git_commit():
+    """(short commit hash, whether tracked files have uncommitted changes)."""
+    def git(*args):
+        return subprocess.run(["git", *args], cwd=BASE_DIR, capture_output=True, text=True, check=True).stdout.strip()
+    try:
+        return git("rev-parse", "--short", "HEAD"), bool(git("status", "--porcelain", "--untracked-files=no"))
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown", True
+
+def previous_results(bench_dir, exclude):
+    paths = [p for p in glob.glob(os.path.join(bench_dir, "*.json")) if os.path.abspath(p) != os.path.abspath(exclude)]
+    return max(paths, key=os.path.getmtime) if paths else None
+
+def compare(report, baseline_path):
+    with open(baseline_path, "r", encoding="utf-8") as f:
+        baseline = json.load(f)
+    print(f"\nCompared with {os.path.basename(baseline_path)} (commit {baseline.get('commit')}); "
+          "ratio > 1 is slower now")
+    for scale, stages in report["results"].items():
+        for name, result in stages.items():
+            before = baseline.get("results", {}).get(scale, {}).get(name)
+            if before and before["items"] == result["items"] and before["min"]:
+                print(f"  x{scale:<5} {name:<40} {before['min']:>9.4f} s -> {result['min']:>9.4f} s "
+                      f"{result['min'] / before['min']:>6.2f}x")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Time the pipeline stages on synthetic scripts")
+    parser.add_argument("--scales", type=int, nargs="+", default=[1, 10], help="Script sizes, 1 = the real script")
+    parser.add_argument("--stages", nargs="+", choices=STAGES, default=STAGES)
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--lexical-scenes", type=int, default=2000, help="Scenes parsed by the lexical benchmarks")
+    parser.add_argument("--summary-scenes", type=int, default=16, help="Scenes summarized by the tiny model")
+    parser.add_argument("--output-dir", default=BENCH_DIR)
+    parser.add_argument("--compare", default=None, help="Results file to compare with (default: the latest)")
+    args = parser.parse_args(argv)
+
+    commit, dirty = git_commit()
+    info = {"nlp": None}
+    results = {str(scale): run_scale(scale, args.stages, args.repeats, args.seed, args.lexical_scenes,
+                                     args.summary_scenes, info)
+               for scale in args.scales}
+    report = {
+        "commit": commit,
+        "dirty": dirty,
+        "created": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "repeats": args.repeats,
+        "seed": args.seed,
+        "nlp": info["nlp"],
+        "results": results,
+    }
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    out_path = os.path.join(args.output_dir, f"{commit}{'-dirty' if dirty else ''}.json")
+    baseline = args.compare or previous_results(args.output_dir, out_path)
+    with open(out_path, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=1)
+    print(f"\nSaved: {out_path}")
+    if baseline:
+        compare(report, baseline)
+
+
+if __name__ == "__main__":
+    main()
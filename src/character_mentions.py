@@ -0,0 +1,105 @@
+"""
+Character mentions
+
+Finds which characters appear in a scene, and how, with one compiled regex and a single
+pass over the text. All names and aliases are compiled into one word-bounded pattern,
+together with tokens for speaker tags and for the brackets around stage directions.
+The names are factored into a prefix trie ("Ma(?:ry|rtin)") so the regex engine walks
+the cast like an Aho-Corasick automaton instead of trying every name at every position.
+
+Every match is classified as one of:
+- speaker:   the character has a line ("Erin: ...")
+- dialogue:  the name is said within a line of dialogue
+- direction: the name only appears in a stage direction ("[In Erin's bedroom]", "(to Mary)")
+
+Word boundaries mean a name inside another word ("Rosemary") is not a mention.
+A scene's characters are those who speak or are mentioned in dialogue; stage-direction
+mentions are kept separately.
+"""
+
+import re
+from functools import lru_cache
+
+# Other names a character goes by, mapped to the canonical name
+ALIASES = {}
+
+
+def trie_pattern(names):
+    """Regex matching any of `names`, factored by common prefixes; spaces match any whitespace.
+    Longer names are preferred where one name is a prefix of another."""
+    trie = {}
+    for name in names:
+        node = trie
+        for char in name:
+            node = node.setdefault(char, {})
+        node[""] = {}
+
+    def build(node):
+        end = "" in node
+        branches = [(r"\s+" if char == " " else re.escape(char)) + build(child)
+                    for char, child in sorted(node.items()) if char]
+        if not branches:
+            return ""
+        body = branches[0] if len(branches) == 1 else "(?:" + "|".join(branches) + ")"
+        if end:
+            return "(?:" + body + ")?"
+        return body
+
+    return build(trie)
+
+
+class CharacterMatcher:
+    def __init__(self, characters, aliases=None):
+        self.characters = list(characters)
+        self.canonical = {name: name for name in self.characters}
+        for alias, name in (aliases or {}).items():
+            if name in self.canonical:
+                self.canonical[alias] = name
+
+        name_pattern = trie_pattern(self.canonical)
+        self.name_regex = re.compile(rf"\b(?:{name_pattern})\b")
+        self.scanner = re.compile(
+            rf"(?P<tag>^[ \t]*[A-Z][A-Za-z \t]*:)"
+            rf"|(?P<open>[\[(])|(?P<close>[\])])"
+            rf"|(?P<name>\b(?:{name_pattern})\b)",
+            re.MULTILINE,
+        )
+
+    def _name(self, matched):
+        return self.canonical[" ".join(matched.split())]
+
+    def scan(self, text):
+        """{"speaker": set, "dialogue": set, "direction": set} of canonical names."""
+        found = {"speaker": set(), "dialogue": set(), "direction": set()}
+        depth = 0
+        for m in self.scanner.finditer(text):
+            kind = m.lastgroup
+            if kind == "open":
+                depth += 1
+            elif kind == "close":
+                depth = max(0, depth - 1)
+            elif kind == "tag":
+                # "Erin:" or "Erin and Orla:" at the start of a line
+                if depth == 0:
+                    found["speaker"].update(self._name(n.group()) for n in self.name_regex.finditer(m.group()))
+                else:
+                    found["direction"].update(self._name(n.group()) for n in self.name_regex.finditer(m.group()))
+            else:
+                found["direction" if depth else "dialogue"].add(self._name(m.group()))
+        return found
+
+    def characters_in(self, text):
+        """Characters who speak or are mentioned in dialogue, in cast order."""
+        found = self.scan(text)
+        present = found["speaker"] | found["dialogue"]
+        return [c for c in self.characters if c in present]
+
+
+@lru_cache(maxsize=8)
+def _matcher(characters, aliases):
+    return CharacterMatcher(characters, dict(aliases))
+
+def character_matcher(characters, aliases=None):
+    """Compiled matcher for a cast, shared across calls."""
+    aliases = ALIASES if aliases is None else aliases
+    return _matcher(tuple(characters), tuple(sorted(aliases.items())))
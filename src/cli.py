@@ -0,0 +1,72 @@
+"""
+Command line
+
+One entry point for every stage:
+
+    python src/cli.py <command> [arguments of that stage]
+    python src/cli.py lexical_analysis --sentencizer
+    python src/cli.py --help
+
+The command is run in this process: its module is only imported when it is called,
+so `--help` and light commands don't pay for loading spaCy, torch or the models.
+All paths are resolved from the repository, so it can be run from any directory.
+"""
+
+import os
+import sys
+import runpy
+
+SRC_DIR = os.path.abspath(os.path.dirname(__file__))
+
+COMMANDS = {
+    "datacleaning": "Split the scripts into seasons, episodes and scenes",
+    "scene_index": "Build or update the per-scene index",
+    "scene_store": "Export, import or inspect the scene store",
+    "data_overview": "Line and speaker counts of the season 2 scenes",
+    "baseline_info": "Season 1 character statistics and the context chunk",
+    "data_selection": "Select scenes from the scene index",
+    "summary_generation": "Summarize the selected scenes",
+    "gpt_generation": "Generate scenes from the summaries with the OpenAI API",
+    "GPT_datacleaning": "Clean the generated scenes",
+    "lexical_preproc": "Combine human and generated scenes into overview.csv",
+    "lexical_analysis": "Compute lexical metrics",
+    "lexical_plots": "Plot the lexical metrics",
+    "labjs_data": "Load the lab.js exports into trial and participant tables",
+    "labjs_ingest": "Ingest rows appended to the lab.js exports",
+    "beh_stats": "Bootstrap and permutation statistics of the study",
+    "benchmark": "Time the pipeline stages on synthetic scripts",
+    "pipeline": "Run every stage that is out of date",
+}
+
+
+def usage():
+    width = max(map(len, COMMANDS))
+    lines = ["usage: cli.py <command> [arguments]", "", "commands:"]
+    lines += [f"  {name:{width}}  {description}" for name, description in COMMANDS.items()]
+    lines += ["", "Run `cli.py <command> --help` for the arguments of a command."]
+    return "\n".join(lines)
+
+def run(command, argv=()):
+    """Run a stage's command line in this process, as `python <command>.py argv...`."""
+    if command not in COMMANDS:
+        raise SystemExit(f"Unknown command: {command}\n\n{usage()}")
+    path = os.path.join(SRC_DIR, f"{command}.py")
+    if SRC_DIR not in sys.path:
+        sys.path.insert(0, SRC_DIR)
+    saved_argv = sys.argv
+    sys.argv = [path] + list(argv)
+    try:
+        runpy.run_path(path, run_name="__main__")
+    finally:
+        sys.argv = saved_argv
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else list(argv)
+    if not argv or argv[0] in ("-h", "--help"):
+        print(usage())
+        return
+    run(argv[0], argv[1:])
+
+
+if __name__ == "__main__":
+    main()
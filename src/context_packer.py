@@ -0,0 +1,143 @@
+"""
+Context packer
+
+Packs scenes into a prompt context (season1_chunk.txt) under a token budget measured
+with the target model's tokenizer.
+
+- Token counts come from tiktoken (the optional `tiktoken` package; whitespace tokens
+  without it, or when its encoding can't be downloaded) and are cached per scene text
+  in a MetricCache, so a scene is only tokenized once per encoding.
+- Coverage: first a small set of scenes that together contain every primary character
+  is chosen (greedy weighted set cover: most newly covered characters per token).
+- Fill: the remaining budget is then filled as a 0/1 knapsack (subset sum over token
+  counts), so the context ends up as close to the budget as the scenes allow instead of
+  stopping at the first scene that doesn't fit.
+- A seed shuffles the candidates, so different seeds give different (equally full)
+  contexts and the same seed always gives the same one.
+
+Scenes are joined in script order; the final text is counted again and checked
+against the budget.
+"""
+
+import os
+import random
+
+from lexical_cache import MetricCache
+
+BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+TOKEN_CACHE_PATH = os.path.join(BASE_DIR, "data_output", "token_cache.sqlite")
+DEFAULT_MODEL = "gpt-5-search-api"
+FALLBACK_ENCODING = "o200k_base"
+SEPARATOR = "\n\n"
+
+
+# -------------------- Token counting --------------------
+def load_encoding(model=DEFAULT_MODEL):
+    """(encoding name, function text -> token count) for `model`."""
+    whitespace = ("whitespace", lambda text: len(text.split()))
+    try:
+        import tiktoken
+    except ImportError:
+        print("tiktoken is not installed (pip install tiktoken); counting whitespace tokens instead")
+        return whitespace
+    try:
+        try:
+            encoding = tiktoken.encoding_for_model(model)
+        except KeyError:
+            encoding = tiktoken.get_encoding(FALLBACK_ENCODING)
+    except (OSError, ValueError) as e:
+        # The BPE file is downloaded on first use; offline or behind a proxy that fails
+        print(f"Could not load the tiktoken encoding ({type(e).__name__}: {e}); counting whitespace tokens instead")
+        return whitespace
+    return encoding.name, lambda text: len(encoding.encode(text, disallowed_special=()))
+
+class TokenCounter:
+    """Token counts of scene texts, cached on disk per encoding."""
+
+    def __init__(self, model=DEFAULT_MODEL, cache_path=TOKEN_CACHE_PATH, encoding=None):
+        self.name, self.count = encoding or load_encoding(model)
+        self.cache = MetricCache(cache_path, namespace=f"tokens:{self.name}") if cache_path else None
+
+    def count_many(self, texts):
+        counts = self.cache.get_many(set(texts)) if self.cache else {}
+        missing = {t: self.count(t) for t in set(texts) if t not in counts}
+        if missing and self.cache:
+            self.cache.put_many(missing)
+        counts.update(missing)
+        return [counts[t] for t in texts]
+
+    def close(self):
+        if self.cache:
+            self.cache.close()
+
+
+# -------------------- Packing --------------------
+def cover_characters(candidates, characters, rng):
+    """Greedy weighted set cover: indices of scenes that together contain every character."""
+    uncovered = set(characters)
+    order = list(range(len(candidates)))
+    rng.shuffle(order)  # ties go to a seeded random scene
+    chosen = []
+    while uncovered and order:  # no candidates left: nothing more can be covered
+        best = max(order, key=lambda i: len(uncovered & candidates[i]["characters"]) / candidates[i]["cost"])
+        gained = uncovered & candidates[best]["characters"]
+        if not gained:
+            break
+        chosen.append(best)
+        order.remove(best)
+        uncovered -= gained
+    if uncovered:
+        print(f"Warning: no scene contains {', '.join(sorted(uncovered))}")
+    return chosen
+
+def fill_knapsack(costs, budget):
+    """Indices of a subset of `costs` with the largest total <= budget (subset sum via bitsets)."""
+    if budget <= 0:
+        return []
+    mask = (1 << (budget + 1)) - 1
+    reachable = [1]  # reachable[i]: bit t set if total t is reachable with the first i items
+    for cost in costs:
+        reachable.append((reachable[-1] | (reachable[-1] << cost)) & mask)
+    total = reachable[-1].bit_length() - 1
+    chosen = []
+    for i in range(len(costs), 0, -1):
+        if not (reachable[i - 1] >> total) & 1:
+            chosen.append(i - 1)
+            total -= costs[i - 1]
+    return chosen
+
+def pack_context(scenes, counter, characters, max_tokens=1500, seed=None):
+    """
+    Choose scenes for a context of at most `max_tokens` tokens that mentions every character.
+    `scenes` are dicts with "text" and "characters", in script order.
+    Returns (context text, token count, chosen scene positions).
+    """
+    rng = random.Random(seed)
+    separator_cost = counter.count(SEPARATOR)
+    token_counts = counter.count_many([scene["text"] for scene in scenes])
+    candidates = [
+        {"characters": set(scene["characters"]), "tokens": n, "cost": n + separator_cost}
+        for scene, n in zip(scenes, token_counts)
+    ]
+
+    chosen = cover_characters(candidates, characters, rng)
+    used = sum(candidates[i]["cost"] for i in chosen)
+    if used - separator_cost > max_tokens:
+        print(f"Warning: covering every character takes {used - separator_cost} tokens, over the budget of {max_tokens}")
+
+    covering = set(chosen)
+    rest = [i for i in range(len(candidates)) if i not in covering]
+    rng.shuffle(rest)
+    # The last scene has no separator after it, hence the extra separator in the budget
+    picked = fill_knapsack([candidates[i]["cost"] for i in rest], max_tokens + separator_cost - used)
+    chosen += [rest[i] for i in picked]
+
+    while True:
+        chosen.sort()
+        text = SEPARATOR.join(scenes[i]["text"] for i in chosen)
+        total = counter.count(text)
+        fill = [i for i in chosen if i not in covering]
+        if total <= max_tokens or not fill:
+            return text, total, chosen
+        # Merges across scene boundaries can shift the count slightly; drop the smallest fill scene
+        chosen.remove(min(fill, key=lambda i: candidates[i]["tokens"]))
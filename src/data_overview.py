@@ -1,32 +1,17 @@
 import os
-import re
 import csv
 import matplotlib.pyplot as plt
 
-def count_lines_and_speakers(scenes_dir):
-    summary = []
-    speaker_regex = re.compile(r"^([A-Z][A-Za-z\s]*):")  # Uppercase start, ends with colon
-    
-    for filename in sorted(os.listdir(scenes_dir)):
-        if not filename.endswith(".txt"):
-            continue
-        file_path = os.path.join(scenes_dir, filename)
-        with open(file_path, "r", encoding="utf-8") as f:
-            lines = [line.strip() for line in f if line.strip()]
-        
-        num_lines = len(lines)
-        speakers = set()
-        for line in lines:
-            match = speaker_regex.match(line)
-            if match:
-                speakers.add(match.group(1).strip())
-        
-        summary.append({
-            "scene_file": filename,
-            "num_lines": num_lines,
-            "num_speakers": len(speakers)
-        })
-    return summary
+from scene_index import build_index, read_index
+from scene_store import DEFAULT_SHOW
+
+def count_lines_and_speakers(index):
+    """Line and speaker counts from the scene index, ordered by file name."""
+    index = index.sort_values("scene_file")
+    return [
+        {"scene_file": scene_file, "num_lines": int(num_lines), "num_speakers": int(num_speakers)}
+        for scene_file, num_lines, num_speakers in zip(index["scene_file"], index["num_lines"], index["num_speakers"])
+    ]
 
 def save_summary_csv(summary, output_dir):
     os.makedirs(output_dir, exist_ok=True)
@@ -64,10 +49,12 @@ def plot_summary(summary, plots_dir):
 
 if __name__ == "__main__":
     base_output_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), "../data_output"))
-    scenes_dir = os.path.join(base_output_dir, "season_2_scenes")
     plots_dir = os.path.join(base_output_dir, "plots")
 
-    summary = count_lines_and_speakers(scenes_dir)
+    build_index()  # no-op unless scenes changed since they were split
+    index = read_index(columns=["num_lines", "num_speakers"],
+                       filters=[("show", "==", DEFAULT_SHOW), ("season", "==", 2)])
+    summary = count_lines_and_speakers(index)
     csv_path = save_summary_csv(summary, base_output_dir)
     plot_path = plot_summary(summary, plots_dir)
 
@@ -1,44 +1,146 @@
+"""
+Scene selection
+
+Declarative selection of scenes, evaluated against the scene index (scene_index.py)
+instead of copying scene files around. A selection is a set of criteria:
+
+- lines=(min, max)        number of non-empty lines, inclusive
+- speakers=(min, max)     number of distinct speakers, inclusive (None = no bound)
+- with_speakers=[...]     these characters all have lines in the scene
+- with_characters=[...]   these characters are all mentioned in the scene
+- per_episode=n           stratified sample: at most n scenes per episode
+- token_budget=n          stop adding scenes once their tokens would exceed n
+- seed                    for the sample and the order in which the budget is filled
+
+select_scenes() returns lightweight references: key columns, scene_file and index
+statistics, but no text. materialize() reads further columns for them from the scene
+store, save_selection() records the selection as a boolean store column (default
+"selected", which summary_generation.py reads), and --txt exports it as .txt files.
+
+The default criteria are the ones used for the study: season 2 scenes with 15-30
+lines and more than one speaker.
+"""
+
 import os
-import shutil
+import argparse
+import numpy as np
 import pandas as pd
 
-# Information from scenes are in data_output/scene_summary.csv
-# Scene length more between 15-30
-# Speakers more than one
-# Selected scenes copied into folder data_output/data_selected. 
-# The scenes are located in /data_output/season_2_scenes and are named as they are in the scene_summary column "scene_file"
+from scene_index import build_index, read_index
+from scene_store import DEFAULT_SHOW, KEY, STORE_PATH, export_txt, read_store, update_store
 
-def main():
-    # Load data
-    base_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
-    scene_summary_path = os.path.join(base_dir, "data_output", "scene_summary.csv")
+BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+SELECTED_DIR = os.path.join(BASE_DIR, "data_output", "data_selected")
 
-    print("Loading scene summary from:", scene_summary_path)
-    df = pd.read_csv(scene_summary_path)
-    # Filter scenes
-    filtered_df = df[(df["num_lines"].between(15, 30)) & (df["num_speakers"] > 1)]
-    print(f"Selected {len(filtered_df)} scenes matching criteria.")
+DEFAULT_CRITERIA = {"lines": (15, 30), "speakers": (2, None)}
 
-    # Copy selected scenes
-    src_dir = os.path.join(base_dir, "data_output", "season_2_scenes")
-    dst_dir = os.path.join(base_dir, "data_output", "data_selected")
-    os.makedirs(dst_dir, exist_ok=True)
 
-    for scene_file in filtered_df["scene_file"]:
-        src_path = os.path.join(src_dir, scene_file)
-        dst_path = os.path.join(dst_dir, scene_file)
+def in_range(values, bounds):
+    low, high = bounds
+    mask = pd.Series(True, index=values.index)
+    if low is not None:
+        mask &= values >= low
+    if high is not None:
+        mask &= values <= high
+    return mask
 
-        if os.path.exists(src_path):
-            shutil.copy(src_path, dst_path)
-        else:
-            print(f"Warning: Scene file not found: {scene_file}")
+def contains_all(lists, required):
+    required = set(required)
+    return lists.map(lambda names: required.issubset(names))
 
-    print("Scene selection complete.")
-    print(f"Copied {len(os.listdir(dst_dir))} files to {dst_dir}.")
+def select_scenes(index, lines=None, speakers=None, with_speakers=None, with_characters=None,
+                  per_episode=None, token_budget=None, seed=0):
+    """Scene references (rows of `index`) matching the criteria, in key order."""
+    mask = pd.Series(True, index=index.index)
+    if lines is not None:
+        mask &= in_range(index["num_lines"], lines)
+    if speakers is not None:
+        mask &= in_range(index["num_speakers"], speakers)
+    if with_speakers:
+        mask &= contains_all(index["speakers"], with_speakers)
+    if with_characters:
+        mask &= contains_all(index["characters"], with_characters)
+    selected = index[mask]
 
+    rng = np.random.default_rng(seed)
+    if per_episode is not None:
+        shuffled = selected.iloc[rng.permutation(len(selected))]
+        selected = shuffled[shuffled.groupby(["show", "season", "episode"]).cumcount() < per_episode]
 
+    if token_budget is not None:
+        order = rng.permutation(len(selected))
+        keep = np.zeros(len(selected), dtype=bool)
+        used = 0
+        tokens = selected["num_tokens"].to_numpy()
+        for i in order:
+            if used + tokens[i] <= token_budget:
+                keep[i] = True
+                used += tokens[i]
+        selected = selected[keep]
 
-if __name__ == "__main__":
-    main()
+    return selected.sort_values(KEY).reset_index(drop=True)
+
+def materialize(refs, columns=("text",), store_path=STORE_PATH):
+    """The referenced scenes with `columns` read from the scene store."""
+    shows = sorted(refs["show"].unique())
+    data = read_store(store_path, columns=list(columns),
+                      filters=[("show", "in", shows)] if shows else None)
+    return refs[KEY].merge(data, on=KEY, how="left")
 
+def save_selection(refs, name="selected", filters=None, store_path=STORE_PATH):
+    """Store the selection as a boolean column: True for the referenced scenes, False for
+    the other scenes matching `filters` (the pool the selection was drawn from)."""
+    pool = read_store(store_path, columns=[], filters=filters)
+    chosen = pd.MultiIndex.from_frame(refs[KEY])
+    pool[name] = pd.MultiIndex.from_frame(pool[KEY]).isin(chosen)
+    update_store(pool[KEY + [name]], store_path)
+    return int(pool[name].sum())
+
+def main(criteria=DEFAULT_CRITERIA, show=DEFAULT_SHOW, season=2, name="selected", txt=False, dry_run=False):
+    build_index()  # no-op unless scenes changed since they were split
+    filters = [("show", "==", show)] + ([("season", "==", season)] if season is not None else [])
+    index = read_index(filters=filters)
+
+    refs = select_scenes(index, **criteria)
+    print(f"Selected {len(refs)} of {len(index)} scenes matching {criteria}.")
+    if dry_run:
+        print(refs[["scene_file", "num_lines", "num_speakers", "num_tokens"]].to_string(index=False))
+        return refs
+
+    n = save_selection(refs, name=name, filters=filters)
+    print(f"Flagged {n} scenes as {name} in the scene store.")
+
+    if txt:
+        out_dir = SELECTED_DIR if name == "selected" else os.path.join(BASE_DIR, "data_output", f"data_{name}")
+        n_files = export_txt(materialize(refs, columns=["text"]), out_dir)
+        print(f"Exported {n_files} files to {out_dir}.")
+    return refs
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Select scenes from the scene index")
+    parser.add_argument("--show", default=DEFAULT_SHOW)
+    parser.add_argument("--season", type=int, default=2)
+    parser.add_argument("--lines", type=int, nargs=2, metavar=("MIN", "MAX"), default=DEFAULT_CRITERIA["lines"])
+    parser.add_argument("--min-speakers", type=int, default=DEFAULT_CRITERIA["speakers"][0])
+    parser.add_argument("--max-speakers", type=int, default=None)
+    parser.add_argument("--with-speakers", nargs="+", default=None, help="Characters who must have lines")
+    parser.add_argument("--with-characters", nargs="+", default=None, help="Characters who must be mentioned")
+    parser.add_argument("--per-episode", type=int, default=None, help="Sample at most N scenes per episode")
+    parser.add_argument("--token-budget", type=int, default=None, help="Total tokens of the selected scenes")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--name", default="selected", help="Store column to save the selection in")
+    parser.add_argument("--txt", action="store_true", help="Also export the selected scenes as .txt files")
+    parser.add_argument("--dry-run", action="store_true", help="Only list the selected scenes")
+    args = parser.parse_args()
 
+    criteria = {
+        "lines": tuple(args.lines),
+        "speakers": (args.min_speakers, args.max_speakers),
+        "with_speakers": args.with_speakers,
+        "with_characters": args.with_characters,
+        "per_episode": args.per_episode,
+        "token_budget": args.token_budget,
+        "seed": args.seed,
+    }
+    main(criteria, show=args.show, season=args.season, name=args.name, txt=args.txt, dry_run=args.dry_run)
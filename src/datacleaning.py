@@ -1,68 +1,340 @@
+"""
+Script splitting
+
+Splits TV scripts into seasons, episodes and scenes, for any number of shows.
+
+Each show in SHOWS names a script in data/ and, optionally, its own marker regexes
+(season and episode patterns must capture the number) and scene brackets.
+
+1. One streaming pass over the script finds the byte range of every season and episode.
+2. Seasons and episodes are then processed in parallel by a process pool. Each worker
+   streams its byte range line by line through a small state machine: a scene starts
+   at "[", its header ends at the next "]", and the scene runs until the next "[" or
+   the end of the episode.
+3. All scenes go into the scene store (scene_store.py) in one write and are indexed
+   (scene_index.py), and a manifest with one row per scene (show, season, episode,
+   scene, byte offsets in the script, .txt path) is written to
+   data_output/script_manifest.csv.
+
+Output per show:
+    <output>/seasons/season_<s>.txt
+    <output>/season_<s>_episodes/episode_<e>.txt
+    <output>/season_<s>_scenes/episode_<e>_scene_<i>.txt  (only with --txt)
+
+Scripts are read as bytes, so offsets are exact. Undecodable bytes are dropped and
+line endings normalized in the written files, as when reading in text mode with
+errors="ignore". Markers are matched within a line.
+"""
+
 import os
 import re
+import csv
+import json
+import argparse
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
+
+from scene_index import build_index
+from scene_store import STORE_PATH, update_store
+
+BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+DATA_DIR = os.path.join(BASE_DIR, "data")
+OUTPUT_DIR = os.path.join(BASE_DIR, "data_output")
+MANIFEST_PATH = os.path.join(OUTPUT_DIR, "script_manifest.csv")
+
+MARKERS = {
+    "season_pattern": r"SEASON\s+(\d+)",
+    "episode_pattern": r"EPISODE\s+(\d+)",
+    "scene_start": "[",
+    "scene_end": "]",
+}
+
+# "output" is relative to data_output; "markers" overrides entries of MARKERS
+SHOWS = {
+    "derry_girls": {"script": "DERRY-GIRLS-SCRIPT.txt", "output": ""},
+}
+
+MANIFEST_COLUMNS = ["show", "season", "episode", "scene", "byte_start", "byte_end", "path"]
+
 
 def ensure_dirs(*dirs):
     for d in dirs:
         os.makedirs(d, exist_ok=True)
 
-def load_script(script_path):
-    with open(script_path, "r", encoding="utf-8", errors="ignore") as f:
-        return f.read()
-
-def split_seasons(full_text, seasons_dir):
-    season_split = full_text.split("SEASON 2", 1)
-    season1_text = season_split[0].strip()
-    season2_text = "SEASON 2" + season_split[1].strip()
-
-    with open(os.path.join(seasons_dir, "season_1.txt"), "w", encoding="utf-8") as f:
-        f.write(season1_text)
-    with open(os.path.join(seasons_dir, "season_2.txt"), "w", encoding="utf-8") as f:
-        f.write(season2_text)
-
-    return season2_text
-
-def split_episodes(season_text, episodes_dir):
-    episode_splits = re.split(r"(EPISODE\s+\d+)", season_text)
-    episode_splits = [e.strip() for e in episode_splits if e.strip()]
-
-    episodes = {}
-    for i in range(1, len(episode_splits), 2):
-        ep_name = episode_splits[i]
-        ep_text = episode_splits[i + 1] if i + 1 < len(episode_splits) else ""
-        ep_num = re.search(r"\d+", ep_name).group(0)
-        episodes[ep_num] = ep_text
-        ep_filename = os.path.join(episodes_dir, f"episode_{ep_num}.txt")
-        with open(ep_filename, "w", encoding="utf-8") as f:
-            f.write(f"EPISODE {ep_num}\n{ep_text}")
-    return episodes
-
-def split_scenes(episodes, scenes_dir):
-    for ep_num, ep_text in episodes.items():
-        scene_pattern = r"(\[.*?\].*?)(?=\[|$)"
-        scenes = re.findall(scene_pattern, ep_text, flags=re.DOTALL)
-        for i, scene_text in enumerate(scenes, start=1):
-            scene_filename = os.path.join(scenes_dir, f"episode_{ep_num}_scene_{i}.txt")
-            with open(scene_filename, "w", encoding="utf-8") as f:
-                f.write(scene_text.strip())
+def show_markers(config):
+    return {**MARKERS, **config.get("markers", {})}
 
-if __name__ == "__main__":
-    base_dir = os.path.join(os.path.dirname(__file__), "../data")
-    output_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), "../data_output"))
-    seasons_dir = os.path.join(output_dir, "seasons")
-    episodes_dir = os.path.join(output_dir, "season_2_episodes")
-    scenes_dir = os.path.join(output_dir, "season_2_scenes")
 
-    ensure_dirs(output_dir, seasons_dir, episodes_dir, scenes_dir)
+# -------------------- Reading --------------------
+def read_lines(script_path, start=0, end=None):
+    """(byte offset, line) for every line in [start, end). Lines are decoded with
+    surrogateescape, so undecodable bytes keep their place and offsets stay exact."""
+    with open(script_path, "rb") as f:
+        f.seek(start)
+        offset = start
+        for raw in f:
+            if end is not None and offset >= end:
+                break
+            if end is not None and offset + len(raw) > end:
+                raw = raw[:end - offset]
+            yield offset, raw.decode("utf-8", "surrogateescape")
+            offset += len(raw)
+
+def byte_offset(text, index):
+    """Byte length of text[:index] in the original file."""
+    return len(text[:index].encode("utf-8", "surrogateescape"))
+
+def clean(text):
+    """Text as written to the output files: undecodable bytes dropped, newlines normalized."""
+    text = text.replace("\r\n", "\n").replace("\r", "\n")
+    return text.encode("utf-8", "ignore").decode("utf-8")
+
+
+class StrippedWriter:
+    """Writes text to a file as if the whole text had been .strip()-ed first:
+    leading whitespace is skipped and trailing whitespace is held back until more
+    text follows it."""
+
+    def __init__(self, path, prefix=""):
+        self.f = open(path, "w", encoding="utf-8")
+        self.f.write(prefix)
+        self.started = False
+        self.pending = ""
+
+    def write(self, text):
+        if not self.started:
+            text = text.lstrip()
+            if not text:
+                return
+            self.started = True
+        body = text.rstrip()
+        if body:
+            self.f.write(self.pending + body)
+            self.pending = text[len(body):]
+        else:
+            self.pending += text
+
+    def close(self):
+        self.f.close()
+
+
+class SceneSplitter:
+    """Scene state machine for one episode. feed() yields (scene text, byte start,
+    byte end) for every scene completed by the new text; finish() yields the last one."""
+
+    def __init__(self, scene_start="[", scene_end="]"):
+        self.scene_start = scene_start
+        self.scene_end = scene_end
+        self.parts = None
+        self.in_header = False
+        self.start_offset = None
 
-    script_path = os.path.join(base_dir, "DERRY-GIRLS-SCRIPT.txt")
-    full_text = load_script(script_path)
+    def _scene(self, end_offset):
+        return clean("".join(self.parts)).strip(), self.start_offset, end_offset
 
-    if "SEASON 2" not in full_text:
-        raise ValueError("No 'SEASON 2' marker found in text.")
+    def feed(self, text, offset=0):
+        while text:
+            if self.parts is None:
+                start = text.find(self.scene_start)
+                if start < 0:
+                    return
+                offset += byte_offset(text, start)
+                text = text[start:]
+                self.parts = []
+                self.in_header = True
+                self.start_offset = offset
+            if self.in_header:
+                end = text.find(self.scene_end)
+                if end < 0:
+                    self.parts.append(text)
+                    return
+                end += len(self.scene_end)
+                self.parts.append(text[:end])
+                offset += byte_offset(text, end)
+                text = text[end:]
+                self.in_header = False
+            nxt = text.find(self.scene_start)
+            if nxt < 0:
+                self.parts.append(text)
+                return
+            self.parts.append(text[:nxt])
+            offset += byte_offset(text, nxt)
+            text = text[nxt:]
+            yield self._scene(offset)
+            self.parts = None
 
-    season2_text = split_seasons(full_text, seasons_dir)
-    episodes = split_episodes(season2_text, episodes_dir)
-    split_scenes(episodes, scenes_dir)
+    def finish(self, end_offset=None):
+        # A "[" without a closing "]" never forms a scene
+        if self.parts is not None and not self.in_header:
+            yield self._scene(end_offset)
+        self.parts = None
+
+def split_scenes(text, scene_start="[", scene_end="]"):
+    """All scenes of an episode text, stripped."""
+    splitter = SceneSplitter(scene_start, scene_end)
+    scenes = list(splitter.feed(text)) + list(splitter.finish())
+    return [scene for scene, _, _ in scenes]
+
+
+# -------------------- Index --------------------
+def index_script(script_path, markers=MARKERS):
+    """
+    One streaming pass over the script. Returns (seasons, episodes): lists of dicts with
+    the season/episode number and the byte range [start, end). A season range starts at
+    its marker; an episode range starts right after its marker and ends at the next
+    season or episode marker. Without any season marker, episodes belong to season "1".
+    """
+    season_re = re.compile(markers["season_pattern"])
+    episode_re = re.compile(markers["episode_pattern"])
+    seasons, episodes = [], []
+
+    for offset, line in read_lines(script_path):
+        found = [("season", m) for m in season_re.finditer(line)]
+        found += [("episode", m) for m in episode_re.finditer(line)]
+        for kind, m in sorted(found, key=lambda item: item[1].start()):
+            pos = offset + byte_offset(line, m.start())
+            if episodes and episodes[-1]["end"] is None:
+                episodes[-1]["end"] = pos
+            if kind == "season":
+                if seasons:
+                    seasons[-1]["end"] = pos
+                seasons.append({"season": m.group(1), "start": pos, "end": None})
+            else:
+                if not seasons:
+                    seasons.append({"season": "1", "start": 0, "end": None})
+                episodes.append({"season": seasons[-1]["season"], "episode": m.group(1),
+                                 "start": offset + byte_offset(line, m.end()), "end": None})
+
+    size = os.path.getsize(script_path)
+    for segment in seasons + episodes:
+        if segment["end"] is None:
+            segment["end"] = size
+
+    seen = set()
+    for ep in episodes:
+        key = (ep["season"], ep["episode"])
+        if key in seen:
+            raise ValueError(f"{script_path}: season {key[0]} episode {key[1]} appears more than once; "
+                             "tighten the episode pattern.")
+        seen.add(key)
+    return seasons, episodes
+
+def season_episodes(script_path, season, markers=MARKERS):
+    """{episode number: stripped episode text} for one season."""
+    _, episodes = index_script(script_path, markers)
+    return {
+        ep["episode"]: clean("".join(line for _, line in read_lines(script_path, ep["start"], ep["end"]))).strip()
+        for ep in episodes if ep["season"] == str(season)
+    }
+
+
+# -------------------- Workers --------------------
+def write_season(job):
+    writer = StrippedWriter(job["path"])
+    try:
+        for _, line in read_lines(job["script"], job["start"], job["end"]):
+            writer.write(clean(line))
+    finally:
+        writer.close()
+
+def split_episode(job):
+    """Write one episode (and, with job["txt"], its scene files); returns one row per scene."""
+    markers = job["markers"]
+    splitter = SceneSplitter(markers["scene_start"], markers["scene_end"])
+    writer = StrippedWriter(job["path"], prefix=f"EPISODE {job['episode']}\n")
+    rows = []
+
+    def save(scenes):
+        for scene_text, byte_start, byte_end in scenes:
+            filename = f"episode_{job['episode']}_scene_{len(rows) + 1}.txt"
+            if job["txt"]:
+                with open(os.path.join(job["scenes_dir"], filename), "w", encoding="utf-8") as f:
+                    f.write(scene_text)
+            rows.append({
+                "show": job["show"], "season": job["season"], "episode": job["episode"],
+                "scene": len(rows) + 1, "byte_start": byte_start, "byte_end": byte_end,
+                "path": os.path.relpath(os.path.join(job["scenes_dir"], filename), job["output_root"]),
+                "text": scene_text,
+            })
+
+    try:
+        for offset, line in read_lines(job["script"], job["start"], job["end"]):
+            writer.write(clean(line))
+            save(splitter.feed(line, offset))
+        save(splitter.finish(job["end"]))
+    finally:
+        writer.close()
+    return rows
+
+
+# -------------------- Driver --------------------
+def show_jobs(show, config, data_dir=DATA_DIR, output_root=OUTPUT_DIR, txt=False):
+    script_path = os.path.join(data_dir, config["script"])
+    markers = show_markers(config)
+    out = os.path.join(output_root, config.get("output", show))
+    seasons_dir = os.path.join(out, "seasons")
+    ensure_dirs(seasons_dir)
+
+    seasons, episodes = index_script(script_path, markers)
+    season_jobs = [
+        {"script": script_path, "start": s["start"], "end": s["end"],
+         "path": os.path.join(seasons_dir, f"season_{s['season']}.txt")}
+        for s in seasons
+    ]
+    episode_jobs = []
+    for ep in episodes:
+        episodes_dir = os.path.join(out, f"season_{ep['season']}_episodes")
+        scenes_dir = os.path.join(out, f"season_{ep['season']}_scenes")
+        ensure_dirs(episodes_dir, *([scenes_dir] if txt else []))
+        episode_jobs.append({
+            **ep, "show": show, "script": script_path, "markers": markers,
+            "path": os.path.join(episodes_dir, f"episode_{ep['episode']}.txt"),
+            "scenes_dir": scenes_dir, "output_root": output_root, "txt": txt,
+        })
+    return season_jobs, episode_jobs
+
+def split_shows(shows=SHOWS, data_dir=DATA_DIR, output_root=OUTPUT_DIR, manifest_path=MANIFEST_PATH,
+                store_path=STORE_PATH, workers=None, txt=False):
+    season_jobs, episode_jobs = [], []
+    for show, config in shows.items():
+        s_jobs, e_jobs = show_jobs(show, config, data_dir, output_root, txt=txt)
+        season_jobs += s_jobs
+        episode_jobs += e_jobs
+        print(f"{show}: {len(s_jobs)} seasons, {len(e_jobs)} episodes")
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        list(pool.map(write_season, season_jobs))
+        rows = [row for ep_rows in pool.map(split_episode, episode_jobs) for row in ep_rows]
+
+    with open(manifest_path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.DictWriter(f, fieldnames=MANIFEST_COLUMNS, extrasaction="ignore")
+        writer.writeheader()
+        writer.writerows(rows)
+
+    scenes = pd.DataFrame(rows, columns=MANIFEST_COLUMNS + ["text"]).drop(columns="path")
+    update_store(scenes, store_path)
+    print(f"Saved {len(rows)} scenes to {store_path}; manifest at {manifest_path}")
+    build_index(store_path)
+    return rows
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Split scripts into seasons, episodes and scenes")
+    parser.add_argument("--config", default=None,
+                        help="JSON file mapping show names to {script, output, markers}; defaults to SHOWS")
+    parser.add_argument("--shows", nargs="+", default=None, help="Only split these shows")
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes (default: CPU count)")
+    parser.add_argument("--txt", action="store_true", help="Also write one .txt file per scene")
+    args = parser.parse_args()
 
-    print("Seasons, episodes, and scenes saved.")
+    shows = SHOWS
+    if args.config:
+        with open(args.config, "r", encoding="utf-8") as f:
+            shows = json.load(f)
+    if args.shows:
+        unknown = [s for s in args.shows if s not in shows]
+        if unknown:
+            raise ValueError(f"Unknown shows: {', '.join(unknown)}. Choose from: {', '.join(shows)}")
+        shows = {s: shows[s] for s in args.shows}
 
+    split_shows(shows, workers=args.workers, txt=args.txt)
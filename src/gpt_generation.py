@@ -0,0 +1,288 @@
+"""
+GPT scene generation
+
+Importable, asynchronous version of the generation loop in GPT_prompting_API.ipynb.
+Every summary in scene_summaries_MEETING.csv is turned into a prompt (season 1 context
++ summary + number of lines) and sent to an OpenAI-compatible chat completions API.
+
+- Requests run concurrently, bounded by `concurrency`.
+- A token-bucket limiter keeps requests/min and tokens/min under the account limits.
+- Rate-limit and transient errors are retried with jittered exponential backoff;
+  a Retry-After header from the server takes precedence and pauses every worker.
+- Each result is appended to a .partial.jsonl file as soon as it arrives, so an
+  interrupted run resumes with the rows that are still missing. Records are keyed by
+  scene_file and a hash of the request (model, prompt, max_tokens and sampling), so a
+  resume after the summaries changed only reuses records of unchanged rows. The final
+  CSV is written in input order.
+- Answers are stored in a ResponseCache, so identical requests (same model, prompt,
+  max_tokens and sampling settings) are never sent to the API twice.
+
+Point `base_url` (or OPENAI_BASE_URL) at a local fake server to test without the API.
+"""
+
+import os
+import csv
+import json
+import time
+import random
+import asyncio
+import argparse
+from email.utils import parsedate_to_datetime
+
+from dotenv import load_dotenv
+from openai import APIConnectionError, APITimeoutError, AsyncOpenAI, InternalServerError, RateLimitError
+
+from response_cache import MODES as CACHE_MODES, ResponseCache, request_key
+
+BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+SEASON1_PATH = os.path.join(BASE_DIR, "data_output", "season1_chunk.txt")
+SUMMARIES_PATH = os.path.join(BASE_DIR, "data_output", "summaries_MEETING", "scene_summaries_MEETING.csv")
+OUTPUT_PATH = os.path.join(BASE_DIR, "data_output", "GPT5_scenes.csv")
+CACHE_PATH = os.path.join(BASE_DIR, "data_output", "llm_cache.sqlite")
+
+RETRYABLE_ERRORS = (RateLimitError, APIConnectionError, APITimeoutError, InternalServerError)
+
+
+# -------------------- Prompt --------------------
+def build_prompt(season1_text, row):
+    return f"""Ignore all previous messages.
+You have access to the following baseline text from Season 1:
+---
+{season1_text}
+---
+Now make a manuscript for a scene in Season 2.
+Ensure the scene sticks to the actions as explained by the summary.
+Keep the tone and characters true to the first season.
+Do your best to keep the number of lines similar to the number given.
+
+Summary: {row['summary']}
+Number of lines: {row['num_lines']}
+"""
+
+def estimate_tokens(prompt, max_tokens):
+    """Rough token cost of a request (about 4 characters per token, plus the completion budget)."""
+    return len(prompt) // 4 + max_tokens
+
+
+# -------------------- Rate limiting --------------------
+class TokenBucket:
+    """Allows `per_minute` units per minute, refilled continuously, with bursts up to one minute's worth."""
+
+    def __init__(self, per_minute):
+        self.capacity = per_minute
+        self.available = per_minute
+        self.rate = per_minute / 60
+        self.updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.available = min(self.capacity, self.available + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount):
+        """Seconds until `amount` units are available (0 if they are available now)."""
+        self._refill()
+        amount = min(amount, self.capacity)
+        return max(0.0, (amount - self.available) / self.rate)
+
+    def take(self, amount):
+        self.available -= min(amount, self.capacity)
+
+
+class RateLimiter:
+    """Request and token budgets shared by all workers, plus a global pause for Retry-After."""
+
+    def __init__(self, requests_per_minute=500, tokens_per_minute=200_000):
+        self.requests = TokenBucket(requests_per_minute)
+        self.tokens = TokenBucket(tokens_per_minute)
+        self.paused_until = 0.0
+        self.lock = asyncio.Lock()
+
+    def pause(self, seconds):
+        self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+
+    async def acquire(self, n_tokens):
+        async with self.lock:
+            while True:
+                wait = max(self.paused_until - time.monotonic(),
+                           self.requests.wait_time(1),
+                           self.tokens.wait_time(n_tokens))
+                if wait <= 0:
+                    break
+                await asyncio.sleep(wait)
+            self.requests.take(1)
+            self.tokens.take(n_tokens)
+
+
+def retry_after_seconds(error):
+    """Server-requested wait from retry-after-ms / retry-after headers, or None."""
+    response = getattr(error, "response", None)
+    if response is None:
+        return None
+    headers = response.headers
+    try:
+        if "retry-after-ms" in headers:
+            return float(headers["retry-after-ms"]) / 1000
+        if "retry-after" in headers:
+            value = headers["retry-after"]
+            try:
+                return float(value)
+            except ValueError:
+                return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+    return None
+
+
+# -------------------- Requests --------------------
+async def complete(client, limiter, prompt, model, max_tokens, max_retries=6, base_delay=2.0, max_delay=60.0,
+                   cache=None, sampling=None):
+    """One chat completion with caching, rate limiting and retries.
+    `sampling` holds any further request settings (temperature, top_p, ...)."""
+    sampling = sampling or {}
+    if cache is not None:
+        cached = cache.get(model, prompt, max_tokens, **sampling)
+        if cached is not None:
+            return cached
+
+    n_tokens = estimate_tokens(prompt, max_tokens)
+    for attempt in range(max_retries):
+        await limiter.acquire(n_tokens)
+        try:
+            completion = await client.chat.completions.create(
+                model=model,
+                messages=[{"role": "user", "content": prompt}],
+                max_tokens=max_tokens,
+                **sampling
+            )
+            response = completion.choices[0].message.content
+            if cache is not None:
+                cache.put(model, prompt, max_tokens, response, **sampling)
+            return response
+        except RETRYABLE_ERRORS as e:
+            if attempt == max_retries - 1:
+                raise
+            retry_after = retry_after_seconds(e)
+            if retry_after is not None:
+                # The server knows best: every worker holds off, plus a little jitter
+                wait = retry_after + random.uniform(0, 0.1 * retry_after + 0.1)
+                limiter.pause(wait)
+            else:
+                # Full jitter exponential backoff
+                wait = random.uniform(0, min(max_delay, base_delay * 2 ** attempt))
+            print(f"{type(e).__name__}; retrying in {wait:.2f}s (attempt {attempt + 1}/{max_retries})")
+            await asyncio.sleep(wait)
+
+
+def read_partial(partial_path):
+    """Results of earlier (possibly interrupted) runs, keyed by (scene_file, input hash)."""
+    done = {}
+    if not os.path.exists(partial_path):
+        return done
+    with open(partial_path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue  # half-written last line from a crash
+            if "input_hash" in record:  # records of older versions were keyed by row position only
+                done[(record["scene_file"], record["input_hash"])] = record
+    return done
+
+
+async def generate_scenes(rows, season1_text, output_path=OUTPUT_PATH, model="gpt-5-search-api",
+                          max_tokens=200, concurrency=8, requests_per_minute=500, tokens_per_minute=200_000,
+                          client=None, base_url=None, api_key=None, cache=None, sampling=None):
+    """
+    Generate one scene per summary row and write them to `output_path` (CSV, input order).
+    Results are streamed to `<output_path>.partial.jsonl` as they complete; rows whose
+    scene_file and request are already in that file are not requested again. With a
+    ResponseCache, previously answered prompts are served from the cache.
+    """
+    if client is None:
+        client = AsyncOpenAI(api_key=api_key or os.getenv("OPENAI_API_KEY"), base_url=base_url, max_retries=0)
+    limiter = RateLimiter(requests_per_minute, tokens_per_minute)
+    semaphore = asyncio.Semaphore(concurrency)
+
+    prompts = [build_prompt(season1_text, row) for row in rows]
+    keys = [(row.get("scene_file", ""), request_key(model, prompt, max_tokens, **(sampling or {})))
+            for row, prompt in zip(rows, prompts)]
+
+    partial_path = output_path + ".partial.jsonl"
+    done = read_partial(partial_path)  # records of rows that changed since are never looked up
+    # One request per distinct key; rows with the same key share its scene
+    todo = list({key: i for i, key in enumerate(keys) if key not in done}.values())
+    print(f"{sum(key in done for key in keys)} scenes already generated, {len(todo)} to go")
+
+    with open(partial_path, "a", encoding="utf-8") as partial:
+        async def worker(i):
+            row = rows[i]
+            async with semaphore:
+                scene = await complete(client, limiter, prompts[i], model, max_tokens,
+                                       cache=cache, sampling=sampling)
+            record = {"scene_file": keys[i][0], "input_hash": keys[i][1], "num_lines": row["num_lines"],
+                      "summary": row["summary"], "scene": scene}
+            partial.write(json.dumps(record, ensure_ascii=False) + "\n")
+            partial.flush()
+            done[keys[i]] = record
+
+        results = await asyncio.gather(*(worker(i) for i in todo), return_exceptions=True)
+
+    if cache is not None:
+        print("Response cache:", cache.stats())
+
+    failures = [r for r in results if isinstance(r, Exception)]
+    if failures:
+        raise RuntimeError(f"{len(failures)} of {len(todo)} requests failed; "
+                           f"re-run to retry them. First error: {failures[0]!r}")
+
+    fieldnames = ["num_lines", "summary", "scene"]
+    if any(row.get("scene_file") for row in rows):
+        fieldnames.append("scene_file")
+    with open(output_path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.DictWriter(f, fieldnames=fieldnames, extrasaction="ignore")
+        writer.writeheader()
+        writer.writerows({**row, "scene": done[key]["scene"]} for row, key in zip(rows, keys))
+    os.remove(partial_path)
+    print(f"Saved {len(rows)} generated scenes to {output_path}")
+    return output_path
+
+
+def load_rows(summaries_path=SUMMARIES_PATH, limit=None):
+    with open(summaries_path, newline="", encoding="utf-8") as f:
+        rows = list(csv.DictReader(f))
+    return rows[:limit] if limit else rows
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate Season 2 scenes from the scene summaries")
+    parser.add_argument("--model", default="gpt-5-search-api")
+    parser.add_argument("--max-tokens", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=8, help="Requests in flight at once")
+    parser.add_argument("--rpm", type=int, default=500, help="Requests per minute limit")
+    parser.add_argument("--tpm", type=int, default=200_000, help="Tokens per minute limit")
+    parser.add_argument("--base-url", default=None, help="OpenAI-compatible endpoint (e.g. a local test server)")
+    parser.add_argument("--limit", type=int, default=None, help="Only generate the first N scenes")
+    parser.add_argument("--output", default=OUTPUT_PATH)
+    parser.add_argument("--temperature", type=float, default=None)
+    parser.add_argument("--cache", default=CACHE_PATH, help="Path of the response cache")
+    parser.add_argument("--cache-mode", default="use", choices=CACHE_MODES,
+                        help="use: read and write; refresh: ask the API again and overwrite; bypass: no cache")
+    args = parser.parse_args()
+
+    load_dotenv()  # reads .env file automatically
+
+    with open(SEASON1_PATH, "r", encoding="utf-8") as f:
+        season1_text = f.read().strip()
+
+    sampling = {} if args.temperature is None else {"temperature": args.temperature}
+    cache = ResponseCache(args.cache, mode=args.cache_mode)
+    try:
+        asyncio.run(generate_scenes(
+            load_rows(limit=args.limit), season1_text, output_path=args.output, model=args.model,
+            max_tokens=args.max_tokens, concurrency=args.concurrency,
+            requests_per_minute=args.rpm, tokens_per_minute=args.tpm, base_url=args.base_url,
+            cache=cache, sampling=sampling,
+        ))
+    finally:
+        cache.close()
@@ -0,0 +1,247 @@
+"""
+lab.js experiment data
+
+Loader for the lab.js exports of the study (data/Manuscript-study-full-data.csv and
+data/Manuscript-study-incremental-data.csv).
+
+An export is a sequence of segments. Each segment starts with its own header row:
+the study was edited while it ran, so later segments have extra columns ("competency",
+"number", ...) and the full-data export also has a "url" column and an unnamed empty one.
+
+1. The header rows are located with a byte search, so each segment can be parsed with
+   the right columns.
+2. Each segment is read by pandas in chunks, with explicit compact dtypes:
+   - categoricals for repeated strings (sender, task, gender, country, the scene texts, ...)
+   - floats for timings and slider answers
+   - a boolean for switch
+   - UTC datetimes for timestamp
+3. The meta JSON (browser, screen, location) is only sent with the first row of a
+   session. Each distinct blob is parsed once into a side table (meta); rows refer to
+   it by meta_id, filled forward over the rest of the participant's rows.
+
+read_export() returns every row; trial_table() and participant_table() turn them into
+tidy tables with one row per trial and one row per participant.
+
+    python labjs_data.py                       # both exports, prints a summary
+    python labjs_data.py --out ../data_output/study
+"""
+
+import io
+import os
+import json
+import mmap
+import hashlib
+import argparse
+import numpy as np
+import pandas as pd
+
+BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+DATA_DIR = os.path.join(BASE_DIR, "data")
+FULL_DATA_PATH = os.path.join(DATA_DIR, "Manuscript-study-full-data.csv")
+INCREMENTAL_DATA_PATH = os.path.join(DATA_DIR, "Manuscript-study-incremental-data.csv")
+
+# A segment's header row starts with one of these
+HEADER_PREFIXES = [b"url,meta,sender,", b"meta,sender,sender_type,"]
+DROP_COLUMNS = ["url"]  # always "[object Object]"; the unnamed empty column is dropped too
+
+CATEGORY_COLUMNS = ["sender", "sender_type", "sender_id", "ended_on", "openLabId", "type", "task", "project",
+                    "status", "code", "gender", "english", "education", "country", "textLLM", "textHuman",
+                    "response", "response_action"]
+TIMING_COLUMNS = ["duration", "time_run", "time_render", "time_show", "time_end", "time_commit", "time_switch"]
+QUESTION_COLUMNS = ["competency", "attitude", "impact", "creative_humor", "accept_plot", "negative_diversity",
+                    "original_human", "accept_dialogue", "creative_story", "creative_characters",
+                    "negative_audience", "accept_edit", "better_llm", "negative_writers", "accept_script",
+                    "diminish_originality"]
+DTYPES = {
+    **{col: "category" for col in CATEGORY_COLUMNS + ["meta", "switch"]},
+    **{col: "float64" for col in TIMING_COLUMNS},
+    **{col: "float32" for col in QUESTION_COLUMNS + ["age", "number"]},
+    "confirmationCode": "string",
+    "timestamp": "string",
+}
+
+TRIAL_SENDER = "Showing scenes"
+TRIAL_COLUMNS = ["openLabId", "trial", "sender_id", "timestamp", "duration", "textLLM", "textHuman", "switch",
+                 "response", "response_action", "ended_on"]
+PARTICIPANT_COLUMNS = ["task", "code", "confirmationCode", "age", "gender", "english", "education", "country",
+                       *QUESTION_COLUMNS, "meta_id"]
+
+
+# -------------------- Segments --------------------
+def header_offsets(path, start=0, end=None):
+    """Byte offsets of the header rows in bytes [start, end) of an export."""
+    with open(path, "rb") as f:
+        size = os.fstat(f.fileno()).st_size
+        end = size if end is None else min(end, size)
+        if end <= start:
+            return []
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            found = {start} if any(mm[start:start + len(p)] == p for p in HEADER_PREFIXES) else set()
+            for prefix in HEADER_PREFIXES:
+                pos = mm.find(b"\n" + prefix, start, end)
+                while pos != -1:
+                    found.add(pos + 1)
+                    pos = mm.find(b"\n" + prefix, pos + 1, end)
+    return sorted(found)
+
+def find_segments(path, start=0, end=None):
+    """[(start, end)] byte ranges of the segments in bytes [start, end); each begins with its header row."""
+    end = os.path.getsize(path) if end is None else end
+    starts = header_offsets(path, start, end)
+    if end > start and (not starts or starts[0] != start):
+        raise ValueError(f"{path}: no header row at byte {start}")
+    return list(zip(starts, starts[1:] + [end]))
+
+class ByteRange(io.RawIOBase):
+    """Read-only view of bytes [start, end) of a file."""
+
+    def __init__(self, path, start, end):
+        self.file = open(path, "rb")
+        self.file.seek(start)
+        self.remaining = end - start
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        n = self.file.readinto(memoryview(buffer)[:min(len(buffer), self.remaining)])
+        self.remaining -= n
+        return n
+
+    def close(self):
+        self.file.close()
+        super().close()
+
+def header_names(header):
+    """Column names of a header row as pandas names them (the empty column becomes "Unnamed: i")."""
+    return [name or f"Unnamed: {i}" for i, name in enumerate(header)]
+
+def read_segment(path, start, end, chunksize=100_000, names=None):
+    """Chunks (DataFrames) of the rows in bytes [start, end) of an export, with DTYPES applied.
+    Without `names` the range starts with its header row; with them it only holds data rows."""
+    options = {"header": 0} if names is None else {"header": None, "names": header_names(names)}
+    with io.BufferedReader(ByteRange(path, start, end), buffer_size=1 << 20) as f:
+        for chunk in pd.read_csv(f, dtype=DTYPES, chunksize=chunksize, encoding="utf-8",
+                                 usecols=lambda c: c not in DROP_COLUMNS and not c.startswith("Unnamed"),
+                                 **options):
+            yield chunk
+
+
+# -------------------- Typing --------------------
+class MetaTable:
+    """Distinct meta JSON blobs, each parsed once and numbered in order of appearance.
+    `ids` (blob hash -> meta_id) continues the numbering of blobs seen before."""
+
+    def __init__(self, ids=None):
+        self.ids = dict(ids or {})
+        self.first_id = len(self.ids)
+        self.records = []  # blobs first seen by this table
+
+    def ids_for(self, values):
+        """meta_id for each value of a categorical meta column (missing stays missing)."""
+        codes = []
+        for blob in values.cat.categories:
+            key = hashlib.sha1(blob.encode("utf-8")).hexdigest()
+            if key not in self.ids:
+                self.ids[key] = len(self.ids)
+                self.records.append(json.loads(blob))
+            codes.append(self.ids[key])
+        lookup = np.array(codes + [-1], dtype=np.int64)
+        ids = lookup[values.cat.codes.to_numpy()]  # code -1 (missing) picks the trailing -1
+        return pd.array(np.where(ids < 0, None, ids), dtype="Int32")
+
+    def table(self):
+        """The blobs first seen by this table, flattened, indexed by meta_id."""
+        meta = pd.json_normalize(self.records) if self.records else pd.DataFrame()
+        meta.index = pd.RangeIndex(self.first_id, self.first_id + len(meta), name="meta_id")
+        return meta
+
+def type_chunk(chunk, meta):
+    """Final dtypes for one chunk: meta JSON replaced by meta_id, switch as boolean, parsed timestamps."""
+    chunk = chunk.copy()
+    if "meta" in chunk.columns:
+        chunk["meta_id"] = meta.ids_for(chunk.pop("meta"))
+    if "switch" in chunk.columns:
+        chunk["switch"] = chunk["switch"].map({"true": True, "false": False}).astype("boolean")
+    if "timestamp" in chunk.columns:
+        chunk["timestamp"] = pd.to_datetime(chunk["timestamp"], utc=True, format="ISO8601")
+    return chunk
+
+def concat_chunks(chunks):
+    """Concatenate chunks whose columns and categories differ, keeping categoricals categorical."""
+    chunks = [c for c in chunks if len(c)]
+    if not chunks:
+        return pd.DataFrame()
+    columns = list(dict.fromkeys(col for chunk in chunks for col in chunk.columns))
+    for col in columns:
+        parts = [chunk[col] for chunk in chunks if col in chunk.columns]
+        if any(isinstance(p.dtype, pd.CategoricalDtype) for p in parts):
+            # A chunk where the column is empty has no (string) categories, so union_categoricals won't do
+            categories = dict.fromkeys(c for p in parts for c in p.astype("category").cat.categories)
+            dtype = pd.CategoricalDtype(list(categories))
+            for chunk in chunks:
+                if col in chunk.columns:
+                    chunk[col] = chunk[col].astype(dtype)
+                else:
+                    chunk[col] = pd.Categorical([None] * len(chunk), dtype=dtype)
+    return pd.concat([chunk.reindex(columns=columns) for chunk in chunks], ignore_index=True)
+
+def finish_rows(rows):
+    """Fill meta_id forward over each participant's rows."""
+    if "meta_id" in rows.columns and len(rows):
+        rows["meta_id"] = rows.groupby("openLabId", observed=True)["meta_id"].ffill()
+    return rows
+
+
+# -------------------- Loading --------------------
+def read_export(path, chunksize=100_000):
+    """
+    (rows, meta) of a lab.js export: every row with compact dtypes and a meta_id, and the
+    parsed meta side table indexed by meta_id.
+    """
+    meta = MetaTable()
+    chunks = []
+    for start, end in find_segments(path):
+        chunks += [type_chunk(chunk, meta) for chunk in read_segment(path, start, end, chunksize)]
+    return finish_rows(concat_chunks(chunks)), meta.table()
+
+def trial_table(rows):
+    """One row per trial (a pair of scenes shown and the answer), in order per participant."""
+    trials = rows[rows["sender"] == TRIAL_SENDER]
+    trials = trials.sort_values(["openLabId", "timestamp"], kind="stable")
+    trials = trials.assign(trial=trials.groupby("openLabId", observed=True).cumcount().astype("int16"))
+    return trials.reindex(columns=TRIAL_COLUMNS).reset_index(drop=True)
+
+def participant_table(rows):
+    """One row per participant: the first answer given to each demographic and questionnaire item,
+    and the number of trials."""
+    columns = [c for c in PARTICIPANT_COLUMNS if c in rows.columns]
+    participants = rows.groupby("openLabId", observed=True)[columns].first()
+    trials = rows[rows["sender"] == TRIAL_SENDER].groupby("openLabId", observed=True).size()
+    participants["n_trials"] = trials.reindex(participants.index, fill_value=0).astype("int16")
+    return participants.reset_index()
+
+
+def summary(rows, meta, name=""):
+    mb = rows.memory_usage(deep=True).sum() / 1e6
+    print(f"{name}: {len(rows)} rows, {rows['openLabId'].nunique()} participants, "
+          f"{len(meta)} distinct meta blobs, {mb:.2f} MB in memory")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load lab.js exports into typed, tidy tables")
+    parser.add_argument("paths", nargs="*", default=[FULL_DATA_PATH, INCREMENTAL_DATA_PATH])
+    parser.add_argument("--chunksize", type=int, default=100_000)
+    parser.add_argument("--out", default=None, help="Write <name>_trials/_participants/_meta.parquet here")
+    args = parser.parse_args()
+
+    for path in args.paths:
+        rows, meta = read_export(path, chunksize=args.chunksize)
+        name = os.path.splitext(os.path.basename(path))[0]
+        summary(rows, meta, name)
+        if args.out:
+            os.makedirs(args.out, exist_ok=True)
+            trial_table(rows).to_parquet(os.path.join(args.out, f"{name}_trials.parquet"), index=False)
+            participant_table(rows).to_parquet(os.path.join(args.out, f"{name}_participants.parquet"), index=False)
+            meta.to_parquet(os.path.join(args.out, f"{name}_meta.parquet"))
+            print(f"Saved tables to {args.out}")
@@ -0,0 +1,288 @@
+"""
+Incremental ingestion of the lab.js exports
+
+While the study is live, Manuscript-study-incremental-data.csv grows as participants
+submit. Instead of parsing it again on every refresh, ingest() keeps a watermark per
+export and only parses the rows appended since the last run (labjs_data.py does the
+parsing).
+
+The watermark of an export holds:
+- the byte offset up to which rows have been ingested (only complete lines are
+  ingested, so a row being written is picked up next time);
+- the header row in effect at that offset;
+- hashes of the first and last bytes before it, so a file that was rewritten rather
+  than appended to is detected and ingested again from the start;
+- per openLabId, the last timestamp and sender_id seen. Appended rows at or before that
+  point are duplicates (e.g. a session that was exported again) and are dropped.
+
+New rows are written as Parquet parts under data_output/study/rows/, new meta blobs
+under data_output/study/meta/. Parts are compacted into one once there are more than
+MAX_PARTS. participants.parquet holds one row per participant and is updated in place:
+only participants with new rows are recomputed.
+
+Sessions in the full-data export are complete. When a participant appears there,
+their (partial) rows from the incremental export are no longer used: load_rows() and the
+participant table take that participant's rows from the full-data export only.
+
+    python labjs_ingest.py              # ingest whatever was appended
+    python labjs_ingest.py --every 5    # and again every 5 minutes
+    python labjs_ingest.py --reset      # start over (only deletes the files written here)
+"""
+
+import os
+import csv
+import glob
+import json
+import time
+import shutil
+import hashlib
+import argparse
+import pandas as pd
+
+from labjs_data import (FULL_DATA_PATH, INCREMENTAL_DATA_PATH, MetaTable, concat_chunks, header_offsets,
+                        participant_table, read_segment, trial_table, type_chunk)
+
+BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+STUDY_DIR = os.path.join(BASE_DIR, "data_output", "study")
+SOURCES = {"full": FULL_DATA_PATH, "incremental": INCREMENTAL_DATA_PATH}
+CHECK_BYTES = 64 * 1024
+MAX_PARTS = 64
+
+
+# -------------------- State --------------------
+def state_path(study_dir):
+    return os.path.join(study_dir, "ingest_state.json")
+
+def load_state(study_dir=STUDY_DIR):
+    if not os.path.exists(state_path(study_dir)):
+        return {"sources": {}, "meta_ids": {}, "next_part": 0}
+    with open(state_path(study_dir), "r", encoding="utf-8") as f:
+        return json.load(f)
+
+def save_state(state, study_dir=STUDY_DIR):
+    os.makedirs(study_dir, exist_ok=True)
+    tmp_path = state_path(study_dir) + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(state, f)
+    os.replace(tmp_path, state_path(study_dir))
+
+def range_hash(path, start, end):
+    with open(path, "rb") as f:
+        f.seek(start)
+        return hashlib.sha256(f.read(max(0, end - start))).hexdigest()
+
+def file_checks(path, offset):
+    """Hashes of the first and the last CHECK_BYTES bytes before `offset`."""
+    return [range_hash(path, 0, min(offset, CHECK_BYTES)), range_hash(path, max(0, offset - CHECK_BYTES), offset)]
+
+def appended_only(path, mark):
+    """Whether the file still starts with the bytes that were ingested."""
+    return os.path.getsize(path) >= mark["offset"] and file_checks(path, mark["offset"]) == mark["checks"]
+
+def complete_end(path, start):
+    """Offset just past the last complete line after `start` (start if there is none)."""
+    with open(path, "rb") as f:
+        size = os.fstat(f.fileno()).st_size
+        pos = size
+        while pos > start:
+            block_start = max(start, pos - (1 << 16))
+            f.seek(block_start)
+            newline = f.read(pos - block_start).rfind(b"\n")
+            if newline != -1:
+                return block_start + newline + 1
+            pos = block_start
+    return start
+
+def header_at(path, offset):
+    with open(path, "rb") as f:
+        f.seek(offset)
+        return next(csv.reader([f.readline().decode("utf-8")]))
+
+
+# -------------------- Parts --------------------
+def part_paths(study_dir, kind, source="*"):
+    return sorted(glob.glob(os.path.join(study_dir, kind, f"{source}-*.parquet")))
+
+def write_part(df, study_dir, kind, source, state):
+    os.makedirs(os.path.join(study_dir, kind), exist_ok=True)
+    path = os.path.join(study_dir, kind, f"{source}-{state['next_part']:06d}.parquet")
+    state["next_part"] += 1
+    df.to_parquet(path, index=kind == "meta")
+    return path
+
+def read_parts(paths, filters=None):
+    return concat_chunks([pd.read_parquet(path, filters=filters) for path in paths])
+
+def compact(study_dir, source, state):
+    """Merge a source's row parts into one once there are too many."""
+    paths = part_paths(study_dir, "rows", source)
+    if len(paths) > MAX_PARTS:
+        write_part(read_parts(paths), study_dir, "rows", source, state)
+        for path in paths:
+            os.remove(path)
+
+
+# -------------------- Ingestion --------------------
+def drop_seen(rows, seen):
+    """Rows after each participant's watermark (last timestamp, sender_id), without repeats."""
+    rows = rows.drop_duplicates(["openLabId", "timestamp", "sender_id"])
+    if not seen or rows.empty:
+        return rows
+    ids = rows["openLabId"].astype(object)
+    last_ts = pd.to_datetime(ids.map(lambda i: seen.get(i, {}).get("timestamp")), utc=True)
+    last_sender = ids.map(lambda i: seen.get(i, {}).get("sender_id"))
+    old = (rows["timestamp"] < last_ts) | ((rows["timestamp"] == last_ts)
+                                           & (rows["sender_id"].astype(object) == last_sender))
+    return rows[~old.fillna(False).astype(bool)]
+
+def update_watermarks(rows, seen):
+    """Record each participant's last row (and meta_id) in `seen`."""
+    last = rows.sort_values("timestamp", kind="stable").groupby("openLabId", observed=True).last()
+    for participant, row in last.iterrows():
+        previous = seen.get(participant, {})
+        meta_id = row.get("meta_id")
+        seen[participant] = {
+            "timestamp": row["timestamp"].isoformat(),
+            "sender_id": None if pd.isna(row["sender_id"]) else str(row["sender_id"]),
+            "meta_id": previous.get("meta_id") if pd.isna(meta_id) else int(meta_id),
+        }
+
+def ingest_source(source, path, state, study_dir=STUDY_DIR, chunksize=100_000):
+    """Parse the rows appended to one export since its watermark. Returns the new rows."""
+    mark = state["sources"].get(source)
+    if mark and not appended_only(path, mark):
+        print(f"{source}: {path} was rewritten, ingesting it again")
+        for part in part_paths(study_dir, "rows", source):
+            os.remove(part)
+        del state["sources"][source]
+        mark = None
+    mark = mark or {"offset": 0, "header": None, "participants": {}}
+
+    start, end = mark["offset"], complete_end(path, mark["offset"])
+    if end <= start:
+        return pd.DataFrame()
+
+    headers = header_offsets(path, start, end)
+    ranges = []
+    if not headers or headers[0] != start:
+        if mark["header"] is None:
+            raise ValueError(f"{path}: no header row at byte {start}")
+        ranges.append((start, headers[0] if headers else end, mark["header"]))
+    ranges += [(h, nxt, None) for h, nxt in zip(headers, headers[1:] + [end])]
+
+    meta = MetaTable(state["meta_ids"])
+    chunks = [type_chunk(chunk, meta) for s, e, names in ranges
+              for chunk in read_segment(path, s, e, chunksize, names=names)]
+    rows = drop_seen(concat_chunks(chunks), mark["participants"])
+
+    if not rows.empty:
+        # meta is only on a session's first row, which may have been ingested earlier
+        known = rows["openLabId"].astype(object).map(
+            lambda i: mark["participants"].get(i, {}).get("meta_id")).astype("Int32")
+        rows["meta_id"] = rows.groupby("openLabId", observed=True)["meta_id"].ffill().fillna(known)
+        write_part(rows, study_dir, "rows", source, state)
+        update_watermarks(rows, mark["participants"])
+    if meta.records:
+        write_part(meta.table(), study_dir, "meta", source, state)
+    state["meta_ids"] = meta.ids
+
+    if headers:
+        mark["header"] = header_at(path, headers[-1])
+    mark["offset"] = end
+    mark["checks"] = file_checks(path, end)
+    state["sources"][source] = mark
+    compact(study_dir, source, state)
+    return rows
+
+def load_rows(study_dir=STUDY_DIR, ids=None, state=None):
+    """Every ingested row (or those of the participants `ids`): full-data rows, plus incremental
+    rows of participants who are not in the full-data export."""
+    state = state or load_state(study_dir)
+    filters = [("openLabId", "in", sorted(ids))] if ids is not None else None
+    full_ids = set(state["sources"].get("full", {}).get("participants", {}))
+    parts = []
+    for source in SOURCES:
+        rows = read_parts(part_paths(study_dir, "rows", source), filters)
+        if source != "full" and not rows.empty:
+            rows = rows[~rows["openLabId"].astype(object).isin(full_ids)]
+        if not rows.empty:
+            parts.append(rows.assign(source=source))
+    return concat_chunks(parts)
+
+def load_meta(study_dir=STUDY_DIR):
+    """The meta side table, indexed by meta_id."""
+    paths = part_paths(study_dir, "meta")
+    return pd.concat([pd.read_parquet(path) for path in paths]).sort_index() if paths else pd.DataFrame()
+
+def participant_aggregates(rows):
+    """participant_table plus where the data came from, how far the participant got and when."""
+    participants = participant_table(rows).set_index("openLabId")
+    by_participant = rows.groupby("openLabId", observed=True)
+    participants["source"] = by_participant["source"].first()
+    participants["n_rows"] = by_participant.size()
+    participants["complete"] = rows["sender"].eq("End").groupby(rows["openLabId"], observed=True).any()
+    participants["last_timestamp"] = by_participant["timestamp"].max()
+    return participants.reset_index()
+
+def update_participants(ids, study_dir=STUDY_DIR, state=None):
+    """Recompute the aggregates of the participants `ids` in participants.parquet."""
+    path = os.path.join(study_dir, "participants.parquet")
+    existing = pd.read_parquet(path) if os.path.exists(path) else pd.DataFrame()
+    rows = load_rows(study_dir, ids, state)
+    updated = participant_aggregates(rows) if not rows.empty else pd.DataFrame()
+    if not existing.empty:
+        existing = existing[~existing["openLabId"].astype(object).isin(ids)]
+    participants = concat_chunks([existing, updated]).sort_values("openLabId").reset_index(drop=True)
+    tmp_path = path + ".tmp"
+    participants.to_parquet(tmp_path, index=False)
+    os.replace(tmp_path, path)
+    return participants
+
+def ingest(sources=SOURCES, study_dir=STUDY_DIR, chunksize=100_000):
+    """Ingest what was appended to each export and update the affected participants.
+    Returns {source: number of new rows}."""
+    state = load_state(study_dir)
+    added, touched = {}, set()
+    for source, path in sources.items():
+        before = set(state["sources"].get(source, {}).get("participants", {}))
+        rows = ingest_source(source, path, state, study_dir, chunksize)
+        added[source] = len(rows)
+        if not rows.empty:
+            touched |= set(rows["openLabId"].dropna().astype(str))
+        # participants whose rows went away with a rewritten export
+        touched |= before - set(state["sources"].get(source, {}).get("participants", {}))
+    save_state(state, study_dir)
+    if touched:
+        update_participants(touched, study_dir, state)
+    print(", ".join(f"{source}: +{n} rows" for source, n in added.items())
+          + f"; {len(touched)} participants updated")
+    return added
+
+def reset(study_dir=STUDY_DIR):
+    """Delete what ingest() wrote (other tables in study_dir, e.g. from labjs_data.py, are kept)."""
+    for path in [state_path(study_dir), os.path.join(study_dir, "participants.parquet")]:
+        if os.path.exists(path):
+            os.remove(path)
+    for kind in ["rows", "meta"]:
+        shutil.rmtree(os.path.join(study_dir, kind), ignore_errors=True)
+
+def trials(study_dir=STUDY_DIR):
+    """Trial rows of every ingested participant (see labjs_data.trial_table)."""
+    return trial_table(load_rows(study_dir))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Ingest rows appended to the lab.js exports")
+    parser.add_argument("--study-dir", default=STUDY_DIR)
+    parser.add_argument("--chunksize", type=int, default=100_000)
+    parser.add_argument("--reset", action="store_true", help="Forget the watermarks and ingest everything again")
+    parser.add_argument("--every", type=float, default=None, metavar="MINUTES", help="Keep ingesting at this interval")
+    args = parser.parse_args()
+
+    if args.reset:
+        reset(args.study_dir)
+    while True:
+        ingest(study_dir=args.study_dir, chunksize=args.chunksize)
+        if args.every is None:
+            break
+        time.sleep(args.every * 60)
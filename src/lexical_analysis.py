@@ -25,135 +25,230 @@ Input: overview.csv
 Intermediate output: lexical_analysis.csv
 Final output: lexical_summary.csv
 
+spaCy is only loaded when the first text is parsed, so importing the metric functions
+is cheap. main() is the command line entry point.
 """
 
-import spacy
+import os
+import json
+import argparse
+import numpy as np
 import pandas as pd
-import math
+from functools import lru_cache
 from tqdm import tqdm
 
+from lexical_cache import MetricCache
+from lexical_kernels import MTLD_MIN_SEGMENT, MTLD_THRESHOLD, cttr, mtld, mtld_calc, ttr
 
-# -------------------- Setup --------------------
-nlp = spacy.load("en_core_web_sm")
-tqdm.pandas()
-
-# Paths
-FINAL_DF_PATH = "../data_output/lexical_analysis/overview.csv"
-LEXICAL_ANALYSIS_PATH = "../data_output/lexical_analysis/lexical_analysis.csv"
-LEXICAL_SUMMARY_PATH = "../data_output/lexical_analysis/lexical_summary.csv"
 
-# Read overview
-df = pd.read_csv(FINAL_DF_PATH)
+# -------------------- Setup --------------------
+BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+LEXICAL_DIR = os.path.join(BASE_DIR, "data_output", "lexical_analysis")
+FINAL_DF_PATH = os.path.join(LEXICAL_DIR, "overview.csv")
+LEXICAL_ANALYSIS_PATH = os.path.join(LEXICAL_DIR, "lexical_analysis.csv")
+LEXICAL_SUMMARY_PATH = os.path.join(LEXICAL_DIR, "lexical_summary.csv")
+METRIC_CACHE_PATH = os.path.join(LEXICAL_DIR, "metric_cache.sqlite")
+
+# Pipeline components the metrics never read (they only use is_alpha and sentence boundaries)
+UNUSED_COMPONENTS = ["tagger", "attribute_ruler", "lemmatizer", "ner"]
+
+def load_nlp(model_name="en_core_web_sm", sentencizer=False):
+    """Load spaCy without the components the metrics don't need.
+    With sentencizer=True the parser is replaced by the rule-based sentencizer,
+    which is much faster but may split sentences slightly differently."""
+    import spacy
+    nlp = spacy.load(model_name, exclude=UNUSED_COMPONENTS)
+    if sentencizer:
+        for name in list(nlp.pipe_names):
+            nlp.remove_pipe(name)
+        nlp.add_pipe("sentencizer")
+    return nlp
+
+_nlp = None
+
+def get_nlp():
+    """The spaCy pipeline used by the metrics, loaded on first use."""
+    global _nlp
+    if _nlp is None:
+        _nlp = load_nlp()
+    return _nlp
+
+def use_nlp(nlp):
+    """Compute the metrics with another pipeline, e.g. load_nlp(sentencizer=True)."""
+    global _nlp
+    _nlp = nlp
+    text_features.cache_clear()
 
 # Columns to analyze (human vs LLM)
 TEXT_COLS = ["human_scene", "summary", "LLM_scene"]
 
-# -------------------- Functions (unchanged) --------------------
+# Metric names, in the order the per-text results are reported
+METRICS = ["word_count", "sentence_count", "avg_sentence_length", "TTR", "CTTR", "MTLD"]
+
+# -------------------- Parsing --------------------
+@lru_cache(maxsize=4096)
+def text_features(text):
+    """Parse a text once and keep only what the metrics need (see doc_features)."""
+    return doc_features(get_nlp()(text))
+
+def doc_features(doc):
+    """Token ids (spaCy LOWER hashes) of the alphabetic tokens, and alphabetic tokens per sentence.
+    Read straight from Doc.to_array, without creating Token objects or strings."""
+    from spacy.attrs import IS_ALPHA, LOWER, SENT_START
+    arr = doc.to_array([LOWER, IS_ALPHA, SENT_START])
+    is_alpha = arr[:, 1] == 1
+    sent_starts = np.flatnonzero(arr[:, 2] == 1)
+    if len(sent_starts) == 0 or sent_starts[0] != 0:
+        # The first token always starts a sentence (doc.sents treats it that way)
+        sent_starts = np.concatenate(([0], sent_starts))
+    sent_lengths = np.add.reduceat(is_alpha.astype(np.int64), sent_starts)
+    return arr[is_alpha, 0], sent_lengths
+
+def is_empty(text):
+    return not isinstance(text, str) or text.strip() == ""
+
+# -------------------- Metrics --------------------
+def metrics_from_features(ids, sent_lengths):
+    """Compute every lexical metric from the compact representation of one text."""
+    n_tokens = len(ids)
+    n_sents = len(sent_lengths)
+    return {
+        "word_count": n_tokens,
+        "sentence_count": n_sents,
+        "avg_sentence_length": int(sent_lengths.sum()) / n_sents if n_sents else 0,
+        "TTR": ttr(ids),
+        "CTTR": cttr(ids),
+        "MTLD": mtld(ids, MTLD_THRESHOLD, MTLD_MIN_SEGMENT),
+    }
+
+def lexical_metrics(text):
+    """All metrics for one text, parsing it only once."""
+    if is_empty(text):
+        return dict.fromkeys(METRICS, 0)
+    return metrics_from_features(*text_features(text))
+
+def cache_namespace():
+    """Everything besides the text itself that the cached metrics depend on."""
+    import spacy
+    nlp = get_nlp()
+    return json.dumps({
+        "spacy": spacy.__version__,
+        "model": f"{nlp.meta['lang']}_{nlp.meta['name']}",
+        "model_version": nlp.meta["version"],
+        "pipeline": nlp.pipe_names,
+        "mtld_threshold": MTLD_THRESHOLD,
+        "mtld_min_segment": MTLD_MIN_SEGMENT,
+    }, sort_keys=True)
+
+def batch_lexical_metrics(texts, batch_size=64, n_process=1, desc=None, cache=None):
+    """All metrics for a sequence of texts, parsed in batches with nlp.pipe.
+    Results are returned in input order; duplicate texts are parsed only once,
+    and texts already in the (optional) MetricCache are not parsed at all."""
+    texts = list(texts)
+    unique_texts = list(dict.fromkeys(t for t in texts if not is_empty(t)))
+
+    metrics_by_text = cache.get_many(unique_texts) if cache is not None else {}
+    to_parse = [t for t in unique_texts if t not in metrics_by_text]
+    docs = get_nlp().pipe(to_parse, batch_size=batch_size, n_process=n_process)
+
+    parsed = {}
+    for text, doc in tqdm(zip(to_parse, docs), total=len(to_parse), desc=desc):
+        parsed[text] = metrics_from_features(*doc_features(doc))
+    if cache is not None and parsed:
+        cache.put_many(parsed)
+    metrics_by_text.update(parsed)
+
+    return [dict.fromkeys(METRICS, 0) if is_empty(t) else metrics_by_text[t] for t in texts]
+
+# Single-metric helpers, kept for interactive use. They share the parse cache,
+# so asking for several metrics of the same text only runs spaCy once.
 def spacy_word_count(text):
-    if not isinstance(text, str) or text.strip() == "":
-        return 0
-    doc = nlp(text)
-    return sum(1 for t in doc if t.is_alpha)
+    return lexical_metrics(text)["word_count"]
 
 def sentence_count(text):
-    if not isinstance(text, str) or text.strip() == "":
-        return 0
-    return len(list(nlp(text).sents))
+    return lexical_metrics(text)["sentence_count"]
 
 def avg_sentence_length(text):
-    if not isinstance(text, str) or text.strip() == "":
-        return 0
-    sentences = list(nlp(text).sents)
-    if len(sentences) == 0:
-        return 0
-    total_words = sum(len([t for t in sent if t.is_alpha]) for sent in sentences)
-    return total_words / len(sentences)
+    return lexical_metrics(text)["avg_sentence_length"]
 
 def ttr_spacy(text):
-    if not isinstance(text, str) or text.strip() == "":
-        return 0
-    tokens = [t.text.lower() for t in nlp(text) if t.is_alpha]
-    if len(tokens) == 0: return 0
-    return len(set(tokens))/len(tokens)
+    return lexical_metrics(text)["TTR"]
 
 def cttr_spacy(text):
-    if not isinstance(text, str) or text.strip() == "":
-        return 0
-    tokens = [t.text.lower() for t in nlp(text) if t.is_alpha]
-    n_tokens = len(tokens)
-    if n_tokens == 0: return 0
-    return len(set(tokens)) / math.sqrt(2*n_tokens)
-
-def mtld_calc(tokens, ttr_threshold=0.72, min_segment=10):
-    if len(tokens)==0: return 0
-    factors=0
-    types=set()
-    token_count=0
-    for tok in tokens:
-        token_count+=1
-        types.add(tok)
-        current_ttr=len(types)/token_count
-        if token_count>=min_segment and current_ttr<=ttr_threshold:
-            factors+=1
-            types=set()
-            token_count=0
-    if token_count!=0:
-        factors+=(1-(len(types)/token_count-ttr_threshold)/(1-ttr_threshold))
-    return 0 if factors==0 else len(tokens)/factors
+    return lexical_metrics(text)["CTTR"]
 
 def mtld_spacy(text):
-    if not isinstance(text, str) or text.strip() == "":
-        return 0
-    tokens = [t.text.lower() for t in nlp(text) if t.is_alpha]
-    if len(tokens)==0: return 0
-    return (mtld_calc(tokens)+mtld_calc(list(reversed(tokens))))/2
+    return lexical_metrics(text)["MTLD"]
 
-# -------------------- Main --------------------
-if __name__=="__main__":
-    # Initialize dataframe with filename for complete per-row analysis
-    lex_df = pd.DataFrame()
-    lex_df["filename"] = df["filename"]
-    
-    print("Computing word counts...")
-    for col in TEXT_COLS:
-        lex_df[f"{col}_word_count"] = df[col].progress_apply(spacy_word_count)
-    
-    print("Computing sentence metrics...")
-    for col in TEXT_COLS:
-        lex_df[f"{col}_sentence_count"] = df[col].progress_apply(sentence_count)
-        lex_df[f"{col}_avg_sentence_length"] = df[col].progress_apply(avg_sentence_length)
-    
-    print("Computing TTR...")
-    for col in TEXT_COLS:
-        lex_df[f"{col}_TTR"] = df[col].progress_apply(ttr_spacy)
-    
-    print("Computing CTTR...")
+def output_columns():
+    """Column order of lexical_analysis.csv."""
+    cols = [f"{col}_word_count" for col in TEXT_COLS]
     for col in TEXT_COLS:
-        lex_df[f"{col}_CTTR"] = df[col].progress_apply(cttr_spacy)
-    
-    print("Computing MTLD...")
+        cols += [f"{col}_sentence_count", f"{col}_avg_sentence_length"]
+    for metric in ["TTR", "CTTR", "MTLD"]:
+        cols += [f"{col}_{metric}" for col in TEXT_COLS]
+    return cols
+
+def analyze(df, batch_size=64, n_process=1, cache=None):
+    """Per-row metrics for every text column of an overview dataframe (lexical_analysis.csv).
+    Each cell is parsed once; all metrics come from the same parse."""
+    lex_df = pd.DataFrame({"filename": df["filename"]})
     for col in TEXT_COLS:
-        lex_df[f"{col}_MTLD"] = df[col].progress_apply(mtld_spacy)
-    
+        results = batch_lexical_metrics(df[col], batch_size=batch_size, n_process=n_process,
+                                        desc=col, cache=cache)
+        metrics = pd.DataFrame(results, index=df.index)
+        for metric in METRICS:
+            lex_df[f"{col}_{metric}"] = metrics[metric]
+    return lex_df[["filename"] + output_columns()]
+
+def summary_stats(df_metrics):
+    """Mean, min, max and SD of every metric column (lexical_summary.csv, for plotting)."""
+    cols = [c for c in df_metrics.columns if c != "filename"]
+    return pd.DataFrame({
+        "Mean": df_metrics[cols].mean(),
+        "Min": df_metrics[cols].min(),
+        "Max": df_metrics[cols].max(),
+        "SD": df_metrics[cols].std()
+    }).round(3)
+
+# -------------------- Main --------------------
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compute lexical metrics for overview.csv")
+    parser.add_argument("--input", default=FINAL_DF_PATH, help="overview.csv written by lexical_preproc.py")
+    parser.add_argument("--batch-size", type=int, default=64, help="Texts per nlp.pipe batch")
+    parser.add_argument("--n-process", type=int, default=1, help="Worker processes for nlp.pipe")
+    parser.add_argument("--sentencizer", action="store_true",
+                        help="Use the rule-based sentencizer instead of the dependency parser")
+    parser.add_argument("--cache", default=METRIC_CACHE_PATH, help="Path of the on-disk metric cache")
+    parser.add_argument("--cache-size", type=int, default=200_000, help="Maximum number of cached texts")
+    parser.add_argument("--no-cache", action="store_true", help="Recompute everything and don't touch the cache")
+    args = parser.parse_args(argv)
+
+    if args.sentencizer:
+        use_nlp(load_nlp(sentencizer=True))
+    cache = None if args.no_cache else MetricCache(args.cache, cache_namespace(), max_entries=args.cache_size)
+
+    print("Computing lexical metrics...")
+    lex_df = analyze(pd.read_csv(args.input), batch_size=args.batch_size, n_process=args.n_process, cache=cache)
+    if cache is not None:
+        print(f"Metric cache: {cache.hits} hits, {cache.misses} misses ({args.cache})")
+        cache.close()
+
     # Save complete lexical analysis with ALL metrics per row (for logistic regression)
+    os.makedirs(LEXICAL_DIR, exist_ok=True)
     lex_df.to_csv(LEXICAL_ANALYSIS_PATH, index=False)
     print(f"✓ Saved complete lexical analysis to {LEXICAL_ANALYSIS_PATH}")
 
-    # Summary stats function (for plotting)
-    def summary_stats(df_metrics):
-        cols = [c for c in df_metrics.columns if c != "filename"]
-        return pd.DataFrame({
-            "Mean": df_metrics[cols].mean(),
-            "Min": df_metrics[cols].min(),
-            "Max": df_metrics[cols].max(),
-            "SD": df_metrics[cols].std()
-        }).round(3)
-
     # Create summary from the complete dataframe (for averaged plotting)
     lexical_summary = summary_stats(lex_df)
     lexical_summary.to_csv(LEXICAL_SUMMARY_PATH)
     print(f"✓ Saved lexical summary to {LEXICAL_SUMMARY_PATH}")
-    
+
     print("\n✓ Lexical analysis finished")
     print(f"  - Per-row metrics (for regression): {LEXICAL_ANALYSIS_PATH}")
-    print(f"  - Aggregated stats (for plotting): {LEXICAL_SUMMARY_PATH}")
\ No newline at end of file
+    print(f"  - Aggregated stats (for plotting): {LEXICAL_SUMMARY_PATH}")
+    return lex_df
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""
+Lexical metric cache
+
+Persistent, content-addressed cache for the per-text results of lexical_analysis.py.
+Each entry is keyed by a SHA-256 hash of the text together with a namespace string
+describing everything else the result depends on (spaCy model and version, pipeline
+components, metric parameters). Changing any of those simply produces new keys, so
+stale results are never returned.
+
+The cache lives in a single SQLite file and is bounded to `max_entries` rows; when it
+grows past that, the least recently used entries are evicted.
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import time
+
+
+def text_key(namespace, text):
+    return hashlib.sha256(f"{namespace}\0{text}".encode("utf-8")).hexdigest()
+
+
+class MetricCache:
+    def __init__(self, path, namespace, max_entries=200_000):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.path = path
+        self.namespace = namespace
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.conn = sqlite3.connect(path)
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS metrics ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, last_used REAL NOT NULL)"
+        )
+        self.conn.execute("CREATE INDEX IF NOT EXISTS metrics_last_used ON metrics (last_used)")
+        self.conn.commit()
+
+    def get_many(self, texts):
+        """Return {text: metrics} for the texts that are already cached."""
+        keys = {text_key(self.namespace, t): t for t in texts}
+        found = {}
+        key_list = list(keys)
+        # Stay below SQLite's limit on bound parameters
+        for i in range(0, len(key_list), 500):
+            chunk = key_list[i:i + 500]
+            rows = self.conn.execute(
+                f"SELECT key, value FROM metrics WHERE key IN ({','.join('?' * len(chunk))})", chunk
+            ).fetchall()
+            for key, value in rows:
+                found[keys[key]] = json.loads(value)
+
+        now = time.time()
+        self.conn.executemany(
+            "UPDATE metrics SET last_used = ? WHERE key = ?",
+            [(now, text_key(self.namespace, t)) for t in found],
+        )
+        self.conn.commit()
+        self.hits += len(found)
+        self.misses += len(keys) - len(found)
+        return found
+
+    def put_many(self, results):
+        """Store {text: metrics} and evict the oldest entries if the cache is over size."""
+        now = time.time()
+        self.conn.executemany(
+            "INSERT OR REPLACE INTO metrics (key, value, last_used) VALUES (?, ?, ?)",
+            [(text_key(self.namespace, t), json.dumps(m), now) for t, m in results.items()],
+        )
+        self.conn.commit()
+        self.evict()
+
+    def evict(self):
+        (count,) = self.conn.execute("SELECT COUNT(*) FROM metrics").fetchone()
+        excess = count - self.max_entries
+        if excess > 0:
+            self.conn.execute(
+                "DELETE FROM metrics WHERE key IN "
+                "(SELECT key FROM metrics ORDER BY last_used ASC LIMIT ?)",
+                (excess,),
+            )
+            self.conn.commit()
+
+    def close(self):
+        self.conn.close()
@@ -0,0 +1,212 @@
+"""
+Lexical diversity kernels
+
+NumPy implementations of the lexical diversity measures used in lexical_analysis.py.
+A text is represented as an integer id array with one id per alphabetic, lowercased
+token. spaCy already provides such ids (the LOWER hash from Doc.to_array), so the
+measures never create Token objects, Python strings, per-token sets or reversed
+copies of the token list.
+
+Everything is built on two "gap" arrays computed from a single sort:
+- gap_prev[i]: distance back to the previous token with the same id
+- gap_next[i]: distance forward to the next token with the same id
+(both len(ids) + 1 when there is none). A token at offset k of a segment is a new
+type for that segment exactly when gap_prev >= k + 1, which is all MTLD and MATTR need.
+
+Measures:
+- TTR, CTTR
+- MTLD (forward and backward factor counts; matches mtld_calc exactly)
+- MATTR (moving-average TTR)
+- HD-D (hypergeometric distribution diversity)
+
+Run this file directly for a microbenchmark against the previous pure-Python path.
+"""
+
+import math
+import time
+from functools import lru_cache
+import numpy as np
+
+# MTLD parameters
+MTLD_THRESHOLD = 0.72
+MTLD_MIN_SEGMENT = 10
+
+
+# -------------------- Id arrays --------------------
+def token_ids(tokens):
+    """Map a sequence of string tokens to dense integer ids 0..n_types-1."""
+    tokens = np.asarray(tokens)
+    if tokens.size == 0:
+        return np.zeros(0, dtype=np.int64)
+    _, ids = np.unique(tokens, return_inverse=True)
+    return ids.reshape(-1).astype(np.int64)
+
+def occurrence_gaps(ids):
+    """(gap_prev, gap_next) for every token; len(ids) + 1 where there is no other occurrence."""
+    n = len(ids)
+    order = np.argsort(ids, kind="stable")
+    sorted_ids = ids[order]
+    same = sorted_ids[1:] == sorted_ids[:-1]
+    earlier = order[:-1][same]
+    later = order[1:][same]
+    gap_prev = np.full(n, n + 1, dtype=np.int64)
+    gap_next = np.full(n, n + 1, dtype=np.int64)
+    gap_prev[later] = later - earlier
+    gap_next[earlier] = later - earlier
+    return gap_prev, gap_next
+
+def n_types(ids):
+    return len(np.unique(ids))
+
+
+# -------------------- TTR / CTTR --------------------
+def ttr(ids):
+    n = len(ids)
+    return n_types(ids) / n if n else 0
+
+def cttr(ids):
+    n = len(ids)
+    return n_types(ids) / math.sqrt(2*n) if n else 0
+
+
+# -------------------- MTLD --------------------
+@lru_cache(maxsize=8)
+def _max_types_table(size, ttr_threshold):
+    counts = np.arange(size)
+    counts[0] = 1
+    limit = np.floor(ttr_threshold * counts).astype(np.int64)
+    limit = np.where((limit + 1) / counts <= ttr_threshold, limit + 1, limit)
+    limit = np.where(limit / counts > ttr_threshold, limit - 1, limit)
+    return limit.tolist()
+
+def max_types_table(n, ttr_threshold=MTLD_THRESHOLD):
+    """limit[c] = largest number of types t for which t/c <= ttr_threshold, for c = 0..n.
+    Uses the same float division as mtld_calc, so boundary cases agree exactly.
+    Tables are cached and sized in powers of two, so they are shared across texts."""
+    size = 1 << (n + 1).bit_length()
+    return _max_types_table(size, ttr_threshold)
+
+def mtld_walk(gaps, limit, min_segment=MTLD_MIN_SEGMENT):
+    """Walk one direction over a gap list.
+    Returns (complete factors, tokens and types left in the unfinished segment)."""
+    # Factor boundaries depend on each other, so this is a sequential scan; it only does
+    # integer comparisons against precomputed arrays and allocates nothing per token.
+    factors = 0
+    count = 0
+    types = 0
+    for gap in gaps:
+        count += 1
+        if gap >= count:
+            types += 1
+        if count >= min_segment and types <= limit[count]:
+            factors += 1
+            count = 0
+            types = 0
+    return factors, count, types
+
+def mtld_score(n, factors, count, types, ttr_threshold=MTLD_THRESHOLD):
+    if count != 0:
+        factors += (1-(types/count-ttr_threshold)/(1-ttr_threshold))
+    return 0 if factors == 0 else n/factors
+
+def mtld(ids, ttr_threshold=MTLD_THRESHOLD, min_segment=MTLD_MIN_SEGMENT, gaps=None):
+    """Bidirectional MTLD, identical to (mtld_calc(tokens) + mtld_calc(reversed tokens)) / 2.
+    The backward pass walks gap_next in reverse, so no reversed token copy is needed."""
+    n = len(ids)
+    if n == 0: return 0
+    gap_prev, gap_next = occurrence_gaps(ids) if gaps is None else gaps
+    limit = max_types_table(n, ttr_threshold)
+    forward = mtld_score(n, *mtld_walk(gap_prev.tolist(), limit, min_segment), ttr_threshold)
+    backward = mtld_score(n, *mtld_walk(gap_next[::-1].tolist(), limit, min_segment), ttr_threshold)
+    return (forward + backward)/2
+
+def mtld_calc(tokens, ttr_threshold=MTLD_THRESHOLD, min_segment=MTLD_MIN_SEGMENT):
+    """Reference pure-Python MTLD pass over string tokens."""
+    if len(tokens)==0: return 0
+    factors=0
+    types=set()
+    token_count=0
+    for tok in tokens:
+        token_count+=1
+        types.add(tok)
+        current_ttr=len(types)/token_count
+        if token_count>=min_segment and current_ttr<=ttr_threshold:
+            factors+=1
+            types=set()
+            token_count=0
+    if token_count!=0:
+        factors+=(1-(len(types)/token_count-ttr_threshold)/(1-ttr_threshold))
+    return 0 if factors==0 else len(tokens)/factors
+
+
+# -------------------- Moving-average variants --------------------
+def mattr(ids, window=50, gaps=None):
+    """Moving-average TTR over all windows of `window` tokens (plain TTR for shorter texts)."""
+    n = len(ids)
+    if n == 0: return 0
+    if n <= window: return ttr(ids)
+    gap_prev, gap_next = occurrence_gaps(ids) if gaps is None else gaps
+
+    first = np.count_nonzero(gap_prev[:window] > np.arange(window))
+    # Sliding the window one token right: the entering token is new if its previous
+    # occurrence is outside the window, and the leaving token takes its type with it
+    # unless it occurs again inside the window
+    entered = gap_prev[window:] >= window
+    left = gap_next[:n - window] >= window
+    types = first + np.concatenate(([0], np.cumsum(entered.astype(np.int64) - left)))
+    return float(np.mean(types / window))
+
+def hdd(ids, sample_size=42):
+    """HD-D: expected TTR of a random sample of `sample_size` tokens (0 for shorter texts)."""
+    n = len(ids)
+    if n < sample_size: return 0
+    _, freqs = np.unique(ids, return_counts=True)
+    k = np.arange(sample_size)
+    # P(type absent from the sample) = C(n - f, s) / C(n, s) = prod_k (n - f - k) / (n - k)
+    p_absent = np.prod(np.clip((n - freqs[:, None] - k) / (n - k), 0, None), axis=1)
+    return float(np.sum(1 - p_absent) / sample_size)
+
+
+# -------------------- Microbenchmark --------------------
+def synthetic_text(n_words, vocab_size=5000, seed=0):
+    """Zipf-distributed words in ten-word sentences, roughly like running text."""
+    rng = np.random.default_rng(seed)
+    ranks = np.minimum(rng.zipf(1.3, size=n_words), vocab_size)
+    letters = "abcdefghijklmnopqrstuvwxyz"
+    words = ["".join(letters[int(d)] for d in str(r)) for r in ranks]
+    return " ".join(w + ("." if i % 10 == 9 else "") for i, w in enumerate(words))
+
+def python_diversity(doc):
+    """TTR, CTTR and MTLD the way lexical_analysis computed them before the kernels."""
+    tokens = [t.text.lower() for t in doc if t.is_alpha]
+    n = len(tokens)
+    types = len(set(tokens))
+    return types/n, types/math.sqrt(2*n), (mtld_calc(tokens) + mtld_calc(list(reversed(tokens))))/2
+
+def kernel_diversity(doc):
+    """The same three measures from Doc.to_array ids."""
+    from spacy.attrs import IS_ALPHA, LOWER
+    arr = doc.to_array([LOWER, IS_ALPHA])
+    ids = arr[arr[:, 1] == 1, 0]
+    return ttr(ids), cttr(ids), mtld(ids)
+
+def benchmark(lengths=(1_000, 10_000, 100_000, 500_000), repeats=3):
+    import spacy
+    nlp = spacy.blank("en")
+    nlp.max_length = 10_000_000
+    print(f"{'tokens':>10} {'python (s)':>12} {'kernel (s)':>12} {'speedup':>9}")
+    for n_words in lengths:
+        doc = nlp(synthetic_text(n_words))
+        assert python_diversity(doc) == kernel_diversity(doc)
+        t_py = min(_timed(python_diversity, doc) for _ in range(repeats))
+        t_np = min(_timed(kernel_diversity, doc) for _ in range(repeats))
+        print(f"{n_words:>10} {t_py:>12.4f} {t_np:>12.4f} {t_py/t_np:>8.1f}x")
+
+def _timed(func, *args):
+    start = time.perf_counter()
+    func(*args)
+    return time.perf_counter() - start
+
+
+if __name__ == "__main__":
+    benchmark()
@@ -1,156 +1,233 @@
-import pandas as pd
-import matplotlib.pyplot as plt
-import seaborn as sns
+"""
+Lexical plots
+
+Plots of the lexical metrics (lexical_analysis.py) for human vs LLM scenes:
+- a density plot per metric from the summary statistics (lexical_summary.csv)
+- a per-row plot per metric connecting each human scene to its LLM scene
+  (lexical_analysis.csv)
+
+Each plot is a job: its kind, its metric and the data it shows. The jobs are rendered
+by a process pool on the non-interactive Agg backend, with one Figure per job and no
+pyplot state. A per-row plot draws all of its connecting lines as one LineCollection
+and each group of points with one scatter call, so the number of artists does not grow
+with the number of scenes.
+
+plot_hashes.json in the output directory records a hash of each plot's data and of
+this file. A plot is only rendered again when that hash changes or its image is missing.
+"""
+
 import os
+import json
+import hashlib
+import argparse
+import numpy as np
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
+from matplotlib.collections import LineCollection
+from matplotlib.figure import Figure
 
 # -----------------------------
 # Paths
 # -----------------------------
-SUMMARY_PATH = "../data_output/lexical_analysis/lexical_summary.csv"
-ANALYSIS_PATH = "../data_output/lexical_analysis/lexical_analysis.csv"
-OUTPUT_DIR = "../data_output/lexical_analysis/plots"
+BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+LEXICAL_DIR = os.path.join(BASE_DIR, "data_output", "lexical_analysis")
+SUMMARY_PATH = os.path.join(LEXICAL_DIR, "lexical_summary.csv")
+ANALYSIS_PATH = os.path.join(LEXICAL_DIR, "lexical_analysis.csv")
+OUTPUT_DIR = os.path.join(LEXICAL_DIR, "plots")
+HASHES_FILE = "plot_hashes.json"
+
+# Metrics to plot per row
+METRICS = ["MTLD", "CTTR", "TTR", "avg_sentence_length", "sentence_count", "word_count"]
 
-os.makedirs(OUTPUT_DIR, exist_ok=True)
 
 # -----------------------------
 # Load the summary CSV
 # -----------------------------
-df = pd.read_csv(SUMMARY_PATH)
+def load_summary(summary_path=SUMMARY_PATH):
+    """Human and LLM rows of lexical_summary.csv, with text_type and metric columns."""
+    df = pd.read_csv(summary_path)
 
-# Only keep human and LLM rows
-df = df[df["Unnamed: 0"].str.contains("human|LLM")].copy()
+    # Only keep human and LLM rows
+    df = df[df["Unnamed: 0"].str.contains("human|LLM")].copy()
 
-# Clean metric names
-df["text_type"] = df["Unnamed: 0"].apply(lambda x: "Human" if "human" in x else "LLM")
-df["metric"] = df["Unnamed: 0"].apply(lambda x: x.replace("human_scene_", "")
-                                              .replace("LLM_scene_", ""))
+    # Clean metric names
+    df["text_type"] = df["Unnamed: 0"].apply(lambda x: "Human" if "human" in x else "LLM")
+    df["metric"] = df["Unnamed: 0"].apply(lambda x: x.replace("human_scene_", "")
+                                                  .replace("LLM_scene_", ""))
 
-df = df.drop(columns=["Unnamed: 0"])
+    return df.drop(columns=["Unnamed: 0"])
 
 # -----------------------------
 # Plotting function for summary stats
 # -----------------------------
-def make_density_plot(metric_name, mean_h, sd_h, mean_l, sd_l):
-    plt.figure(figsize=(8, 5))
+def make_density_plot(metric_name, mean_h, sd_h, mean_l, sd_l, out_path):
+    import seaborn as sns
+
+    fig = Figure(figsize=(8, 5))
+    ax = fig.subplots()
 
     # Create smooth density lines manually
     sns.kdeplot(
         pd.Series([mean_h - sd_h, mean_h, mean_h + sd_h]),
         label=f"Human (Mean={mean_h:.2f}, SD={sd_h:.2f})",
-        linestyle="--"
+        linestyle="--", ax=ax
     )
     sns.kdeplot(
         pd.Series([mean_l - sd_l, mean_l, mean_l + sd_l]),
         label=f"LLM (Mean={mean_l:.2f}, SD={sd_l:.2f})",
-        linestyle="-"
+        linestyle="-", ax=ax
     )
 
-    plt.title(f"Density Plot (Summary): {metric_name}")
-    plt.xlabel(metric_name)
-    plt.ylabel("Density")
-    plt.legend()
-
-    out_path = os.path.join(OUTPUT_DIR, f"{metric_name}_density_summary.png")
-    plt.savefig(out_path, dpi=300, bbox_inches="tight")
-    plt.close()
-    print("Saved:", out_path)
+    ax.set_title(f"Density Plot (Summary): {metric_name}")
+    ax.set_xlabel(metric_name)
+    ax.set_ylabel("Density")
+    ax.legend()
+
+    fig.savefig(out_path, dpi=300, bbox_inches="tight")
+    return out_path
+
+def density_jobs(df):
+    """A density plot job for each metric in the (load_summary) dataframe."""
+    jobs = []
+    for metric in df["metric"].unique():
+        row_h = df[(df["metric"] == metric) & (df["text_type"] == "Human")].iloc[0]
+        row_l = df[(df["metric"] == metric) & (df["text_type"] == "LLM")].iloc[0]
+        jobs.append({
+            "kind": "density", "metric": metric, "filename": f"{metric}_density_summary.png",
+            "data": [float(row_h["Mean"]), float(row_h["SD"]), float(row_l["Mean"]), float(row_l["SD"])],
+        })
+    return jobs
 
 # -----------------------------
-# Generate plots for each metric (summary)
+# Plotting function for per-row data (connected scatter plot with row number on y-axis)
 # -----------------------------
-print("Generating summary density plots...")
-for metric in df["metric"].unique():
-    row_h = df[(df["metric"] == metric) & (df["text_type"] == "Human")].iloc[0]
-    row_l = df[(df["metric"] == metric) & (df["text_type"] == "LLM")].iloc[0]
-
-    mean_h, sd_h = row_h["Mean"], row_h["SD"]
-    mean_l, sd_l = row_l["Mean"], row_l["SD"]
+def make_per_row_scatter_plot(metric_name, human, llm, out_path):
+    """`human` and `llm`: the metric per scene, one row per scene."""
+    human = np.asarray(human, dtype=float)
+    llm = np.asarray(llm, dtype=float)
+    rows = np.arange(len(human))
 
-    make_density_plot(metric, mean_h, sd_h, mean_l, sd_l)
+    fig = Figure(figsize=(10, 8))
+    ax = fig.subplots()
 
-print("\n✓ All summary density plots saved!")
-
-# -----------------------------
-# Load lexical_analysis.csv for per-row plotting
-# -----------------------------
-print("\nGenerating per-row density plots...")
-lex_df = pd.read_csv(ANALYSIS_PATH)
+    # One line per row connecting Human to LLM (horizontal line at the row number) - BLACK
+    segments = np.stack([np.column_stack([human, rows]), np.column_stack([llm, rows])], axis=1)
+    ax.add_collection(LineCollection(segments, colors="black", alpha=0.5, linewidths=1.5))
 
-# Define metrics to plot
-metrics = ["MTLD", "CTTR", "TTR", "avg_sentence_length", "sentence_count", "word_count"]
+    # Points - Human in blue, LLM in red
+    ax.scatter(human, rows, color="blue", s=50, alpha=0.8, zorder=3)
+    ax.scatter(llm, rows, color="red", s=50, alpha=0.8, zorder=3)
+    ax.autoscale_view()
 
-# -----------------------------
-# Plotting function for per-row data (connected scatter plot with row number on y-axis)
-# -----------------------------
-def make_per_row_scatter_plot(metric_name, df_subset):
-    plt.figure(figsize=(10, 8))
-    
-    # Reset index to get row numbers
-    df_subset = df_subset.reset_index(drop=True)
-    n_rows = len(df_subset)
-    
-    # Plot each row as a line connecting Human to LLM
-    for idx in range(n_rows):
-        human_val = df_subset.loc[idx, 'human_value']
-        llm_val = df_subset.loc[idx, 'llm_value']
-        
-        # Plot line connecting the two points (horizontal line at row idx) - BLACK
-        plt.plot([human_val, llm_val], [idx, idx], 
-                color='black', alpha=0.5, linewidth=1.5)
-        
-        # Plot points - Human in blue, LLM in red
-        plt.scatter([human_val], [idx], color='blue', s=50, alpha=0.8, zorder=3)
-        plt.scatter([llm_val], [idx], color='red', s=50, alpha=0.8, zorder=3)
-    
     # Customize plot
-    plt.xlabel(metric_name)
-    plt.ylabel('Scene Number')
-    plt.title(f"Per-Row Comparison: {metric_name}\n(Each line connects Human (blue) → LLM (red) for the same scene)")
-    plt.grid(True, alpha=0.3, axis='x')
-    
+    ax.set_xlabel(metric_name)
+    ax.set_ylabel("Scene Number")
+    ax.set_title(f"Per-Row Comparison: {metric_name}\n(Each line connects Human (blue) → LLM (red) for the same scene)")
+    ax.grid(True, alpha=0.3, axis="x")
+
     # Add mean lines (vertical now since we flipped axes)
-    mean_human = df_subset['human_value'].mean()
-    mean_llm = df_subset['llm_value'].mean()
-    sd_human = df_subset['human_value'].std()
-    sd_llm = df_subset['llm_value'].std()
-    
-    plt.axvline(x=mean_human, color='blue', linestyle='--', alpha=0.5, 
-                linewidth=2, label=f'Human (M={mean_human:.2f}, SD={sd_human:.2f})')
-    plt.axvline(x=mean_llm, color='red', linestyle='--', alpha=0.5, 
-                linewidth=2, label=f'LLM (M={mean_llm:.2f}, SD={sd_llm:.2f})')
-    
-    plt.legend(loc='best')
-    plt.tight_layout()
-    
-    out_path = os.path.join(OUTPUT_DIR, f"{metric_name}_scatter_perrow.png")
-    plt.savefig(out_path, dpi=300, bbox_inches="tight")
-    plt.close()
-    print("Saved:", out_path)
+    mean_human, sd_human = human.mean(), human.std(ddof=1)
+    mean_llm, sd_llm = llm.mean(), llm.std(ddof=1)
 
-# -----------------------------
-# Generate per-row plots for each metric
-# -----------------------------
-import numpy as np
+    ax.axvline(x=mean_human, color="blue", linestyle="--", alpha=0.5,
+               linewidth=2, label=f"Human (M={mean_human:.2f}, SD={sd_human:.2f})")
+    ax.axvline(x=mean_llm, color="red", linestyle="--", alpha=0.5,
+               linewidth=2, label=f"LLM (M={mean_llm:.2f}, SD={sd_llm:.2f})")
+
+    ax.legend(loc="best")
+    fig.tight_layout()
+
+    fig.savefig(out_path, dpi=300, bbox_inches="tight")
+    return out_path
+
+def per_row_jobs(lex_df, metrics=METRICS):
+    """A per-row plot job for each metric with human and LLM columns in lexical_analysis.csv."""
+    jobs = []
+    for metric in metrics:
+        human_col = f"human_scene_{metric}"
+        llm_col = f"LLM_scene_{metric}"
+
+        # Check if columns exist
+        if human_col not in lex_df.columns or llm_col not in lex_df.columns:
+            print(f"Warning: Columns not found for {metric}")
+            continue
 
-for metric in metrics:
-    human_col = f"human_scene_{metric}"
-    llm_col = f"LLM_scene_{metric}"
-    
-    # Check if columns exist
-    if human_col in lex_df.columns and llm_col in lex_df.columns:
-        # Create a subset dataframe with both columns
-        df_subset = lex_df[[human_col, llm_col]].copy()
-        df_subset.columns = ['human_value', 'llm_value']
-        
         # Remove rows with NaN in either column
-        df_subset = df_subset.dropna()
-        
-        if len(df_subset) > 0:
-            make_per_row_scatter_plot(metric, df_subset)
-        else:
+        df_subset = lex_df[[human_col, llm_col]].dropna()
+        if len(df_subset) == 0:
             print(f"Warning: No valid data for {metric}")
-    else:
-        print(f"Warning: Columns not found for {metric}")
+            continue
 
-print("\n✓ All per-row density plots saved!")
-print(f"\nAll plots saved to: {OUTPUT_DIR}")
\ No newline at end of file
+        jobs.append({
+            "kind": "per_row", "metric": metric, "filename": f"{metric}_scatter_perrow.png",
+            "data": [df_subset[human_col].to_numpy(dtype=float), df_subset[llm_col].to_numpy(dtype=float)],
+        })
+    return jobs
+
+# -----------------------------
+# Rendering
+# -----------------------------
+def code_hash():
+    with open(__file__, "rb") as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+def job_hash(job, code=None):
+    """Hash of everything a plot depends on: kind, metric, data and the plotting code."""
+    digest = hashlib.sha256(json.dumps([job["kind"], job["metric"], code or code_hash()]).encode("utf-8"))
+    for values in job["data"]:
+        digest.update(np.ascontiguousarray(values, dtype=np.float64).tobytes() + b"\0")
+    return digest.hexdigest()
+
+def render(job, output_dir=OUTPUT_DIR):
+    """Draw one plot job to output_dir/<filename>."""
+    out_path = os.path.join(output_dir, job["filename"])
+    if job["kind"] == "density":
+        return make_density_plot(job["metric"], *job["data"], out_path)
+    return make_per_row_scatter_plot(job["metric"], *job["data"], out_path)
+
+def _render(args):
+    return render(*args)
+
+def render_plots(jobs, output_dir=OUTPUT_DIR, workers=None, force=False):
+    """Render the jobs whose data changed since the last run, in a process pool.
+    Returns the paths of the rendered plots."""
+    os.makedirs(output_dir, exist_ok=True)
+    hashes_path = os.path.join(output_dir, HASHES_FILE)
+    hashes = {}
+    if os.path.exists(hashes_path) and not force:
+        with open(hashes_path, "r", encoding="utf-8") as f:
+            hashes = json.load(f)
+
+    code = code_hash()
+    new_hashes = {job["filename"]: job_hash(job, code) for job in jobs}
+    todo = [job for job in jobs
+            if hashes.get(job["filename"]) != new_hashes[job["filename"]]
+            or not os.path.exists(os.path.join(output_dir, job["filename"]))]
+    print(f"{len(jobs) - len(todo)} plots up to date, {len(todo)} to render")
+
+    paths = []
+    if todo:
+        with ProcessPoolExecutor(max_workers=min(workers or os.cpu_count(), len(todo))) as pool:
+            for path in pool.map(_render, [(job, output_dir) for job in todo]):
+                print("Saved:", path)
+                paths.append(path)
+
+    hashes.update(new_hashes)
+    with open(hashes_path, "w", encoding="utf-8") as f:
+        json.dump(hashes, f, indent=1, sort_keys=True)
+    return paths
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Plot the lexical metrics of human and LLM scenes")
+    parser.add_argument("--output-dir", default=OUTPUT_DIR)
+    parser.add_argument("--workers", type=int, default=None, help="Processes rendering plots (default: CPU count)")
+    parser.add_argument("--force", action="store_true", help="Render every plot, even if its data is unchanged")
+    args = parser.parse_args(argv)
+
+    jobs = density_jobs(load_summary()) + per_row_jobs(pd.read_csv(ANALYSIS_PATH))
+    render_plots(jobs, args.output_dir, workers=args.workers, force=args.force)
+    print(f"\nAll plots saved to: {args.output_dir}")
+
+
+if __name__ == "__main__":
+    main()
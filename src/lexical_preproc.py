@@ -1,67 +1,82 @@
-import pandas as pd
+"""
+Lexical preprocessing
+
+Combines the GPT scene overview, the generated scenes (GPT5_scenes.csv) and the human
+scenes they were generated from into data_output/lexical_analysis/overview.csv, the
+input of lexical_analysis.py.
+"""
+
 import os
+import argparse
+import pandas as pd
 
 # -------------------------
 # Paths
 # -------------------------
-gpt_overview_path = "../data_output/GPT_scenes/GPT_scene_overview.csv"
-gpt5_scenes_path = "../data_output/GPT5_scenes.csv"
-human_folder = "../data_output/data_selected"
-output_path = "../data_output/lexical_analysis/overview.csv"
+BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+OUTPUT_DIR = os.path.join(BASE_DIR, "data_output")
+GPT_OVERVIEW_PATH = os.path.join(OUTPUT_DIR, "GPT_scenes", "GPT_scene_overview.csv")
+GPT5_SCENES_PATH = os.path.join(OUTPUT_DIR, "GPT5_scenes.csv")
+HUMAN_FOLDER = os.path.join(OUTPUT_DIR, "data_selected")
+OVERVIEW_PATH = os.path.join(OUTPUT_DIR, "lexical_analysis", "overview.csv")
 
-os.makedirs(os.path.dirname(output_path), exist_ok=True)
 
-# -------------------------
-# Load GPT overview
-# -------------------------
-gpt_overview = pd.read_csv(gpt_overview_path)
+def load_gpt_overview(gpt_overview_path=GPT_OVERVIEW_PATH):
+    gpt_overview = pd.read_csv(gpt_overview_path)
 
-# Ensure filenames have .txt
-gpt_overview["filename"] = gpt_overview["filename"].astype(str)
-gpt_overview["filename"] = gpt_overview["filename"].apply(
-    lambda x: x if x.endswith(".txt") else f"{x}.txt"
-)
+    # Ensure filenames have .txt
+    gpt_overview["filename"] = gpt_overview["filename"].astype(str)
+    gpt_overview["filename"] = gpt_overview["filename"].apply(
+        lambda x: x if x.endswith(".txt") else f"{x}.txt"
+    )
 
-# Normalize to lowercase for merging
-gpt_overview["filename"] = gpt_overview["filename"].str.lower()
+    # Normalize to lowercase for merging
+    gpt_overview["filename"] = gpt_overview["filename"].str.lower()
+    return gpt_overview
 
-# -------------------------
-# Load GPT5 scenes
-# -------------------------
-gpt5_scenes = pd.read_csv(gpt5_scenes_path)
-gpt5_scenes = gpt5_scenes.rename(columns={"scene": "LLM_scene"})
+def load_human_scenes(human_folder, needed_files):
+    """Human scenes (only matching filenames) as a dataframe with filename and human_scene."""
+    human_data = []
+    for fname in os.listdir(human_folder):
+        fname_lower = fname.lower()
+        if fname_lower in needed_files:
+            with open(os.path.join(human_folder, fname), "r", encoding="utf-8") as f:
+                human_data.append({"filename": fname_lower, "human_scene": f.read()})
+    return pd.DataFrame(human_data, columns=["filename", "human_scene"])
 
-# -------------------------
-# Load human scenes (only matching filenames)
-# -------------------------
-needed_files = set(gpt_overview["filename"])
+def build_overview(gpt_overview_path=GPT_OVERVIEW_PATH, gpt5_scenes_path=GPT5_SCENES_PATH,
+                   human_folder=HUMAN_FOLDER):
+    """One row per generated scene: GPT overview columns, summary, LLM_scene and human_scene."""
+    gpt_overview = load_gpt_overview(gpt_overview_path)
 
-human_data = []
-for fname in os.listdir(human_folder):
-    fname_lower = fname.lower()
-    if fname_lower in needed_files:
-        with open(os.path.join(human_folder, fname), "r", encoding="utf-8") as f:
-            human_data.append({"filename": fname_lower, "human_scene": f.read()})
+    gpt5_scenes = pd.read_csv(gpt5_scenes_path)
+    gpt5_scenes = gpt5_scenes.rename(columns={"scene": "LLM_scene"})
+    # scene_number in the GPT overview is the row of GPT5_scenes.csv (counted from 1)
+    gpt5_scenes["scene_number"] = gpt5_scenes.index + 1
 
-human_df = pd.DataFrame(human_data)
+    human_df = load_human_scenes(human_folder, set(gpt_overview["filename"]))
 
-# -------------------------
-# Combine all data
-# -------------------------
-# Start with GPT overview
-combined_df = gpt_overview.copy()
+    # Append GPT5 summaries & LLM_scene by scene number (GPT_datacleaning skips unmatched scenes)
+    combined_df = gpt_overview.drop(columns="summary").merge(
+        gpt5_scenes[["scene_number", "summary", "LLM_scene"]], on="scene_number", how="left", validate="one_to_one")
+    combined_df = combined_df[gpt_overview.columns.tolist() + ["LLM_scene"]]
 
-# Append GPT5 summaries & LLM_scene by row order
-combined_df["summary"] = gpt5_scenes["summary"]
-combined_df["LLM_scene"] = gpt5_scenes["LLM_scene"]
+    # Merge human scenes by filename
+    return combined_df.merge(human_df, on="filename", how="left")
 
-# Merge human scenes by filename
-combined_df = combined_df.merge(human_df, on="filename", how="left")
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Combine GPT and human scenes into overview.csv")
+    parser.add_argument("--output", default=OVERVIEW_PATH)
+    args = parser.parse_args(argv)
+
+    combined_df = build_overview()
+    os.makedirs(os.path.dirname(args.output), exist_ok=True)
+    combined_df.to_csv(args.output, index=False)
+
+    print("Saved:", args.output)
+    print("Missing human scenes:", combined_df["human_scene"].isna().sum())
+    return combined_df
 
-# -------------------------
-# Save output
-# -------------------------
-combined_df.to_csv(output_path, index=False)
 
-print("Saved:", output_path)
-print("Missing human scenes:", combined_df["human_scene"].isna().sum())
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,425 @@
+"""
+Pipeline runner
+
+Runs the stages (the scripts in src/) in dependency order. Each stage declares what it
+reads and writes, and is only run again when something it depends on has changed.
+
+Each stage has:
+- a command: the script plus its arguments, run with src/ as working directory
+- inputs and outputs: these can be files, directories, or columns of the scene store
+  ("store:text,selected")
+- optionally "default": False for a stage that only runs when it is named (as a target
+  or with --force), e.g. gpt_generation, which pays for API calls. Otherwise it is
+  skipped and its dependents use the outputs it left last time.
+
+A stage depends on every stage that writes one of its inputs. Its fingerprint is a
+content hash of:
+- its command;
+- its code (the script and the local modules it imports);
+- its inputs.
+Store columns are hashed by their values, so a stage writing one column does not
+invalidate stages that read other columns.
+
+A stage is skipped when its fingerprint matches the last successful run and its
+outputs are still as that run left them. An upstream stage that reruns but writes
+identical outputs does not trigger its dependents.
+
+Stages whose dependencies are done run in parallel, e.g. the three summarizers or
+lexical_plots next to GPT-independent stages. If a stage fails, its dependents are
+skipped and the rest of the pipeline still runs.
+
+Fingerprints are kept in data_output/pipeline_state.json. File hashes are reused while
+a file's size and modification time are unchanged.
+
+    python pipeline.py                      # bring everything up to date
+    python pipeline.py lexical_plots        # only this stage and what it depends on
+    python pipeline.py --dry-run            # show what would run
+    python pipeline.py --force summarize_BART
+    python pipeline.py gpt_generation       # the paid OpenAI stage, only run when named
+"""
+
+import os
+import ast
+import sys
+import json
+import time
+import hashlib
+import argparse
+import subprocess
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from scene_store import STORE_PATH, require_pyarrow
+
+SRC_DIR = os.path.abspath(os.path.dirname(__file__))
+BASE_DIR = os.path.abspath(os.path.join(SRC_DIR, ".."))
+STATE_PATH = os.path.join(BASE_DIR, "data_output", "pipeline_state.json")
+
+INDEX = "num_lines,speakers,num_speakers,characters,direction_characters,num_tokens,content_hash,index_version"
+
+# name: command (run in src/), inputs, outputs. Paths are relative to the repository root.
+STAGES = {
+    "datacleaning": {
+        "command": ["datacleaning.py"],
+        "inputs": ["data/DERRY-GIRLS-SCRIPT.txt"],
+        "outputs": ["store:text,byte_start,byte_end", f"store:{INDEX}", "data_output/script_manifest.csv",
+                    "data_output/seasons", "data_output/season_1_episodes", "data_output/season_2_episodes"],
+    },
+    "data_overview": {
+        "command": ["data_overview.py"],
+        "inputs": ["store:num_lines,num_speakers"],
+        "outputs": ["data_output/scene_summary.csv", "data_output/plots/scene_summary.png"],
+    },
+    "baseline_info": {
+        "command": ["baseline_info.py"],
+        "inputs": ["store:text,characters"],
+        "outputs": ["data_output/season1_chunk.txt"],
+    },
+    "data_selection": {
+        "command": ["data_selection.py", "--txt"],
+        "inputs": ["store:num_lines,num_speakers,speakers,characters,num_tokens", "store:text"],
+        "outputs": ["store:selected", "data_output/data_selected"],
+    },
+    "summarize_pegasus": {
+        "command": ["summary_generation.py", "--backends", "pegasus-xsum"],
+        "inputs": ["store:text,num_lines,selected"],
+        "outputs": ["store:summary_pegasus-xsum", "data_output/summaries_pegasus/scene_summaries.csv"],
+    },
+    "summarize_BART": {
+        "command": ["summary_generation.py", "--backends", "bart-large-cnn"],
+        "inputs": ["store:text,num_lines,selected"],
+        "outputs": ["store:summary_bart-large-cnn", "data_output/summaries_BART/scene_summaries_BART.csv"],
+    },
+    "summarize_MEETING": {
+        "command": ["summary_generation.py", "--backends", "MEETING_SUMMARY"],
+        "inputs": ["store:text,num_lines,selected"],
+        "outputs": ["store:summary_MEETING_SUMMARY", "data_output/summaries_MEETING/scene_summaries_MEETING.csv"],
+    },
+    # Scripted version of GPT_prompting_API.ipynb (needs an API key, and spends API credit)
+    "gpt_generation": {
+        "command": ["gpt_generation.py"],
+        "default": False,
+        "inputs": ["data_output/season1_chunk.txt", "data_output/summaries_MEETING/scene_summaries_MEETING.csv"],
+        "outputs": ["data_output/GPT5_scenes.csv"],
+    },
+    "GPT_datacleaning": {
+        "command": ["GPT_datacleaning.py"],
+        "inputs": ["data_output/GPT5_scenes.csv", "data_output/summaries_MEETING/scene_summaries_MEETING.csv",
+                   "data_output/data_selected"],
+        "outputs": ["data_output/GPT_scenes"],
+    },
+    "lexical_preproc": {
+        "command": ["lexical_preproc.py"],
+        "inputs": ["data_output/GPT_scenes", "data_output/GPT5_scenes.csv", "data_output/data_selected"],
+        "outputs": ["data_output/lexical_analysis/overview.csv"],
+    },
+    "lexical_analysis": {
+        "command": ["lexical_analysis.py"],
+        "inputs": ["data_output/lexical_analysis/overview.csv"],
+        "outputs": ["data_output/lexical_analysis/lexical_analysis.csv",
+                    "data_output/lexical_analysis/lexical_summary.csv"],
+    },
+    "lexical_plots": {
+        "command": ["lexical_plots.py"],
+        "inputs": ["data_output/lexical_analysis/lexical_analysis.csv",
+                   "data_output/lexical_analysis/lexical_summary.csv"],
+        "outputs": ["data_output/lexical_analysis/plots"],
+    },
+    "beh_stats": {
+        "command": ["beh_stats.py"],
+        "inputs": ["data/Manuscript-study-incremental-data.csv"],
+        "outputs": ["data_output/beh_stats.csv"],
+    },
+}
+
+
+# -------------------- Artifacts --------------------
+def store_columns_of(artifact):
+    """Columns of a "store:a,b" artifact, or None for a path."""
+    if artifact.startswith("store:"):
+        return [c for c in artifact[len("store:"):].split(",") if c]
+    return None
+
+def overlaps(output, input):
+    out_cols, in_cols = store_columns_of(output), store_columns_of(input)
+    if out_cols is not None or in_cols is not None:
+        return out_cols is not None and in_cols is not None and bool(set(out_cols) & set(in_cols))
+    # A directory output contains the files read from it, and the other way round
+    output, input = os.path.normpath(output), os.path.normpath(input)
+    return output == input or input.startswith(output + os.sep) or output.startswith(input + os.sep)
+
+def dependencies(stages=STAGES):
+    """{stage: set of stages that write one of its inputs}."""
+    deps = {name: set() for name in stages}
+    for name, stage in stages.items():
+        for other, upstream in stages.items():
+            if other != name and any(overlaps(o, i) for o in upstream["outputs"] for i in stage["inputs"]):
+                deps[name].add(other)
+    return deps
+
+def topological_order(deps):
+    order, done = [], set()
+    def visit(name, path=()):
+        if name in path:
+            raise ValueError(f"Dependency cycle: {' -> '.join(path + (name,))}")
+        if name not in done:
+            for dep in sorted(deps[name]):
+                visit(dep, path + (name,))
+            done.add(name)
+            order.append(name)
+    for name in deps:
+        visit(name)
+    return order
+
+def local_modules(script, src_dir=SRC_DIR):
+    """The script and every module in src_dir it imports, directly or indirectly."""
+    found, todo = set(), [os.path.join(src_dir, script)]
+    while todo:
+        path = todo.pop()
+        if path in found or not os.path.exists(path):
+            continue
+        found.add(path)
+        with open(path, "r", encoding="utf-8") as f:
+            tree = ast.parse(f.read(), filename=path)
+        for node in ast.walk(tree):
+            if isinstance(node, ast.Import):
+                names = [alias.name for alias in node.names]
+            elif isinstance(node, ast.ImportFrom) and node.module and not node.level:
+                names = [node.module]
+            else:
+                continue
+            todo += [os.path.join(src_dir, name.split(".")[0] + ".py") for name in names]
+    return sorted(found)
+
+
+# -------------------- Hashing --------------------
+class Hasher:
+    """Content hashes of artifacts; file hashes are reused while size and mtime are unchanged."""
+
+    def __init__(self, file_cache=None, base_dir=BASE_DIR, store_path=STORE_PATH):
+        self.files = file_cache if file_cache is not None else {}
+        self.base_dir = base_dir
+        self.store_path = store_path
+
+    def file(self, path):
+        try:
+            st = os.stat(path)
+        except FileNotFoundError:
+            return None
+        cached = self.files.get(path)
+        if cached and cached[0] == st.st_size and cached[1] == st.st_mtime_ns:
+            return cached[2]
+        digest = hashlib.sha256()
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                digest.update(block)
+        self.files[path] = [st.st_size, st.st_mtime_ns, digest.hexdigest()]
+        return digest.hexdigest()
+
+    def directory(self, path):
+        digest = hashlib.sha256()
+        for root, dirs, files in os.walk(path):
+            dirs.sort()
+            for name in sorted(files):
+                full = os.path.join(root, name)
+                digest.update(os.path.relpath(full, path).encode("utf-8") + b"\0")
+                digest.update(self.file(full).encode("ascii"))
+        return digest.hexdigest()
+
+    def store(self, columns):
+        """Hash of the values of `columns` (and the key) in the scene store; None if any is missing."""
+        if not os.path.exists(self.store_path):
+            return None
+        pq = require_pyarrow()
+        import pyarrow as pa
+        if not set(columns) <= set(pq.read_schema(self.store_path).names):
+            return None
+        table = pq.read_table(self.store_path, columns=["show", "season", "episode", "scene"] + sorted(columns))
+        table = table.replace_schema_metadata(None)  # pandas metadata lists every column of the store
+        sink = pa.BufferOutputStream()
+        with pa.ipc.new_stream(sink, table.schema) as writer:
+            writer.write_table(table)
+        return hashlib.sha256(sink.getvalue()).hexdigest()
+
+    def artifact(self, artifact):
+        columns = store_columns_of(artifact)
+        if columns is not None:
+            return self.store(columns)
+        path = os.path.join(self.base_dir, artifact)
+        if os.path.isdir(path):
+            return self.directory(path)
+        return self.file(path)
+
+    def fingerprint(self, stage, src_dir=SRC_DIR):
+        """Hash of a stage's command, code and inputs, plus the inputs that are missing."""
+        digest = hashlib.sha256(json.dumps(stage["command"]).encode("utf-8"))
+        for path in local_modules(stage["command"][0], src_dir):
+            digest.update(self.file(path).encode("ascii"))
+        missing = []
+        for artifact in stage["inputs"]:
+            value = self.artifact(artifact)
+            if value is None:
+                missing.append(artifact)
+            digest.update(f"{artifact}={value}\n".encode("utf-8"))
+        return digest.hexdigest(), missing
+
+    def outputs(self, stage):
+        return {artifact: self.artifact(artifact) for artifact in stage["outputs"]}
+
+
+def load_state(path=STATE_PATH):
+    if not os.path.exists(path):
+        return {"stages": {}, "files": {}}
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+def save_state(state, path=STATE_PATH):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(state, f, indent=1, sort_keys=True)
+    os.replace(tmp_path, path)
+
+
+# -------------------- Running --------------------
+def stale_reason(name, stage, fingerprint, hasher, state, force=False):
+    """Why the stage has to run, or None if it is up to date."""
+    if force:
+        return "forced"
+    previous = state["stages"].get(name)
+    if previous is None:
+        return "never run"
+    if fingerprint != previous["fingerprint"]:
+        return "inputs or code changed"
+    outputs = hasher.outputs(stage)
+    changed = [a for a, value in outputs.items() if value is None or value != previous["outputs"].get(a)]
+    if changed:
+        return f"outputs missing or modified: {', '.join(changed)}"
+    return None
+
+def run_stage(name, stage, log_dir, src_dir=SRC_DIR):
+    """Run one stage's command; its output goes to log_dir/<name>.log. Returns (returncode, seconds)."""
+    os.makedirs(log_dir, exist_ok=True)
+    start = time.perf_counter()
+    with open(os.path.join(log_dir, f"{name}.log"), "w", encoding="utf-8") as log:
+        returncode = subprocess.call([sys.executable] + stage["command"], cwd=src_dir,
+                                     stdout=log, stderr=subprocess.STDOUT)
+    return returncode, time.perf_counter() - start
+
+def select(targets, deps):
+    """The targets and everything they depend on."""
+    selected, todo = set(), list(targets)
+    while todo:
+        name = todo.pop()
+        if name not in selected:
+            selected.add(name)
+            todo += deps[name]
+    return selected
+
+def run_pipeline(targets=None, stages=STAGES, jobs=None, force=(), dry_run=False, state_path=STATE_PATH):
+    """
+    Bring `targets` (default: every stage) up to date. `force` names stages to run even if
+    unchanged. Stages with "default": False only run when named in `targets` or `force`.
+    Returns {stage: "ran", "up to date", "failed", "skipped" or "opt-in"}.
+    """
+    deps = dependencies(stages)
+    unknown = [t for t in list(targets or []) + list(force) if t not in stages]
+    if unknown:
+        raise ValueError(f"Unknown stages: {', '.join(unknown)}. Stages: {', '.join(stages)}")
+    wanted = select(targets, deps) if targets else set(stages)
+    order = [name for name in topological_order(deps) if name in wanted]
+    named = set(targets or []) | set(force)
+    opt_in = {name for name in order if not stages[name].get("default", True) and name not in named}
+
+    state = load_state(state_path)
+    hasher = Hasher(state.setdefault("files", {}))
+    log_dir = os.path.join(os.path.dirname(state_path), "pipeline_logs")
+    status = {}
+
+    if dry_run:
+        for name in order:
+            if name in opt_in:
+                status[name] = "opt-in"
+                print(f"{name:20} skipped (opt-in: python pipeline.py {name})")
+                continue
+            upstream = [d for d in deps[name] if status.get(d) == "would run"]
+            if upstream:
+                reason = f"after {', '.join(sorted(upstream))}"
+            else:
+                fingerprint, missing = hasher.fingerprint(stages[name])
+                reason = (f"missing inputs {', '.join(missing)}" if missing
+                          else stale_reason(name, stages[name], fingerprint, hasher, state, name in force))
+            status[name] = "would run" if reason else "up to date"
+            print(f"{name:20} {status[name]}{f' ({reason})' if reason else ''}")
+        return status
+
+    def ready(name):
+        return name not in status and all(d in status for d in deps[name] if d in wanted)
+
+    running = {}
+    with ThreadPoolExecutor(max_workers=jobs or os.cpu_count()) as pool:
+        while len(status) < len(order):
+            for name in order:
+                if name in running.values() or not ready(name):
+                    continue
+                if name in opt_in:
+                    status[name] = "opt-in"
+                    print(f"[skip] {name}: opt-in, only run when named (python pipeline.py {name})")
+                    continue
+                blocked = [d for d in deps[name] if status.get(d) in ("failed", "skipped")]
+                if blocked:
+                    status[name] = "skipped"
+                    print(f"[skip] {name}: {', '.join(sorted(blocked))} did not succeed")
+                    continue
+                fingerprint, missing = hasher.fingerprint(stages[name])
+                if missing:
+                    status[name] = "skipped"
+                    print(f"[skip] {name}: missing inputs {', '.join(missing)}")
+                    continue
+                reason = stale_reason(name, stages[name], fingerprint, hasher, state, name in force)
+                if reason is None:
+                    status[name] = "up to date"
+                    print(f"[ok]   {name}: up to date")
+                    continue
+                print(f"[run]  {name}: {reason}")
+                running[pool.submit(run_stage, name, stages[name], log_dir)] = name
+                state["stages"].pop(name, None)
+
+            if not running:
+                continue
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                name = running.pop(future)
+                returncode, seconds = future.result()
+                if returncode == 0:
+                    # Fingerprint taken after the run, so inputs the stage itself rewrote are included
+                    state["stages"][name] = {"fingerprint": hasher.fingerprint(stages[name])[0],
+                                             "outputs": hasher.outputs(stages[name]), "seconds": round(seconds, 2)}
+                    status[name] = "ran"
+                    print(f"[done] {name} in {seconds:.1f}s")
+                else:
+                    status[name] = "failed"
+                    print(f"[fail] {name} (exit code {returncode}), see {os.path.join(log_dir, name + '.log')}")
+                save_state(state, state_path)
+
+    save_state(state, state_path)
+    return status
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run the pipeline stages that are out of date")
+    parser.add_argument("targets", nargs="*", help="Stages to bring up to date (default: all)")
+    parser.add_argument("--jobs", type=int, default=None, help="Stages run in parallel (default: CPU count)")
+    parser.add_argument("--force", nargs="+", default=[], metavar="STAGE", help="Run these stages even if unchanged")
+    parser.add_argument("--dry-run", action="store_true", help="Only show which stages would run")
+    parser.add_argument("--list", action="store_true", help="List the stages and their dependencies")
+    args = parser.parse_args()
+
+    if args.list:
+        deps = dependencies()
+        for name in topological_order(deps):
+            opt_in = "  (opt-in)" if not STAGES[name].get("default", True) else ""
+            print(f"{name:20} <- {', '.join(sorted(deps[name])) or '-'}{opt_in}")
+    else:
+        status = run_pipeline(args.targets or None, jobs=args.jobs, force=args.force, dry_run=args.dry_run)
+        if "failed" in status.values():
+            sys.exit(1)
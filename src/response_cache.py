@@ -0,0 +1,83 @@
+"""
+LLM response cache
+
+Persistent cache for chat completions used by gpt_generation.py, so identical prompts
+are never paid for twice. Entries are keyed by a SHA-256 over the model name, a hash of
+the full prompt, max_tokens and every other sampling setting of the request.
+
+Modes:
+- "use"     read from and write to the cache (default)
+- "refresh" ignore cached answers but store the new ones
+- "bypass"  neither read nor write
+
+The cache is a single SQLite file and keeps hit/miss/write counts for the current run.
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import time
+
+MODES = ["use", "refresh", "bypass"]
+
+
+def request_key(model, prompt, max_tokens, **sampling):
+    prompt_hash = hashlib.sha256(prompt.encode("utf-8")).hexdigest()
+    key = json.dumps({"model": model, "prompt": prompt_hash, "max_tokens": max_tokens, **sampling},
+                     sort_keys=True)
+    return hashlib.sha256(key.encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    def __init__(self, path, mode="use"):
+        if mode not in MODES:
+            raise ValueError(f"Unknown cache mode {mode!r}. Choose from: {', '.join(MODES)}")
+        self.path = path
+        self.mode = mode
+        self.hits = 0
+        self.misses = 0
+        self.writes = 0
+        self.conn = None
+        if mode != "bypass":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            self.conn = sqlite3.connect(path)
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                "key TEXT PRIMARY KEY, model TEXT NOT NULL, response TEXT NOT NULL, created REAL NOT NULL)"
+            )
+            self.conn.commit()
+
+    def get(self, model, prompt, max_tokens, **sampling):
+        """Cached response text, or None."""
+        if self.mode != "use":
+            self.misses += 1
+            return None
+        row = self.conn.execute(
+            "SELECT response FROM responses WHERE key = ?",
+            (request_key(model, prompt, max_tokens, **sampling),),
+        ).fetchone()
+        if row is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return row[0]
+
+    def put(self, model, prompt, max_tokens, response, **sampling):
+        if self.mode == "bypass" or response is None:
+            return
+        self.conn.execute(
+            "INSERT OR REPLACE INTO responses (key, model, response, created) VALUES (?, ?, ?, ?)",
+            (request_key(model, prompt, max_tokens, **sampling), model, response, time.time()),
+        )
+        self.conn.commit()
+        self.writes += 1
+
+    def stats(self):
+        total = self.hits + self.misses
+        rate = self.hits / total if total else 0
+        return f"{self.hits} hits, {self.misses} misses ({rate:.0%} hit rate), {self.writes} stored [{self.mode}]"
+
+    def close(self):
+        if self.conn is not None:
+            self.conn.close()
@@ -0,0 +1,50 @@
+"""
+ROUGE
+
+Small, dependency-free ROUGE-1/2/L (F1) used to compare summaries with each other,
+e.g. the output of an optimized summarization model against the full-precision one.
+Texts are lowercased and split into alphanumeric words.
+"""
+
+import re
+from collections import Counter
+
+
+def rouge_tokens(text):
+    return re.findall(r"[a-z0-9]+", str(text).lower())
+
+def f1(overlap, n_candidate, n_reference):
+    if overlap == 0 or n_candidate == 0 or n_reference == 0:
+        return 0.0
+    precision = overlap / n_candidate
+    recall = overlap / n_reference
+    return 2 * precision * recall / (precision + recall)
+
+def rouge_n(candidate, reference, n=1):
+    cand = rouge_tokens(candidate)
+    ref = rouge_tokens(reference)
+    cand_ngrams = Counter(tuple(cand[i:i + n]) for i in range(len(cand) - n + 1))
+    ref_ngrams = Counter(tuple(ref[i:i + n]) for i in range(len(ref) - n + 1))
+    overlap = sum((cand_ngrams & ref_ngrams).values())
+    return f1(overlap, sum(cand_ngrams.values()), sum(ref_ngrams.values()))
+
+def lcs_length(a, b):
+    prev = [0] * (len(b) + 1)
+    for x in a:
+        curr = [0]
+        for j, y in enumerate(b):
+            curr.append(prev[j] + 1 if x == y else max(prev[j + 1], curr[j]))
+        prev = curr
+    return prev[-1]
+
+def rouge_l(candidate, reference):
+    cand = rouge_tokens(candidate)
+    ref = rouge_tokens(reference)
+    return f1(lcs_length(cand, ref), len(cand), len(ref))
+
+def rouge_scores(candidate, reference):
+    return {
+        "rouge1": rouge_n(candidate, reference, 1),
+        "rouge2": rouge_n(candidate, reference, 2),
+        "rougeL": rouge_l(candidate, reference),
+    }
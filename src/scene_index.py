@@ -0,0 +1,98 @@
+"""
+Scene index
+
+Per-scene statistics computed once, when the scenes are split, and kept as columns of
+the scene store, so later stages look them up instead of re-reading and re-parsing
+scene text:
+- num_lines     non-empty lines
+- speakers      sorted speaker names (lines starting with "Name:")
+- num_speakers
+- characters    primary characters who speak or are mentioned in dialogue
+- direction_characters  primary characters named only in stage directions
+- num_tokens    whitespace-separated tokens
+- content_hash  SHA-256 of the scene text
+
+The index is incremental: a scene is only processed again when its text (content_hash)
+or the index definition (index_version, covering the character list, aliases and the
+speaker pattern) has changed. Character detection is done by character_mentions.py.
+
+    python scene_index.py           # update the index
+    python scene_index.py --force   # rebuild it for every scene
+"""
+
+import re
+import hashlib
+import argparse
+import pandas as pd
+
+from character_mentions import ALIASES, character_matcher
+from scene_store import KEY, STORE_PATH, read_store, store_columns, update_store
+
+PRIMARY_CHARACTERS = ["Erin", "Mary", "Orla", "Gerry", "Michelle", "James", "Clare", "Sister Michael"]
+SPEAKER_PATTERN = r"^([A-Z][A-Za-z\s]*):"  # Uppercase start, ends with colon
+
+INDEX_COLUMNS = ["num_lines", "speakers", "num_speakers", "characters", "direction_characters", "num_tokens",
+                 "content_hash", "index_version"]
+
+
+def content_hash(text):
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+def index_version(characters=PRIMARY_CHARACTERS, speaker_pattern=SPEAKER_PATTERN, aliases=ALIASES):
+    aliases = [f"{alias}={name}" for alias, name in sorted(aliases.items())]
+    return content_hash("\0".join(["mentions-v1", speaker_pattern, *characters, *aliases]))[:16]
+
+def detect_characters(text, characters=PRIMARY_CHARACTERS):
+    return character_matcher(characters).characters_in(text)
+
+def scene_stats(text, characters=PRIMARY_CHARACTERS, speaker_regex=re.compile(SPEAKER_PATTERN)):
+    mentions = character_matcher(characters).scan(text)
+    present = mentions["speaker"] | mentions["dialogue"]
+    lines = [line.strip() for line in text.split("\n") if line.strip()]
+    speakers = set()
+    for line in lines:
+        match = speaker_regex.match(line)
+        if match:
+            speakers.add(match.group(1).strip())
+    return {
+        "num_lines": len(lines),
+        "speakers": sorted(speakers),
+        "num_speakers": len(speakers),
+        "characters": [c for c in characters if c in present],
+        "direction_characters": [c for c in characters if c in mentions["direction"] - present],
+        "num_tokens": len(text.split()),
+        "content_hash": content_hash(text),
+    }
+
+def build_index(store_path=STORE_PATH, characters=PRIMARY_CHARACTERS, force=False):
+    """Index every new or changed scene in the store. Returns the number of scenes (re)indexed."""
+    version = index_version(characters)
+    existing = [c for c in ("content_hash", "index_version") if c in store_columns(store_path)]
+    scenes = read_store(store_path, columns=["text"] + existing)
+
+    hashes = scenes["text"].map(content_hash)
+    stale = pd.Series(True, index=scenes.index)
+    if not force and len(existing) == 2:
+        stale = (scenes["content_hash"] != hashes) | (scenes["index_version"] != version)
+    todo = scenes[stale]
+    print(f"Scene index: {len(scenes) - len(todo)} scenes up to date, {len(todo)} to index")
+    if todo.empty:
+        return 0
+
+    speaker_regex = re.compile(SPEAKER_PATTERN)
+    stats = pd.DataFrame([scene_stats(text, characters, speaker_regex) for text in todo["text"]], index=todo.index)
+    stats["index_version"] = version
+    update_store(pd.concat([todo[KEY], stats], axis=1), store_path)
+    return len(todo)
+
+def read_index(store_path=STORE_PATH, columns=INDEX_COLUMNS, filters=None):
+    """Index columns (plus key and scene_file) for the scenes matching `filters`."""
+    return read_store(store_path, columns=list(columns), filters=filters)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build or update the per-scene index in the scene store")
+    parser.add_argument("--store", default=STORE_PATH)
+    parser.add_argument("--force", action="store_true", help="Re-index every scene")
+    args = parser.parse_args()
+    build_index(args.store, force=args.force)
@@ -0,0 +1,195 @@
+"""
+Scene store
+
+A single columnar table that holds every scene, keyed by (show, season, episode, scene).
+It replaces the per-scene .txt files as the hand-over between stages.
+- datacleaning.py writes the text and the byte offsets.
+- Later stages add derived columns, e.g. line/speaker counts, the selection flag and
+  model summaries.
+
+Stages read and write the store in bulk. Reads can be column-selective and filtered,
+e.g. read_store(columns=["scene_file", "text"], filters=[("season", "==", 2)]).
+
+The store is a Parquet file (needs the optional `pyarrow`). export_txt writes any text
+column back out as one .txt file per scene for reading by hand; import_txt loads an
+existing directory of scene files.
+
+    python scene_store.py export --column text --out ../data_output/season_2_scenes --season 2
+"""
+
+import os
+import re
+import argparse
+import contextlib
+import pandas as pd
+
+try:
+    import fcntl
+except ImportError:  # Windows: no locking
+    fcntl = None
+
+BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+STORE_PATH = os.path.join(BASE_DIR, "data_output", "scene_store.parquet")
+
+KEY = ["show", "season", "episode", "scene"]
+DEFAULT_SHOW = "derry_girls"
+
+
+def require_pyarrow():
+    try:
+        import pyarrow  # noqa: F401
+        import pyarrow.parquet as pq
+    except ImportError as e:
+        raise ImportError("The scene store needs pyarrow: pip install pyarrow") from e
+    return pq
+
+# Season of the study; its scene files keep the names the selection, summaries and GPT scenes use
+FILE_SEASON = 2
+SCENE_FILE = re.compile(r"(?:season_(\d+)_)?episode_(\d+)_scene_(\d+)\.txt$")
+
+def scene_file(episode, scene, season=FILE_SEASON):
+    """episode_<e>_scene_<s>.txt, prefixed with season_<n>_ outside FILE_SEASON so names are unique per show."""
+    name = f"episode_{episode}_scene_{scene}.txt"
+    return name if season == FILE_SEASON else f"season_{season}_{name}"
+
+def normalize(df):
+    """Integer key columns, a scene_file column (derived from the key), sorted by key."""
+    df = df.copy()
+    for col in KEY[1:]:
+        df[col] = df[col].astype("int64")
+    df["scene_file"] = [scene_file(e, s, n) for n, e, s in zip(df["season"], df["episode"], df["scene"])]
+    return df.sort_values(KEY, kind="stable").reset_index(drop=True)
+
+
+# -------------------- Read / write --------------------
+def read_store(path=STORE_PATH, columns=None, filters=None):
+    """
+    Read the store, or only some of its columns and rows. `filters` uses pyarrow's
+    [(column, op, value), ...] form and is applied while reading, so unneeded row
+    groups are never decoded. Key columns and scene_file are always included.
+    """
+    pq = require_pyarrow()
+    if columns is not None:
+        columns = KEY + ["scene_file"] + [c for c in columns if c not in KEY + ["scene_file"]]
+    return pq.read_table(path, columns=columns, filters=filters).to_pandas()
+
+def write_store(df, path=STORE_PATH):
+    """Replace the store with `df` (written to a temporary file first, so readers never see half a file)."""
+    pq = require_pyarrow()
+    import pyarrow as pa
+    df = normalize(df)
+    duplicated = df.duplicated(KEY)
+    if duplicated.any():
+        raise ValueError(f"Duplicate scene keys in store: {df.loc[duplicated, KEY].head().to_dict('records')}")
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    tmp_path = path + ".tmp"
+    pq.write_table(pa.Table.from_pandas(df, preserve_index=False), tmp_path, compression="zstd")
+    os.replace(tmp_path, path)
+    return path
+
+@contextlib.contextmanager
+def store_lock(path=STORE_PATH):
+    """Exclusive lock on the store, so processes updating it at the same time (e.g. parallel
+    summarizers started by pipeline.py) don't overwrite each other's columns."""
+    if fcntl is None:
+        yield
+        return
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path + ".lock", "w") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock, fcntl.LOCK_UN)
+
+def update_store(df, path=STORE_PATH):
+    """
+    Merge rows/columns into the store by key. Values in `df` win; columns and rows
+    not in `df` are kept. New columns are added for all rows (missing where not given).
+    """
+    with store_lock(path):
+        return _update_store(df, path)
+
+def _update_store(df, path):
+    if not os.path.exists(path):
+        return write_store(df, path)
+    existing = read_store(path).set_index(KEY)
+    new = normalize(df).set_index(KEY)
+    merged = existing.reindex(existing.index.union(new.index))
+    for col in new.columns:
+        if col in merged.columns:
+            merged.loc[new.index, col] = new[col]
+        else:
+            values = new[col]
+            # Nullable dtypes, so rows without a value don't turn ints into floats
+            if pd.api.types.is_bool_dtype(values):
+                values = values.astype("boolean")
+            elif pd.api.types.is_integer_dtype(values):
+                values = values.astype("Int64")
+            merged[col] = values.reindex(merged.index)
+    return write_store(merged.reset_index(), path)
+
+def store_columns(path=STORE_PATH):
+    pq = require_pyarrow()
+    return pq.read_schema(path).names
+
+
+# -------------------- .txt export / import --------------------
+def export_txt(df, out_dir, column="text", filename=None):
+    """Write `column` of every row to out_dir/<scene_file> (or filename(row)). Rows with no value are skipped."""
+    os.makedirs(out_dir, exist_ok=True)
+    count = 0
+    for row in df.to_dict("records"):
+        value = row.get(column)
+        if value is None or (isinstance(value, float) and pd.isna(value)):
+            continue
+        name = filename(row) if filename else row["scene_file"]
+        with open(os.path.join(out_dir, name), "w", encoding="utf-8") as f:
+            f.write(str(value))
+        count += 1
+    return count
+
+def import_txt(scenes_dir, show=DEFAULT_SHOW, season=FILE_SEASON, column="text"):
+    """Rows for a directory of [season_<n>_]episode_<e>_scene_<s>.txt files (`season` where the
+    name has none)."""
+    rows = []
+    for filename in sorted(os.listdir(scenes_dir)):
+        match = SCENE_FILE.match(filename)
+        if not match:
+            continue
+        with open(os.path.join(scenes_dir, filename), "r", encoding="utf-8") as f:
+            rows.append({"show": show, "season": int(match.group(1) or season), "episode": int(match.group(2)),
+                         "scene": int(match.group(3)), column: f.read()})
+    return pd.DataFrame(rows)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export or import scene store columns as .txt files")
+    parser.add_argument("action", choices=["export", "import", "info"])
+    parser.add_argument("--store", default=STORE_PATH)
+    parser.add_argument("--column", default="text")
+    parser.add_argument("--out", help="Directory to export to / import from")
+    parser.add_argument("--show", default=DEFAULT_SHOW)
+    parser.add_argument("--season", type=int, default=None)
+    parser.add_argument("--selected", action="store_true", help="Only scenes with selected == True")
+    args = parser.parse_args()
+
+    if args.action == "info":
+        store = read_store(args.store)
+        print(f"{len(store)} scenes in {args.store}")
+        print(store.groupby(["show", "season"]).size().to_string())
+        print("Columns:", ", ".join(store.columns))
+    elif args.action == "export":
+        filters = [("show", "==", args.show)]
+        if args.season is not None:
+            filters.append(("season", "==", args.season))
+        columns = ["scene_file", args.column] + (["selected"] if args.selected else [])
+        store = read_store(args.store, columns=columns, filters=filters)
+        if args.selected:
+            store = store[store["selected"].fillna(False).astype(bool)]
+        n = export_txt(store, args.out, column=args.column)
+        print(f"Exported {n} files to {args.out}")
+    else:
+        update_store(import_txt(args.out, show=args.show, season=args.season or FILE_SEASON, column=args.column),
+                     args.store)
+        print(f"Imported {args.out} into {args.store}")
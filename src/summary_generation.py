@@ -1,185 +1,418 @@
 import os
 import re
+import copy
+import json
+import hashlib
+import argparse
+import tempfile
+from types import SimpleNamespace
+from functools import lru_cache
 import pandas as pd
-from transformers import PegasusForConditionalGeneration, PegasusTokenizer, pipeline
-
-def summarize_with_pegasus():
-    base_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
-    scenes_dir = os.path.join(base_dir, "data_output", "data_selected")
-    summaries_dir = os.path.join(base_dir, "data_output", "summaries_pegasus")
-    os.makedirs(summaries_dir, exist_ok=True)
-
-    model_name = "google/pegasus-xsum"
-    tokenizer = PegasusTokenizer.from_pretrained(model_name)
-    model = PegasusForConditionalGeneration.from_pretrained(model_name)
-
-    def summarize_text(text):
-        tokens = tokenizer(text, truncation=True, padding="longest", return_tensors="pt")
-        summary_ids = model.generate(**tokens)
-        return tokenizer.decode(summary_ids[0], skip_special_tokens=True)
-
-    def extract_episode_scene(filename):
-        match = re.match(r"episode_(\d+)_scene_(\d+)\.txt", filename)
-        if match:
-            return match.groups()
-        return None, None
-
-    records = []
-
-    for filename in sorted(os.listdir(scenes_dir)):
-        if not filename.endswith(".txt"):
-            continue
-
-        path = os.path.join(scenes_dir, filename)
-        with open(path, "r", encoding="utf-8") as f:
-            text = f.read()
-
-        num_lines = len([line for line in text.splitlines() if line.strip()])
-        summary = summarize_text(text)
-
-        episode, scene = extract_episode_scene(filename)
-        if episode and scene:
-            summary_file = os.path.join(summaries_dir, f"summary_episode_{episode}_scene_{scene}.txt")
-            with open(summary_file, "w", encoding="utf-8") as f:
-                f.write(summary)
-
-        records.append({
-            "scene_file": filename,
-            "num_lines": num_lines,
-            "summary": summary
-        })
-
-    df_summaries = pd.DataFrame(records)
-    csv_path = os.path.join(summaries_dir, "scene_summaries.csv")
-    df_summaries.to_csv(csv_path, index=False, encoding="utf-8")
-    print(f"Saved Pegasus summaries CSV to {csv_path}")
-
-
-def summarize_with_BART(test_n=5):
-    base_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
-    scenes_dir = os.path.join(base_dir, "data_output", "data_selected")
-    summaries_dir = os.path.join(base_dir, "data_output", "summaries_BART")
-    os.makedirs(summaries_dir, exist_ok=True)
-
-    summarizer = pipeline("summarization", model="facebook/bart-large-cnn")
-
-    def extract_episode_scene(filename):
-        match = re.match(r"episode_(\d+)_scene_(\d+)\.txt", filename)
-        if match:
-            return match.groups()
-        return None, None
-
-    records = []
-    count = 0
-
-    for filename in sorted(os.listdir(scenes_dir)):
-        if count >= test_n:
-            break
-        if not filename.endswith(".txt"):
-            continue
-
-        path = os.path.join(scenes_dir, filename)
-        with open(path, "r", encoding="utf-8") as f:
-            text = f.read()
-
-        num_lines = len([line for line in text.splitlines() if line.strip()])
-        print(f"Processing {filename} ({num_lines} lines)")
-        summary_output = summarizer(text, max_length=200, min_length=30, do_sample=False)
-        summary = summary_output[0]["summary_text"]
-
-        episode, scene = extract_episode_scene(filename)
-        if episode and scene:
-            summary_filename = f"summary_episode_{episode}_scene_{scene}.txt"
-        else:
-            summary_filename = f"summary_{filename}"
-        summary_path = os.path.join(summaries_dir, summary_filename)
-        with open(summary_path, "w", encoding="utf-8") as f:
-            f.write(summary)
-
-        records.append({
-            "scene_file": filename,
-            "num_lines": num_lines,
-            "summary": summary
-        })
-        count += 1
-
-    df = pd.DataFrame(records)
-    csv_path = os.path.join(summaries_dir, "scene_summaries_BART.csv")
-    df.to_csv(csv_path, index=False, encoding="utf-8")
-    print("Saved BART summaries CSV to:", csv_path)
-    print("Individual summary files saved in:", summaries_dir)
-
-
-from transformers import pipeline
-
-def summarize_with_meeting_model(test_n=5):
+import torch
+from transformers import AutoTokenizer, PegasusForConditionalGeneration, PegasusTokenizer, pipeline
+
+from rouge import rouge_scores
+from scene_store import DEFAULT_SHOW, KEY, STORE_PATH, export_txt, read_store, update_store
+
+BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+OUTPUT_ROOT = os.path.join(BASE_DIR, "data_output")
+ONNX_DIR = os.path.join(OUTPUT_ROOT, "onnx_models")
+
+# Inference modes: full precision, dynamic int8 quantization of the linear layers,
+# or an exported ONNX graph run with onnxruntime (needs the optional `optimum[onnxruntime]`)
+PRECISIONS = ["fp32", "int8", "onnx"]
+
+# Summarization backends: which model to load, how to call it and where its output goes
+BACKENDS = {
+    "pegasus-xsum": {
+        "model": "google/pegasus-xsum",
+        "pipeline": False,
+        "generate_kwargs": {},
+        "output_dir": "summaries_pegasus",
+        "csv_name": "scene_summaries.csv",
+    },
+    "bart-large-cnn": {
+        "model": "facebook/bart-large-cnn",
+        "pipeline": True,
+        "generate_kwargs": {"max_length": 200, "min_length": 30, "do_sample": False},
+        "output_dir": "summaries_BART",
+        "csv_name": "scene_summaries_BART.csv",
+    },
+    "MEETING_SUMMARY": {
+        "model": "knkarthick/MEETING_SUMMARY",
+        "pipeline": True,
+        "generate_kwargs": {"max_length": 200, "min_length": 30, "do_sample": False},
+        "output_dir": "summaries_MEETING",
+        "csv_name": "scene_summaries_MEETING.csv",
+    },
+}
+
+def summarize_batch(texts, tokenizer, model, batch_size=8, num_threads=None,
+                    tokenizer_kwargs=None, generate_kwargs=None, decode_kwargs=None):
+    """
+    Summarize many texts with as few generate() calls as possible.
+    Texts are tokenized once, sorted by token length and grouped into batches that are
+    padded only to their own longest member (dynamic padding), so short scenes don't pay
+    for long ones. Summaries are returned in the same order as `texts`.
+    """
+    if num_threads:
+        torch.set_num_threads(num_threads)
+    if len(texts) == 0:
+        return []
+
+    encodings = tokenizer(list(texts), **(tokenizer_kwargs or {}))["input_ids"]
+    order = sorted(range(len(encodings)), key=lambda i: len(encodings[i]))
+
+    summaries = [None] * len(encodings)
+    for start in range(0, len(order), batch_size):
+        batch = order[start:start + batch_size]
+        inputs = tokenizer.pad({"input_ids": [encodings[i] for i in batch]},
+                               padding="longest", return_tensors="pt")
+        with torch.inference_mode():
+            output_ids = model.generate(**inputs, **(generate_kwargs or {}))
+        for i, ids in zip(batch, output_ids):
+            summaries[i] = tokenizer.decode(ids, skip_special_tokens=True, **(decode_kwargs or {}))
+    return summaries
+
+def summarize_with_pipeline(summarizer, texts, batch_size=8, num_threads=None, **generate_kwargs):
+    """Batched equivalent of calling a transformers summarization pipeline on each text."""
+    # Reproduce what the pipeline does per call: model prefix, the pipeline's generation
+    # config (with the task-specific summarization defaults) and its decoding settings
+    prefix = getattr(summarizer, "prefix", None) or ""
+    if getattr(summarizer, "generation_config", None) is not None:
+        generate_kwargs.setdefault("generation_config", summarizer.generation_config)
+    return summarize_batch(
+        [prefix + text for text in texts], summarizer.tokenizer, summarizer.model,
+        batch_size=batch_size, num_threads=num_threads,
+        generate_kwargs=generate_kwargs,
+        decode_kwargs={"clean_up_tokenization_spaces": False},
+    )
+
+
+def quantize_int8(model):
+    """Dynamic int8 quantization of all linear layers (weights int8, activations quantized on the fly)."""
+    return torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+
+def load_onnx_model(model_id, export_dir):
+    """Load the ONNX export of `model_id` from export_dir, exporting it there the first time."""
+    try:
+        from optimum.onnxruntime import ORTModelForSeq2SeqLM
+    except ImportError as e:
+        raise ImportError("The onnx precision needs optimum with onnxruntime: "
+                          "pip install 'optimum[onnxruntime]'") from e
+
+    if os.path.exists(os.path.join(export_dir, "config.json")):
+        return AutoTokenizer.from_pretrained(export_dir), ORTModelForSeq2SeqLM.from_pretrained(export_dir)
+
+    print(f"Exporting {model_id} to ONNX in {export_dir} (only done once)")
+    tokenizer = AutoTokenizer.from_pretrained(model_id)
+    model = ORTModelForSeq2SeqLM.from_pretrained(model_id, export=True)
+    model.save_pretrained(export_dir)
+    tokenizer.save_pretrained(export_dir)
+    return tokenizer, model
+
+def onnx_summarizer(tokenizer, model, task="summarization"):
+    """
+    What summarize_with_pipeline needs from a transformers summarization pipeline, for an
+    onnxruntime model (pipeline() only takes PyTorch models): the tokenizer, the model, and
+    the prefix and generation config the pipeline would derive from the model's config.
     """
-    Summarize a limited number of scene files using the dialogue/meeting summarization model.
-    Saves each summary as a .txt and collects all in a CSV.
+    params = dict((getattr(model.config, "task_specific_params", None) or {}).get(task, {}))
+    prefix = params.pop("prefix", getattr(model.config, "prefix", None))
+    generation_config = copy.deepcopy(model.generation_config)
+    generation_config.update(**params)
+    if generation_config.pad_token_id is None and tokenizer.pad_token_id is not None:
+        generation_config.pad_token_id = tokenizer.pad_token_id
+    return SimpleNamespace(tokenizer=tokenizer, model=model, prefix=prefix, generation_config=generation_config)
+
+@lru_cache(maxsize=None)
+def load_backend(name, precision="fp32"):
+    """Load a backend's model the first time it is used; later calls reuse it."""
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown summarization backend {name!r}. Choose from: {', '.join(BACKENDS)}")
+    if precision not in PRECISIONS:
+        raise ValueError(f"Unknown precision {precision!r}. Choose from: {', '.join(PRECISIONS)}")
+    spec = BACKENDS[name]
+
+    if precision == "onnx":
+        tokenizer, model = load_onnx_model(spec["model"], os.path.join(ONNX_DIR, name))
+        if spec["pipeline"]:
+            return onnx_summarizer(tokenizer, model)
+        return tokenizer, model
+
+    if spec["pipeline"]:
+        summarizer = pipeline("summarization", model=spec["model"])
+        if precision == "int8":
+            summarizer.model = quantize_int8(summarizer.model)
+        return summarizer
+    tokenizer = PegasusTokenizer.from_pretrained(spec["model"])
+    model = PegasusForConditionalGeneration.from_pretrained(spec["model"])
+    if precision == "int8":
+        model = quantize_int8(model)
+    return tokenizer, model
+
+def run_backend(name, texts, batch_size=8, num_threads=None, precision="fp32"):
+    """Summaries of `texts` (in order) from one backend."""
+    spec = BACKENDS[name]
+    loaded = load_backend(name, precision)
+    if spec["pipeline"]:
+        return summarize_with_pipeline(loaded, texts, batch_size=batch_size, num_threads=num_threads,
+                                       **spec["generate_kwargs"])
+    tokenizer, model = loaded
+    return summarize_batch(texts, tokenizer, model, batch_size=batch_size, num_threads=num_threads,
+                           tokenizer_kwargs={"truncation": True}, generate_kwargs=spec["generate_kwargs"])
+
+def backend_output_dir(name, precision="fp32", output_root=OUTPUT_ROOT):
+    """Optimized modes write next to the full-precision output instead of over it."""
+    output_dir = BACKENDS[name]["output_dir"]
+    if precision != "fp32":
+        output_dir = f"{output_dir}_{precision}"
+    return os.path.join(output_root, output_dir)
+
+def extract_episode_scene(filename):
+    match = re.match(r"episode_(\d+)_scene_(\d+)\.txt", filename)
+    if match:
+        return match.groups()
+    return None, None
+
+def summary_filename(scene_file):
+    episode, scene = extract_episode_scene(scene_file)
+    if episode and scene:
+        return f"summary_episode_{episode}_scene_{scene}.txt"
+    return f"summary_{scene_file}"
+
+def summary_column(name, precision="fp32"):
+    """Scene store column holding a backend's summaries."""
+    return f"summary_{name}" if precision == "fp32" else f"summary_{name}_{precision}"
+
+def load_scenes(store_path=STORE_PATH, test_n=None, selection="selected"):
+    """Read the scenes of a selection (see data_selection.py) and their indexed line counts
+    from the scene store in one go: [{key columns, "scene_file", "text", "num_lines"}],
+    sorted by filename."""
+    selected = read_store(store_path, columns=["text", "num_lines"],
+                          filters=[("show", "==", DEFAULT_SHOW), (selection, "==", True)])
+    selected = selected.sort_values("scene_file")
+    if test_n is not None:
+        selected = selected.head(test_n)
+
+    scenes = []
+    for scene in selected.to_dict("records"):
+        scene["num_lines"] = int(scene["num_lines"])  # from the scene index
+        print(f"Processing {scene['scene_file']} ({scene['num_lines']} lines)")
+        scenes.append(scene)
+    return scenes
+
+def scene_hash(text):
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+def read_journal(journal_path):
+    """Summaries already produced by earlier (possibly interrupted) runs, keyed by (scene_file, input hash)."""
+    done = {}
+    if not os.path.exists(journal_path):
+        return done
+    with open(journal_path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue  # half-written last line from a crash
+            done[(record["scene_file"], record["input_hash"])] = record
+    return done
+
+def append_journal(journal, record):
+    journal.write(json.dumps(record, ensure_ascii=False) + "\n")
+    journal.flush()
+    os.fsync(journal.fileno())
+
+def summarize_backend(name, scenes, batch_size=8, num_threads=None, output_root=OUTPUT_ROOT, resume=True,
+                      precision="fp32", store_path=STORE_PATH, txt=True):
     """
-    base_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
-    scenes_dir = os.path.join(base_dir, "data_output", "data_selected")
-    summaries_dir = os.path.join(base_dir, "data_output", "summaries_MEETING")
+    Summarize scenes with one backend, checkpointing as it goes.
+    Every summary is appended to a journal as soon as its batch finishes. On the next run,
+    scenes whose file name and text hash are already in the journal are skipped, so an
+    interrupted run continues where it stopped.
+    At the end, all summaries are written to the scene store (one column per backend and
+    precision), to a CSV in scene order and, unless txt=False, as one .txt file per scene.
+    """
+    spec = BACKENDS[name]
+    summaries_dir = backend_output_dir(name, precision, output_root)
     os.makedirs(summaries_dir, exist_ok=True)
-
-    # Load the meeting summarization pipeline
-    summarizer = pipeline("summarization", model="knkarthick/MEETING_SUMMARY")
-
-    def extract_episode_scene(filename):
-        match = re.match(r"episode_(\d+)_scene_(\d+)\.txt", filename)
-        if match:
-            return match.groups()
-        return None, None
-
-    records = []
-    count = 0
-
-    for filename in sorted(os.listdir(scenes_dir)):
-        if count >= test_n:
-            break
-        if not filename.endswith(".txt"):
-            continue
-
-        path = os.path.join(scenes_dir, filename)
-        with open(path, "r", encoding="utf-8") as f:
-            text = f.read()
-
-        num_lines = len([line for line in text.splitlines() if line.strip()])
-        print(f"Processing {filename} ({num_lines} lines)")
-
-        # Generate summary
-        summary_output = summarizer(text, max_length=200, min_length=30, do_sample=False)
-        summary = summary_output[0]["summary_text"]
-
-        # Save individual summary file
-        episode, scene = extract_episode_scene(filename)
-        if episode and scene:
-            summary_filename = f"summary_episode_{episode}_scene_{scene}.txt"
-        else:
-            summary_filename = f"summary_{filename}"
-        summary_path = os.path.join(summaries_dir, summary_filename)
-        with open(summary_path, "w", encoding="utf-8") as f:
-            f.write(summary)
-
-        # Record for CSV
-        records.append({
-            "scene_file": filename,
-            "num_lines": num_lines,
-            "summary": summary
-        })
-        count += 1
-
-    # Save CSV of all summaries
-    df = pd.DataFrame(records)
-    csv_path = os.path.join(summaries_dir, "scene_summaries_MEETING.csv")
-    df.to_csv(csv_path, index=False, encoding="utf-8")
-
-    print("Saved MEETING model summaries CSV to:", csv_path)
-    print("Individual summary files saved in:", summaries_dir)
+    journal_path = os.path.join(summaries_dir, "summary_journal.jsonl")
+
+    if not resume and os.path.exists(journal_path):
+        os.remove(journal_path)
+    done = read_journal(journal_path)
+
+    hashes = [scene_hash(scene["text"]) for scene in scenes]
+    todo = [(scene, h) for scene, h in zip(scenes, hashes) if (scene["scene_file"], h) not in done]
+    print(f"{name}: {len(scenes) - len(todo)} scenes already summarized, {len(todo)} to go")
+
+    # Similar lengths end up in the same batch, which keeps padding small
+    todo.sort(key=lambda item: len(item[0]["text"]))
+
+    with open(journal_path, "a", encoding="utf-8") as journal:
+        for start in range(0, len(todo), batch_size):
+            batch = todo[start:start + batch_size]
+            summaries = run_backend(name, [scene["text"] for scene, _ in batch],
+                                    batch_size=batch_size, num_threads=num_threads, precision=precision)
+            for (scene, h), summary in zip(batch, summaries):
+                record = {
+                    "scene_file": scene["scene_file"],
+                    "input_hash": h,
+                    "num_lines": scene["num_lines"],
+                    "summary": summary
+                }
+                append_journal(journal, record)
+                done[(scene["scene_file"], h)] = record
+
+    records = [
+        {key: done[(scene["scene_file"], h)][key] for key in ("scene_file", "num_lines", "summary")}
+        for scene, h in zip(scenes, hashes)
+    ]
+    csv_path = os.path.join(summaries_dir, spec["csv_name"])
+    pd.DataFrame(records).to_csv(csv_path, index=False, encoding="utf-8")
+    print(f"Saved {name} summaries CSV to:", csv_path)
+
+    column = summary_column(name, precision)
+    stored = pd.DataFrame([{**{key: scene[key] for key in KEY + ["scene_file"]}, column: record["summary"]}
+                           for scene, record in zip(scenes, records)], columns=KEY + ["scene_file", column])
+    update_store(stored, store_path)
+    print(f"Saved {name} summaries to column {column} of", store_path)
+    if txt:
+        export_txt(stored, summaries_dir, column=column, filename=lambda row: summary_filename(row["scene_file"]))
+        print("Individual summary files saved in:", summaries_dir)
+    return csv_path
+
+def summarize_scenes(backends, test_n=None, batch_size=8, num_threads=None,
+                     store_path=STORE_PATH, output_root=OUTPUT_ROOT, resume=True, precision="fp32", txt=True,
+                     selection="selected"):
+    """
+    Summarize the selected scenes with one or more backends.
+    The scenes are read from the store once and shared by all backends; each model is loaded
+    once per process, so repeated calls don't pay for a cold start again.
+    With resume=True, scenes that an earlier run already summarized are skipped.
+    """
+    if isinstance(backends, str):
+        backends = [backends]
+    scenes = load_scenes(store_path, test_n, selection)
+
+    csv_paths = {}
+    for name in backends:
+        csv_paths[name] = summarize_backend(name, scenes, batch_size=batch_size, num_threads=num_threads,
+                                            output_root=output_root, resume=resume, precision=precision,
+                                            store_path=store_path, txt=txt)
+    return csv_paths
+
+def check_precision(name, precision, test_n=None, batch_size=8, num_threads=None,
+                    store_path=STORE_PATH, output_root=OUTPUT_ROOT):
+    """
+    Quality check for an optimized mode: summarize the same scenes in fp32 and in
+    `precision` (reusing earlier runs where possible) and score the optimized summaries
+    with ROUGE against the fp32 ones. Saves per-scene scores and returns their means.
+    """
+    scenes = load_scenes(store_path, test_n)
+    reference_csv = summarize_backend(name, scenes, batch_size=batch_size, num_threads=num_threads,
+                                      output_root=output_root, precision="fp32", store_path=store_path)
+    optimized_csv = summarize_backend(name, scenes, batch_size=batch_size, num_threads=num_threads,
+                                      output_root=output_root, precision=precision, store_path=store_path)
+
+    reference = pd.read_csv(reference_csv).fillna({"summary": ""})
+    optimized = pd.read_csv(optimized_csv).fillna({"summary": ""})
+    merged = reference.merge(optimized, on="scene_file", suffixes=("_fp32", f"_{precision}"))
+
+    scores = pd.DataFrame([
+        rouge_scores(row[f"summary_{precision}"], row["summary_fp32"]) for _, row in merged.iterrows()
+    ], index=merged.index)
+    scores.insert(0, "scene_file", merged["scene_file"])
+    scores["identical"] = merged[f"summary_{precision}"] == merged["summary_fp32"]
+
+    report_path = os.path.join(backend_output_dir(name, precision, output_root), "rouge_vs_fp32.csv")
+    scores.to_csv(report_path, index=False)
+
+    means = scores[["rouge1", "rouge2", "rougeL", "identical"]].mean()
+    print(f"{name} {precision} vs fp32 over {len(scores)} scenes: "
+          f"ROUGE-1 {means['rouge1']:.3f}, ROUGE-2 {means['rouge2']:.3f}, ROUGE-L {means['rougeL']:.3f}, "
+          f"identical {means['identical']:.0%}")
+    print("Per-scene scores saved to:", report_path)
+    return means
+
+
+def smoke_check(precisions=PRECISIONS, texts=None):
+    """
+    Run each precision through the code path of the pipeline backends (a summarization
+    pipeline, quantized for int8; the ONNX export and onnx_summarizer for onnx) with the
+    tiny random BART of benchmark.py, so nothing is downloaded. Checks that every text
+    gets a summary and returns {precision: summaries}.
+    """
+    from benchmark import tiny_summarizer
+
+    texts = texts or ["Erin: We have to go now, Orla, the bus is coming.",
+                      "Michelle: Sister Michael is going to kill us.\n\nClare: Not if we tell her first."]
+    generate_kwargs = {"max_length": 20, "min_length": 5, "num_beams": 1, "do_sample": False}
+    tokenizer, model = tiny_summarizer(texts, vocab_size=200)
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        model_dir = os.path.join(tmp_dir, "fp32")
+        model.save_pretrained(model_dir)
+        tokenizer.save_pretrained(model_dir)
+        for precision in precisions:
+            if precision == "onnx":
+                summarizer = onnx_summarizer(*load_onnx_model(model_dir, os.path.join(tmp_dir, "onnx")))
+            else:
+                summarizer = pipeline("summarization", model=model_dir, tokenizer=model_dir)
+                if precision == "int8":
+                    summarizer.model = quantize_int8(summarizer.model)
+            summaries = summarize_with_pipeline(summarizer, texts, batch_size=2, **generate_kwargs)
+            if len(summaries) != len(texts) or not all(isinstance(summary, str) for summary in summaries):
+                raise RuntimeError(f"{precision}: expected {len(texts)} summaries, got {summaries!r}")
+            results[precision] = summaries
+            same = "" if "fp32" not in results else f", identical to fp32: {summaries == results['fp32']}"
+            print(f"{precision}: ok ({len(summaries)} summaries{same})")
+    return results
+
+
+def summarize_with_pegasus(batch_size=8, num_threads=None):
+    return summarize_scenes(["pegasus-xsum"], batch_size=batch_size, num_threads=num_threads)
+
+
+def summarize_with_BART(test_n=5, batch_size=8, num_threads=None):
+    return summarize_scenes(["bart-large-cnn"], test_n=test_n, batch_size=batch_size, num_threads=num_threads)
+
+
+def summarize_with_meeting_model(test_n=5, batch_size=8, num_threads=None):
+    """
+    Summarize a limited number of scenes using the dialogue/meeting summarization model.
+    Saves the summaries to the scene store and collects all in a CSV.
+    """
+    return summarize_scenes(["MEETING_SUMMARY"], test_n=test_n, batch_size=batch_size, num_threads=num_threads)
 
 
 if __name__ == "__main__":
-    
-    # summarize_with_pegasus()
-    #summarize_with_BART(test_n=5)
-    summarize_with_meeting_model(test_n = 110)
+    parser = argparse.ArgumentParser(description="Summarize the selected scenes")
+    parser.add_argument("--backends", nargs="+", default=["MEETING_SUMMARY"], choices=list(BACKENDS),
+                        help="One or more summarization backends to run over the same scenes")
+    parser.add_argument("--test-n", type=int, default=110, help="Only summarize the first N scenes")
+    parser.add_argument("--batch-size", type=int, default=8)
+    parser.add_argument("--threads", type=int, default=None, help="Number of CPU threads for torch")
+    parser.add_argument("--restart", action="store_true", help="Ignore earlier runs and summarize every scene again")
+    parser.add_argument("--precision", default="fp32", choices=PRECISIONS,
+                        help="int8: dynamically quantized linear layers; onnx: cached ONNX export")
+    parser.add_argument("--check-quality", action="store_true",
+                        help="Compare --precision against fp32 with ROUGE instead of only summarizing")
+    parser.add_argument("--smoke-check", action="store_true",
+                        help="Run fp32 and --precision on a tiny local model instead of summarizing")
+    parser.add_argument("--no-txt", dest="txt", action="store_false",
+                        help="Don't write one .txt file per summary (the store and the CSV are still written)")
+    parser.add_argument("--selection", default="selected", help="Scene store column of the scenes to summarize")
+    args = parser.parse_args()
+
+    if args.smoke_check:
+        smoke_check(list(dict.fromkeys(["fp32", args.precision])))
+    elif args.check_quality:
+        for name in args.backends:
+            check_precision(name, args.precision, test_n=args.test_n, batch_size=args.batch_size,
+                            num_threads=args.threads)
+    else:
+        summarize_scenes(args.backends, test_n=args.test_n, batch_size=args.batch_size, num_threads=args.threads,
+                         resume=not args.restart, precision=args.precision, txt=args.txt,
+                         selection=args.selection)
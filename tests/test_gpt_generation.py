@@ -0,0 +1,85 @@
+"""gpt_generation against a local fake OpenAI-compatible server."""
+
+import os
+import re
+import csv
+import sys
+import json
+import asyncio
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+from gpt_generation import generate_scenes  # noqa: E402
+
+
+class FakeChatCompletions(BaseHTTPRequestHandler):
+    """Answers /chat/completions with "Scene for: <summary>"; summaries containing FAIL get a 400."""
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        summary = re.search(r"^Summary: (.*)$", body["messages"][0]["content"], re.M).group(1)
+        self.server.summaries.append(summary)
+        if "FAIL" in summary:
+            self.reply(400, {"error": {"message": "bad request", "type": "invalid_request_error"}})
+            return
+        self.reply(200, {
+            "id": "fake", "object": "chat.completion", "created": 0, "model": body["model"],
+            "choices": [{"index": 0, "finish_reason": "stop",
+                         "message": {"role": "assistant", "content": f"Scene for: {summary}"}}],
+        })
+
+    def reply(self, status, payload):
+        data = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), FakeChatCompletions)
+    httpd.summaries = []
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield httpd
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def run(rows, output_path, server):
+    return asyncio.run(generate_scenes(rows, "Season 1 text", output_path=output_path, model="fake-model",
+                                       base_url=f"http://127.0.0.1:{server.server_address[1]}/v1",
+                                       api_key="test", concurrency=2))
+
+
+def test_resume_after_input_change(tmp_path, server):
+    output_path = str(tmp_path / "scenes.csv")
+    rows = [{"scene_file": "episode_1_scene_1.txt", "num_lines": "10", "summary": "Erin writes a diary"},
+            {"scene_file": "episode_1_scene_2.txt", "num_lines": "12", "summary": "Orla jogs"},
+            {"scene_file": "episode_1_scene_3.txt", "num_lines": "8", "summary": "FAIL"}]
+    with pytest.raises(RuntimeError):
+        run(rows, output_path, server)
+    assert os.path.exists(output_path + ".partial.jsonl")
+
+    # The input changes before the resume: new order, an edited summary, a replaced row
+    server.summaries.clear()
+    rows = [{"scene_file": "episode_1_scene_3.txt", "num_lines": "8", "summary": "Clare panics"},
+            {"scene_file": "episode_1_scene_2.txt", "num_lines": "12", "summary": "Orla jogs backwards"},
+            {"scene_file": "episode_1_scene_1.txt", "num_lines": "10", "summary": "Erin writes a diary"}]
+    run(rows, output_path, server)
+
+    assert sorted(server.summaries) == ["Clare panics", "Orla jogs backwards"]  # the unchanged row is reused
+    with open(output_path, newline="", encoding="utf-8") as f:
+        written = list(csv.DictReader(f))
+    assert [row["scene_file"] for row in written] == [row["scene_file"] for row in rows]
+    assert [row["summary"] for row in written] == [row["summary"] for row in rows]
+    assert [row["scene"] for row in written] == [f"Scene for: {row['summary']}" for row in rows]
+    assert not os.path.exists(output_path + ".partial.jsonl")